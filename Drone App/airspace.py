@@ -0,0 +1,283 @@
+"""Airspace volumes tagged with an ARC, and per-segment ARC along waypoint routes.
+
+Volumes are read from a local GeoJSON FeatureCollection of Polygons or
+MultiPolygons (holes are honoured). Each feature's properties give:
+
+    arc          'a' to 'd' (or 'ARC-c'), required
+    lower_m      bottom of the volume in metres (default 0)
+    upper_m      top of the volume in metres (default unlimited)
+    name, kind   optional labels, e.g. 'Class C', 'airport surface area'
+
+Altitudes use whatever reference the route's waypoints use (e.g. AGL).
+Volume bounding boxes sit in a packed Sort-Tile-Recursive R-tree. A batch
+query walks all route segments down the tree together as one set of
+(segment, node) pairs per level. The few pairs that survive get an exact
+segment/polygon test, which is also vectorized. A segment takes the
+highest ARC of the volumes it passes through, even when that is below
+the default (segregated ARC-a airspace). Segments that touch no volume
+take the default ARC. A route's worst segment ARC is the one that feeds SAIL.
+
+    python airspace.py airspace.geojson -- -97.74,30.27,60 -97.70,30.31,90
+"""
+import argparse
+import json
+
+import numpy as np
+
+import sora
+from geometry import GeometryError, parse_route
+
+NODE_CAPACITY = 16
+
+
+class STRTree:
+    """Static R-tree over (N, 4) boxes [min_x, min_y, max_x, max_y], packed with Sort-Tile-Recursive
+
+    Leaves are tiled by x then y; each upper level groups the previous one
+    `capacity` nodes at a time, so node i's children are the contiguous
+    range [i * capacity, (i + 1) * capacity) of the level below.
+    """
+    def __init__(self, boxes, capacity=NODE_CAPACITY):
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.capacity = capacity
+        count = len(boxes)
+        leaves = max(-(-count // capacity), 1)
+        slices = int(np.ceil(np.sqrt(leaves)))
+        centre_x = (boxes[:, 0] + boxes[:, 2]) / 2
+        centre_y = (boxes[:, 1] + boxes[:, 3]) / 2
+        by_x = np.argsort(centre_x, kind='stable')
+        slice_of = np.empty(count, dtype=np.int64)
+        slice_of[by_x] = np.arange(count) // (slices * capacity)
+        self.order = np.lexsort((centre_y, slice_of))  # level-0 position -> original box index
+        self.levels = [boxes[self.order]]
+        while len(self.levels[-1]) > capacity:
+            below = self.levels[-1]
+            starts = np.arange(0, len(below), capacity)
+            self.levels.append(np.column_stack((
+                np.minimum.reduceat(below[:, 0], starts), np.minimum.reduceat(below[:, 1], starts),
+                np.maximum.reduceat(below[:, 2], starts), np.maximum.reduceat(below[:, 3], starts),
+            )))
+
+    def __len__(self):
+        return len(self.order)
+
+    def query_pairs(self, boxes):
+        """(query row, original box index) for every query box / stored box overlap, all queries at once"""
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        top = self.levels[-1]
+        queries = np.repeat(np.arange(len(boxes)), len(top))
+        nodes = np.tile(np.arange(len(top)), len(boxes))
+        for depth in range(len(self.levels) - 1, -1, -1):
+            level = self.levels[depth]
+            hit = ((boxes[queries, 0] <= level[nodes, 2]) & (level[nodes, 0] <= boxes[queries, 2]) &
+                   (boxes[queries, 1] <= level[nodes, 3]) & (level[nodes, 1] <= boxes[queries, 3]))
+            queries, nodes = queries[hit], nodes[hit]
+            if depth == 0 or not len(nodes):
+                break
+            # Expand each surviving node into its children on the level below
+            below = len(self.levels[depth - 1])
+            first = nodes * self.capacity
+            counts = np.minimum(first + self.capacity, below) - first
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            queries = np.repeat(queries, counts)
+            nodes = np.repeat(first, counts) + offsets
+        if not len(self):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return queries, self.order[nodes]
+
+
+def _orientation(ax, ay, bx, by, cx, cy):
+    return np.sign((bx - ax) * (cy - ay) - (by - ay) * (cx - ax))
+
+
+def segments_cross(p, q, a, b):
+    """Whether segments p-q and a-b intersect (touching counts), elementwise over (N, 2) arrays"""
+    o1 = _orientation(p[:, 0], p[:, 1], q[:, 0], q[:, 1], a[:, 0], a[:, 1])
+    o2 = _orientation(p[:, 0], p[:, 1], q[:, 0], q[:, 1], b[:, 0], b[:, 1])
+    o3 = _orientation(a[:, 0], a[:, 1], b[:, 0], b[:, 1], p[:, 0], p[:, 1])
+    o4 = _orientation(a[:, 0], a[:, 1], b[:, 0], b[:, 1], q[:, 0], q[:, 1])
+    proper = (o1 * o2 <= 0) & (o3 * o4 <= 0)
+    # Collinear segments only meet if their extents overlap on both axes. All four
+    # orientations must vanish: a zero-length p-q has o1 = o2 = 0 wherever it lies
+    collinear = (o1 == 0) & (o2 == 0) & (o3 == 0) & (o4 == 0)
+    overlap = ((np.minimum(p[:, 0], q[:, 0]) <= np.maximum(a[:, 0], b[:, 0])) &
+               (np.minimum(a[:, 0], b[:, 0]) <= np.maximum(p[:, 0], q[:, 0])) &
+               (np.minimum(p[:, 1], q[:, 1]) <= np.maximum(a[:, 1], b[:, 1])) &
+               (np.minimum(a[:, 1], b[:, 1]) <= np.maximum(p[:, 1], q[:, 1])))
+    return np.where(collinear, overlap, proper)
+
+
+class AirspaceIndex:
+    """ARC-tagged airspace volumes behind an STR R-tree"""
+    def __init__(self, volumes, default_arc='b', capacity=NODE_CAPACITY):
+        """`volumes`: dicts with 'rings' (list of (N, 2) lon/lat arrays), 'arc' index, 'lower', 'upper' and labels"""
+        self.volumes = volumes
+        self.default_arc = sora.encode_arc(default_arc, 'default_arc')
+        self.arcs = np.array([volume['arc'] for volume in volumes], dtype=np.int8)
+        self.lower = np.array([volume['lower'] for volume in volumes], dtype=np.float64)
+        self.upper = np.array([volume['upper'] for volume in volumes], dtype=np.float64)
+
+        # Every ring edge of every volume, grouped by volume, for the exact tests
+        starts, ends, owners = [], [], []
+        boxes = []
+        for i, volume in enumerate(volumes):
+            points = np.concatenate(volume['rings'])
+            boxes.append((*points.min(axis=0), *points.max(axis=0)))
+            for ring in volume['rings']:
+                starts.append(ring)
+                ends.append(np.roll(ring, -1, axis=0))
+                owners.append(np.full(len(ring), i))
+        self.edge_starts = np.concatenate(starts) if starts else np.zeros((0, 2))
+        self.edge_ends = np.concatenate(ends) if ends else np.zeros((0, 2))
+        owners = np.concatenate(owners) if owners else np.zeros(0, dtype=np.int64)
+        self.edge_first = np.searchsorted(owners, np.arange(len(volumes)))
+        self.edge_count = np.bincount(owners, minlength=len(volumes))
+        self.tree = STRTree(boxes, capacity)
+
+    @classmethod
+    def from_geojson(cls, collection, default_arc='b'):
+        """Index the Polygon/MultiPolygon features of a GeoJSON FeatureCollection"""
+        volumes = []
+        for number, feature in enumerate(collection.get('features', [])):
+            geometry = feature.get('geometry') or {}
+            properties = feature.get('properties') or {}
+            if geometry.get('type') == 'Polygon':
+                polygons = [geometry.get('coordinates') or []]
+            elif geometry.get('type') == 'MultiPolygon':
+                polygons = geometry.get('coordinates') or []
+            else:
+                continue
+            try:
+                arc = sora.encode_arc(properties.get('arc', ''), 'arc')
+                rings = []
+                for polygon in polygons:
+                    for ring in polygon:
+                        ring = np.array(ring, dtype=np.float64)[:, :2]
+                        if len(ring) > 1 and (ring[0] == ring[-1]).all():
+                            ring = ring[:-1]
+                        if len(ring) >= 3:
+                            rings.append(ring)
+                if not rings:
+                    raise ValueError('no polygon with at least three vertices')
+                lower = float(properties.get('lower_m') or 0)
+                upper = properties.get('upper_m')
+                upper = float('inf') if upper in (None, '') else float(upper)
+            except (TypeError, ValueError, IndexError) as e:
+                raise ValueError(f"Airspace feature {number} ({properties.get('name', 'unnamed')}): {e}")
+            volumes.append({
+                'rings': rings, 'arc': arc, 'lower': lower, 'upper': upper,
+                'name': properties.get('name') or f'volume {number}', 'kind': properties.get('kind'),
+            })
+        return cls(volumes, default_arc)
+
+    @classmethod
+    def load(cls, path, default_arc='b'):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_geojson(json.load(f), default_arc)
+
+    def _segment_hits(self, starts, ends, low, high):
+        """(segment, volume) pairs where the segment passes through the volume, for (N, 2) segment arrays"""
+        boxes = np.column_stack((np.minimum(starts, ends), np.maximum(starts, ends)))
+        segments, volumes = self.tree.query_pairs(boxes)
+        in_band = (low[segments] < self.upper[volumes]) & (high[segments] >= self.lower[volumes])
+        segments, volumes = segments[in_band], volumes[in_band]
+        if not len(segments):
+            return segments, volumes
+
+        # One row per (candidate pair, volume edge)
+        counts = self.edge_count[volumes]
+        pair = np.repeat(np.arange(len(segments)), counts)
+        edge = np.repeat(self.edge_first[volumes], counts) + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+        p, q = starts[segments][pair], ends[segments][pair]
+        a, b = self.edge_starts[edge], self.edge_ends[edge]
+        crossing = segments_cross(p, q, a, b)
+        # Even-odd ray cast from the segment's start point, over all rings (so holes count)
+        straddles = (a[:, 1] > p[:, 1]) != (b[:, 1] > p[:, 1])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_at = a[:, 0] + (p[:, 1] - a[:, 1]) * (b[:, 0] - a[:, 0]) / (b[:, 1] - a[:, 1])
+        ray = straddles & (p[:, 0] < x_at)
+        crossings = np.bincount(pair, weights=crossing, minlength=len(segments)) > 0
+        inside = np.bincount(pair, weights=ray, minlength=len(segments)) % 2 == 1
+        hit = crossings | inside
+        return segments[hit], volumes[hit]
+
+    def assess_routes(self, routes):
+        """Per-segment ARC, the volumes each segment passes through and the worst ARC, for many routes at once
+
+        `routes` are lists of [lon, lat] or [lon, lat, altitude_m] waypoints (or
+        GeoJSON LineStrings); without altitudes every altitude band applies.
+        Returns one dict per route, or {'error': ...} for routes that cannot be parsed.
+        """
+        parsed, errors = [], {}
+        for row, route in enumerate(routes):
+            try:
+                vertices, altitudes = parse_route(route)
+                if len(vertices) < 2:
+                    vertices = np.vstack((vertices, vertices))
+                    altitudes = None if altitudes is None else np.repeat(altitudes, 2)
+                parsed.append((row, vertices, altitudes))
+            except GeometryError as e:
+                errors[row] = str(e)
+
+        starts = np.concatenate([v[:-1] for _, v, _ in parsed]) if parsed else np.zeros((0, 2))
+        ends = np.concatenate([v[1:] for _, v, _ in parsed]) if parsed else np.zeros((0, 2))
+        low = np.concatenate([np.minimum(a[:-1], a[1:]) if a is not None else np.full(len(v) - 1, -np.inf)
+                              for _, v, a in parsed]) if parsed else np.zeros(0)
+        high = np.concatenate([np.maximum(a[:-1], a[1:]) if a is not None else np.full(len(v) - 1, np.inf)
+                               for _, v, a in parsed]) if parsed else np.zeros(0)
+
+        segments, volumes = self._segment_hits(starts, ends, low, high) if len(self.volumes) else (np.zeros(0, int),) * 2
+        # A segment takes the highest ARC of the volumes it passes through, which may be
+        # below the default (e.g. segregated ARC-a airspace); the default is only for misses
+        hit_arcs = np.full(len(starts), -1, dtype=np.int8)
+        np.maximum.at(hit_arcs, segments, self.arcs[volumes])
+        segment_arcs = np.where(hit_arcs >= 0, hit_arcs, self.default_arc).astype(np.int8)
+        crossed = {}
+        for segment, volume in zip(segments.tolist(), volumes.tolist()):
+            crossed.setdefault(segment, []).append(self.volumes[volume]['name'])
+
+        results = [None] * len(routes)
+        for row, error in errors.items():
+            results[row] = {'error': error}
+        offset = 0
+        for row, vertices, _ in parsed:
+            count = len(vertices) - 1
+            arcs = segment_arcs[offset:offset + count].tolist()
+            results[row] = {
+                'segments': [{'from': i, 'to': i + 1, 'arc': sora.ARCS[arc], 'volumes': crossed.get(offset + i, [])}
+                             for i, arc in enumerate(arcs)],
+                'worst_arc': sora.ARCS[max(arcs)],
+            }
+            offset += count
+        return results
+
+    def annotate_missions(self, missions):
+        """Fill in `initial_arc` for missions that give a `route` but no ARC
+
+        Returns {row: error message} for routes that could not be used.
+        """
+        rows = [row for row, mission in enumerate(missions)
+                if isinstance(mission, dict) and mission.get('route') is not None
+                and mission.get('initial_arc') in (None, '')]
+        errors = {}
+        for row, result in zip(rows, self.assess_routes([missions[row]['route'] for row in rows])):
+            if 'error' in result:
+                errors[row] = result['error']
+            else:
+                missions[row]['initial_arc'] = result['worst_arc']
+        return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-segment ARC along a route')
+    parser.add_argument('geojson')
+    parser.add_argument('points', nargs='+', help='lon,lat[,altitude_m]')
+    parser.add_argument('--default-arc', default='b')
+    args = parser.parse_args()
+    index = AirspaceIndex.load(args.geojson, args.default_arc)
+    route = [[float(v) for v in point.split(',')] for point in args.points]
+    print(json.dumps(index.assess_routes([route])[0], indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_query(query):
+    """Lowercase, drop punctuation and collapse whitespace so trivial rewrites share a cache entry"""
+    return ' '.join(re.findall(r'\w+', query.lower()))
+
+
+def make_cache_key(query, rule_ids, summary_preference, template_version):
+    """Stable key from the normalized query, the retrieved rule set, the summary preference and prompt version"""
+    payload = json.dumps([
+        normalize_query(query),
+        sorted(str(rule_id) for rule_id in rule_ids),
+        summary_preference or '',
+        template_version,
+    ])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AnswerCache:
+    """Two-tier answer cache: an in-process LRU in front of an optional SQLite table
+
+    Both tiers expire entries after `ttl` seconds and are bounded in size; the
+    SQLite tier evicts the least recently used rows once it exceeds `disk_size`.
+    """
+    def __init__(self, path=None, ttl=86400, memory_size=256, disk_size=5000):
+        self.ttl = ttl
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.memory = OrderedDict()  # key -> (stored_at, value)
+        self.lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        self.db = None
+        if path:
+            try:
+                self.db = sqlite3.connect(path, check_same_thread=False)
+                self.db.execute(
+                    'CREATE TABLE IF NOT EXISTS answers ('
+                    'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                    'stored_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+                )
+                self.db.execute('CREATE INDEX IF NOT EXISTS answers_accessed ON answers (accessed_at)')
+                self.db.commit()
+            except sqlite3.Error as e:
+                print(f"Answer cache disk tier disabled: {e}")
+                self.db = None
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if now - stored_at <= self.ttl:
+                    self.memory.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return value
+                del self.memory[key]
+
+            if self.db is not None:
+                try:
+                    row = self.db.execute(
+                        'SELECT value, stored_at FROM answers WHERE key = ?', (key,)
+                    ).fetchone()
+                    if row is not None and now - row[1] <= self.ttl:
+                        self.db.execute('UPDATE answers SET accessed_at = ? WHERE key = ?', (now, key))
+                        self.db.commit()
+                        self._remember(key, row[1], row[0])
+                        self.stats['disk_hits'] += 1
+                        return row[0]
+                    if row is not None:
+                        self.db.execute('DELETE FROM answers WHERE key = ?', (key,))
+                        self.db.commit()
+                except sqlite3.Error as e:
+                    print(f"Answer cache read error: {e}")
+
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, key, value):
+        """Store value in both tiers, evicting the oldest entries beyond the size limits"""
+        now = time.time()
+        with self.lock:
+            self._remember(key, now, value)
+            self.stats['stores'] += 1
+            if self.db is None:
+                return
+            try:
+                self.db.execute(
+                    'INSERT OR REPLACE INTO answers (key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?)',
+                    (key, value, now, now)
+                )
+                self.db.execute('DELETE FROM answers WHERE stored_at < ?', (now - self.ttl,))
+                (count,) = self.db.execute('SELECT COUNT(*) FROM answers').fetchone()
+                if count > self.disk_size:
+                    self.db.execute(
+                        'DELETE FROM answers WHERE key IN '
+                        '(SELECT key FROM answers ORDER BY accessed_at ASC LIMIT ?)',
+                        (count - self.disk_size,)
+                    )
+                    self.stats['evictions'] += count - self.disk_size
+                self.db.commit()
+            except sqlite3.Error as e:
+                print(f"Answer cache write error: {e}")
+
+    def _remember(self, key, stored_at, value):
+        """Insert into the LRU tier (caller holds the lock)"""
+        self.memory[key] = (stored_at, value)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def clear(self):
+        """Drop every entry from both tiers"""
+        with self.lock:
+            self.memory.clear()
+            if self.db is not None:
+                self.db.execute('DELETE FROM answers')
+                self.db.commit()
+
+    def get_stats(self):
+        """Hit/miss counters plus current tier sizes"""
+        with self.lock:
+            stats = dict(self.stats)
+            stats['memory_entries'] = len(self.memory)
+            stats['disk_entries'] = None
+            if self.db is not None:
+                stats['disk_entries'] = self.db.execute('SELECT COUNT(*) FROM answers').fetchone()[0]
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
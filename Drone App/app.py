@@ -1,12 +1,31 @@
 import os
+import sys
 import json
+import gzip
+import hashlib
+import threading
+import time
 import numpy as np
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
 import google.generativeai as genai
 from typing import List, Dict
 import re
 import random
+import heapq
+from array import array
 from collections import Counter
+from answer_cache import AnswerCache, make_cache_key, normalize_query
+from stub_llm import StubModel
+from llm_gateway import LLMGateway, LLMOverloaded
+from retrieval_tokens import RetrievalTokenStore
+from metrics import Metrics
+import sora
+from geometry import GeometryError
+from population_raster import Footprint, PopulationRaster
+from airspace import AirspaceIndex
+from spelling import TrigramCorrector
+from citations import CitationGraph
+from concurrent.futures import ThreadPoolExecutor
 
 app = Flask(__name__)
 
@@ -15,6 +34,198 @@ GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY', 'AIzaSyBEZYhCh_Xp-d4ztL_0vTUIpuoSU-
 if GOOGLE_API_KEY:
     genai.configure(api_key=GOOGLE_API_KEY)
 
+# Retriever used for candidate selection: 'bm25' (ranked) or 'inverted' (match count)
+RETRIEVER_MODE = os.getenv('RETRIEVER_MODE', 'bm25')
+
+# Prebuilt index snapshot (see `python app.py --build-index`); bump the version
+# whenever the layout or the way any derived structure is built changes
+INDEX_SNAPSHOT_DIR = os.getenv('INDEX_SNAPSHOT_DIR', 'index_snapshot')
+SNAPSHOT_FORMAT_VERSION = 5
+
+# Bump whenever the Gemini prompt changes so cached answers from the old prompt are not reused
+PROMPT_TEMPLATE_VERSION = 2
+GEMINI_MODEL_NAME = 'gemini-2.5-flash'
+
+# Approximate tokens of rule paragraphs packed into each prompt (0 sends every retrieved rule in full)
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', 1200))
+
+# 'gemini' for the real API, 'stub' for the deterministic offline model in stub_llm.py
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'gemini')
+STUB_LLM_LATENCY = float(os.getenv('STUB_LLM_LATENCY', 0))
+STUB_LLM_TOKEN_DELAY = float(os.getenv('STUB_LLM_TOKEN_DELAY', 0))
+# Part of every answer cache key, so answers from one backend or model are never served for another
+ANSWER_MODEL_ID = 'stub' if LLM_BACKEND == 'stub' else f'gemini:{GEMINI_MODEL_NAME}'
+
+# LLM call limits: concurrent calls, calls allowed to wait before answering 503, and per-call deadline
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 32))
+LLM_MAX_QUEUE = int(os.getenv('LLM_MAX_QUEUE', 256))
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 30))
+LLM_RETRY_AFTER = int(os.getenv('LLM_RETRY_AFTER', 5))
+
+# Retrieval tokens let the summary-preference follow-up skip a second retrieval;
+# with SPECULATIVE_PREFETCH=1 both answer lengths are generated while the user decides
+RETRIEVAL_TOKEN_TTL = int(os.getenv('RETRIEVAL_TOKEN_TTL', 300))
+RETRIEVAL_TOKEN_MAX = int(os.getenv('RETRIEVAL_TOKEN_MAX', 10000))
+SPECULATIVE_PREFETCH = os.getenv('SPECULATIVE_PREFETCH', '0') == '1'
+
+# Follow-ups are deterministic per (query, retrieved rules), so they are memoized
+FOLLOWUP_CACHE_SIZE = int(os.getenv('FOLLOWUP_CACHE_SIZE', 2048))
+
+# /api/query/batch: maximum questions per request and answers generated in parallel
+BATCH_MAX_QUERIES = int(os.getenv('BATCH_MAX_QUERIES', 200))
+BATCH_MAX_WORKERS = int(os.getenv('BATCH_MAX_WORKERS', 8))
+
+# /api/sora/batch: largest fleet of missions accepted per request
+SORA_BATCH_MAX_MISSIONS = int(os.getenv('SORA_BATCH_MAX_MISSIONS', 100000))
+
+# Population density raster (.npy + .json sidecar, see population_raster.py) used to
+# derive population_density from mission footprints and routes; '' disables it
+POPULATION_RASTER_PATH = os.getenv('POPULATION_RASTER_PATH', '')
+
+# ARC-tagged airspace volumes (GeoJSON, see airspace.py) used to derive initial_arc
+# from mission routes, and the ARC of segments outside every volume; '' disables it
+AIRSPACE_GEOJSON_PATH = os.getenv('AIRSPACE_GEOJSON_PATH', '')
+AIRSPACE_DEFAULT_ARC = os.getenv('AIRSPACE_DEFAULT_ARC', 'b')
+
+# Map misspelled query words to the closest indexed terms before retrieval
+QUERY_SPELL_CORRECTION = os.getenv('QUERY_SPELL_CORRECTION', '1') == '1'
+
+# Rules cited by (or citing) the retrieved ones that are appended to them for the prompt; 0 disables
+CITATION_EXPANSION = int(os.getenv('CITATION_EXPANSION', 0))
+
+# /api/rules pagination (rules per page by default and at most) and how many
+# pre-serialized, pre-gzipped response bodies are kept per loaded rules file
+RULES_PAGE_SIZE = int(os.getenv('RULES_PAGE_SIZE', 50))
+RULES_PAGE_MAX = int(os.getenv('RULES_PAGE_MAX', 200))
+RULES_RESPONSE_CACHE_SIZE = int(os.getenv('RULES_RESPONSE_CACHE_SIZE', 1024))
+
+# `python app.py` runs Flask's development server; FLASK_DEBUG=1 turns on its debugger
+# and reloader. Serve production traffic with gunicorn instead (see README)
+FLASK_DEBUG = os.getenv('FLASK_DEBUG', '0') == '1'
+
+# Hot reload of parsed_rules.json: poll every N seconds (0 disables polling); the
+# admin endpoint /api/admin/reload is enabled only when ADMIN_TOKEN is set
+RULES_RELOAD_INTERVAL = float(os.getenv('RULES_RELOAD_INTERVAL', 0))
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+
+# Answer cache: in-process LRU plus an SQLite file (set ANSWER_CACHE_PATH='' to keep it in memory only)
+ANSWER_CACHE_PATH = os.getenv('ANSWER_CACHE_PATH', 'answer_cache.sqlite3')
+ANSWER_CACHE_TTL = int(os.getenv('ANSWER_CACHE_TTL', 24 * 3600))
+ANSWER_CACHE_MEMORY_SIZE = int(os.getenv('ANSWER_CACHE_MEMORY_SIZE', 256))
+ANSWER_CACHE_DISK_SIZE = int(os.getenv('ANSWER_CACHE_DISK_SIZE', 5000))
+
+
+def llm_configured():
+    """Whether answers should come from a model rather than the fallback formatter"""
+    return LLM_BACKEND == 'stub' or bool(GOOGLE_API_KEY)
+
+
+def get_model():
+    """Model object for the configured LLM backend"""
+    if LLM_BACKEND == 'stub':
+        return StubModel(latency=STUB_LLM_LATENCY, token_delay=STUB_LLM_TOKEN_DELAY)
+    return genai.GenerativeModel(GEMINI_MODEL_NAME)
+
+
+# One shared model client for the whole process; calls are awaited on the gateway's event loop
+llm_gateway = LLMGateway(get_model, max_concurrency=LLM_MAX_CONCURRENCY, max_queue=LLM_MAX_QUEUE,
+                         timeout=LLM_TIMEOUT, retry_after=LLM_RETRY_AFTER)
+
+# Stage latency histograms and event counters, served on /metrics
+metrics = Metrics('drone_rag', counters={
+    'answer_cache_hits_total': 'Answers served from the answer cache',
+    'answer_cache_misses_total': 'Answers that had to be generated',
+    'llm_errors_total': 'LLM calls that failed or timed out',
+    'llm_overloaded_total': 'Answers refused because the LLM queue was full',
+    'fallbacks_total': 'Answers produced without the LLM',
+})
+metrics.gauge('llm_queue_depth', 'LLM calls running or waiting for a slot', llm_gateway.queue_depth)
+
+
+def load_population_raster():
+    """The configured population raster, or None when unset or unreadable"""
+    if not POPULATION_RASTER_PATH:
+        return None
+    try:
+        raster = PopulationRaster.load(POPULATION_RASTER_PATH)
+        print(f"Loaded population raster {POPULATION_RASTER_PATH} ({raster.rows} x {raster.cols} cells)")
+        return raster
+    except Exception as e:
+        print(f"Error loading population raster: {e}")
+        return None
+
+
+population_raster = load_population_raster()
+
+
+def load_airspace_index():
+    """The configured airspace index, or None when unset or unreadable"""
+    if not AIRSPACE_GEOJSON_PATH:
+        return None
+    try:
+        index = AirspaceIndex.load(AIRSPACE_GEOJSON_PATH, AIRSPACE_DEFAULT_ARC)
+        print(f"Loaded {len(index.volumes)} airspace volumes from {AIRSPACE_GEOJSON_PATH}")
+        return index
+    except Exception as e:
+        print(f"Error loading airspace volumes: {e}")
+        return None
+
+
+airspace_index = load_airspace_index()
+
+
+# Key concepts (phrases) recorded in the knowledge base
+PHRASE_PATTERNS = [
+    r'operating (?:permit|certificate)',
+    r'airworthiness acceptance',
+    r'flight coordinator',
+    r'operations supervisor',
+    r'strategic deconfliction',
+    r'conformance monitoring',
+    r'detect and avoid',
+    r'remote identification',
+    r'population density',
+    r'category \d+',
+    r'BVLOS',
+    r'beyond visual line of sight',
+    r'ground control station',
+    r'command and control',
+    r'hazardous materials?',
+    r'safety management',
+    r'emergency procedures?',
+    r'preflight requirements?',
+    r'operating restrictions?',
+]
+
+# Operation types as (name, pattern); longer alternatives first so they win at the same position
+OPERATION_TYPE_PATTERNS = [
+    ('package delivery', r'package delivery'),
+    ('agricultural', r'agricultural|agriculture'),
+    ('aerial surveying', r'aerial surveying|surveying'),
+    ('civic interest', r'civic interest'),
+    ('recreational', r'recreational'),
+    ('demonstration', r'demonstration'),
+    ('flight test', r'flight test'),
+]
+
+# Numerical values (weights, speeds, altitudes, distances)
+NUMBER_PATTERN = r'\b(?P<number_value>\d{1,4}(?:,\d{3})*)\s*(?P<number_unit>pounds?|lbs?|feet?|ft|mph|knots?|miles?|nautical|hours?|days?|months?|years?)\b'
+
+# All of the above as one alternation; match.lastgroup tells which one fired. Every
+# phrase and operation type starts with a literal letter at a word boundary, so a
+# lookahead on those letters (and digits, for numbers) lets the regex engine skip
+# most positions without trying each alternative.
+_LEADING_CHARS = sorted({
+    alternative[0].lower()
+    for pattern in PHRASE_PATTERNS + [pattern for _, pattern in OPERATION_TYPE_PATTERNS]
+    for alternative in pattern.split('|')
+})
+KNOWLEDGE_PATTERN = re.compile(r'\b(?=[' + ''.join(_LEADING_CHARS) + r'\d])(?:' + '|'.join(
+    [f'(?P<phrase{i}>{pattern})' for i, pattern in enumerate(PHRASE_PATTERNS)]
+    + [f'(?P<op{i}>{pattern})' for i, (_, pattern) in enumerate(OPERATION_TYPE_PATTERNS)]
+    + [f'(?P<number>{NUMBER_PATTERN})']
+) + ')', re.IGNORECASE)
+
 # Pre-defined synonym dictionary for fast lookup (no external dependencies)
 SYNONYM_DICT = {
     'weight': ['mass', 'pound', 'lb', 'lbs', 'weight limit', 'maximum weight', 'weight restriction', 
@@ -34,6 +245,62 @@ SYNONYM_DICT = {
     'visual': ['sight', 'view', 'line of sight', 'LOS', 'VLOS'],
 }
 
+
+class SynonymIndex:
+    """Phrase-aware tokenizer and query expansion for a synonym dictionary
+
+    Text becomes its words plus one underscore-joined term per dictionary
+    phrase it contains ('beyond visual line of sight' ->
+    'beyond_visual_line_of_sight'), found through a first word -> phrases
+    table, so indexing and querying see the same multi-word terms. Each term
+    expands to its related terms in both directions of the dictionary.
+    """
+    def __init__(self, synonym_dict):
+        self.phrases = {}  # first word -> word tuples of the phrases starting with it, longest first
+        self.expansions = {}  # term -> related terms
+        for head, synonyms in synonym_dict.items():
+            head_term = self.term(head)
+            for text in [head] + list(synonyms):
+                words = tuple(re.findall(r'\w+', text.lower()))
+                if len(words) > 1:
+                    self.phrases.setdefault(words[0], set()).add(words)
+                term = '_'.join(words)
+                if term and term != head_term:
+                    self.expansions.setdefault(head_term, set()).add(term)
+                    self.expansions.setdefault(term, set()).add(head_term)
+        self.phrases = {word: sorted(phrases, key=len, reverse=True) for word, phrases in self.phrases.items()}
+
+    @staticmethod
+    def term(text):
+        """Index term of a word or phrase"""
+        return '_'.join(re.findall(r'\w+', text.lower()))
+
+    def words(self):
+        """Every single word appearing in the dictionary"""
+        return {word for term in self.expansions for word in term.split('_')}
+
+    def terms(self, text):
+        """(words, words followed by every dictionary phrase occurrence as one term)"""
+        words = re.findall(r'\w+', text.lower())
+        terms = list(words)
+        for i, word in enumerate(words):
+            for phrase in self.phrases.get(word, ()):
+                if tuple(words[i:i + len(phrase)]) == phrase:
+                    terms.append('_'.join(phrase))
+        return words, terms
+
+    def query_terms(self, query, synonym_weight=0.5):
+        """Query terms (weight 1) plus the terms they expand to (synonym_weight)"""
+        weights = dict.fromkeys(self.terms(query)[1], 1.0)
+        for term in list(weights):
+            for related in self.expansions.get(term, ()):
+                if related not in weights:
+                    weights[related] = synonym_weight
+        return weights
+
+
+SYNONYM_INDEX = SynonymIndex(SYNONYM_DICT)
+
 # Simple TF-IDF like embeddings without heavy dependencies
 def create_simple_embedding(text):
     """Create a simple embedding using word frequency (lightweight alternative)"""
@@ -42,108 +309,709 @@ def create_simple_embedding(text):
     word_counts = Counter(words)
     return word_counts
 
+
+def rule_embedding_text(rule):
+    """Text of a rule as scored by the TF-IDF matrix"""
+    return f"""
+            Rule {rule.get('rule_number', '')}: {rule.get('title', '')}
+            Category: {rule.get('category', '')}
+            Definition: {rule.get('definition', '')}
+            Description: {rule.get('description', '')}
+            """
+
+
+def bm25_rule_counts(rule, synonyms=SYNONYM_INDEX):
+    """(term Counter including dictionary phrases, word count) of a rule as indexed by BM25Retriever"""
+    text = f"{rule.get('title', '')} {rule.get('description', '')} {rule.get('definition', '')}"
+    words, terms = synonyms.terms(text)
+    return Counter(terms), len(words)
+
+
+def extract_rule_knowledge(rule):
+    """Knowledge-base terms of one rule: one KNOWLEDGE_PATTERN pass per field"""
+    word_freq = Counter()
+    phrases = set()
+    operation_types = set()
+    numerical_values = set()
+    for field in ('title', 'description', 'definition'):
+        text = rule.get(field, '')
+        if not text:
+            continue
+        
+        # Extract important terms (nouns, technical terms, numbers)
+        word_freq.update(re.findall(r'\b[a-zA-Z]{3,}\b', text.lower()))
+        
+        for match in KNOWLEDGE_PATTERN.finditer(text):
+            kind = match.lastgroup
+            if kind == 'number':
+                numerical_values.add(f"{match.group('number_value')} {match.group('number_unit')}")
+            elif kind.startswith('op'):
+                # Operation types only count when the description mentions them
+                if field == 'description':
+                    operation_types.add(OPERATION_TYPE_PATTERNS[int(kind[2:])][0])
+            else:
+                phrases.add(match.group().lower())
+    return {
+        'word_freq': word_freq,
+        'phrases': phrases,
+        'operation_types': operation_types,
+        'numerical_values': numerical_values,
+    }
+
+
+def rule_fingerprint(rule):
+    """Content hash of a rule; two rules with the same fingerprint index identically"""
+    return hashlib.sha1(json.dumps(rule, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def analyze_rule(rule):
+    """All per-rule tokenization the indexes need, so a reload only redoes rules that changed"""
+    return {
+        'embedding_counts': create_simple_embedding(rule_embedding_text(rule)),
+        'bm25_counts': bm25_rule_counts(rule),
+        'knowledge': extract_rule_knowledge(rule),
+        'paragraph_counts': [create_simple_embedding(text) for text in rule_paragraphs(rule)],
+    }
+
+
+def rule_paragraphs(rule):
+    """Paragraph chunks of a rule (its whole description when it has no paragraph list)"""
+    paragraphs = [text.strip() for text in rule.get('paragraphs') or [] if text and text.strip()]
+    return paragraphs or [rule.get('description') or rule.get('definition') or '']
+
+
+def estimate_tokens(text):
+    """Rough LLM token count (about four characters per token)"""
+    return len(text) // 4 + 1
+
+
+def pack_postings(postings):
+    """Flatten term -> array postings into (terms, offsets, values) for on-disk storage"""
+    terms = list(postings)
+    lengths = [len(postings[term]) for term in terms]
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(lengths)
+    values = np.concatenate([np.asarray(postings[term], dtype=np.uint32) for term in terms]) if terms else np.zeros(0, dtype=np.uint32)
+    return np.array(terms, dtype=str), offsets, values
+
+
+def unpack_postings(terms, offsets, values):
+    """Inverse of pack_postings; the posting arrays are views into `values` (no copy)"""
+    return {term: values[offsets[i]:offsets[i + 1]] for i, term in enumerate(terms.tolist())}
+
+
+def top_k_indices(scores, k):
+    """Indices of the k highest scores, best first, using argpartition instead of a full sort"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.array([], dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+class TfidfMatrix:
+    """L2-normalized TF-IDF documents x terms matrix in CSR form (plain NumPy arrays)"""
+    def __init__(self, documents=None, counts=None):
+        """Build from raw documents, or from their precomputed create_simple_embedding() counts"""
+        self.vocabulary = {}
+        if counts is None:
+            counts = [create_simple_embedding(doc) for doc in documents]
+        for word_counts in counts:
+            for word in word_counts:
+                if word not in self.vocabulary:
+                    self.vocabulary[word] = len(self.vocabulary)
+
+        # CSR layout: row i owns indices/data[indptr[i]:indptr[i + 1]]
+        indptr = [0]
+        indices = []
+        tf = []
+        for word_counts in counts:
+            for word, count in word_counts.items():
+                indices.append(self.vocabulary[word])
+                tf.append(count)
+            indptr.append(len(indices))
+
+        self.n_docs = len(counts)
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.array(indices, dtype=np.int32)
+
+        # Smoothed IDF, same form as scikit-learn's default
+        df = np.bincount(self.indices, minlength=len(self.vocabulary))
+        self.idf = (np.log((1 + self.n_docs) / (1 + df)) + 1).astype(np.float32)
+
+        data = np.array(tf, dtype=np.float32) * self.idf[self.indices]
+        self.row_ids = np.repeat(np.arange(self.n_docs, dtype=np.int32), np.diff(self.indptr))
+        norms = np.sqrt(np.bincount(self.row_ids, weights=data * data, minlength=self.n_docs))
+        norms[norms == 0] = 1.0
+        self.data = (data / norms[self.row_ids]).astype(np.float32)
+
+    def __len__(self):
+        return self.n_docs
+
+    def to_arrays(self):
+        """Arrays needed to restore the matrix with from_arrays()"""
+        return {
+            'vocabulary': np.array(list(self.vocabulary), dtype=str),
+            'idf': self.idf,
+            'indptr': self.indptr,
+            'indices': self.indices,
+            'data': self.data,
+            'row_ids': self.row_ids,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Restore a matrix saved with to_arrays() without re-tokenizing the documents"""
+        matrix = cls.__new__(cls)
+        matrix.vocabulary = {word: col for col, word in enumerate(arrays['vocabulary'].tolist())}
+        matrix.idf = arrays['idf']
+        matrix.indptr = arrays['indptr']
+        matrix.indices = arrays['indices']
+        matrix.data = arrays['data']
+        matrix.row_ids = arrays['row_ids']
+        matrix.n_docs = len(matrix.indptr) - 1
+        return matrix
+
+    def query_vector(self, text):
+        """Dense L2-normalized TF-IDF vector for a query (terms outside the vocabulary are dropped)"""
+        vec = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for word, count in create_simple_embedding(text).items():
+            col = self.vocabulary.get(word)
+            if col is not None:
+                vec[col] = count * self.idf[col]
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec /= norm
+        return vec
+
+    def score(self, text):
+        """Cosine similarity of the query against every document in one sparse matrix-vector product"""
+        q = self.query_vector(text)
+        return np.bincount(self.row_ids, weights=self.data * q[self.indices], minlength=self.n_docs)
+
+    def score_batch(self, texts):
+        """Similarity of many queries at once as a (queries x documents) array (one sparse x dense product)"""
+        if not texts:
+            return np.zeros((0, self.n_docs), dtype=np.float32)
+        q = np.stack([self.query_vector(text) for text in texts], axis=1)  # terms x queries
+        products = self.data[:, None] * q[self.indices]  # one row per stored (doc, term) entry
+        scores = np.zeros((self.n_docs, len(texts)), dtype=np.float32)
+        starts = self.indptr[:-1]
+        nonempty = starts < self.indptr[1:]
+        if products.shape[0]:
+            scores[nonempty] = np.add.reduceat(products, starts[nonempty], axis=0)
+        return scores.T
+
+
+class ParagraphIndex:
+    """TF-IDF index over rule paragraphs; chunk ids map back to (rule position, paragraph number)"""
+    def __init__(self, rules, paragraph_counts=None):
+        """paragraph_counts optionally gives each rule's per-paragraph create_simple_embedding() counts"""
+        self.rules = rules
+        counts = []
+        offsets = [0]
+        for idx, rule in enumerate(rules):
+            if paragraph_counts is not None:
+                counts.extend(paragraph_counts[idx])
+            else:
+                counts.extend(create_simple_embedding(text) for text in rule_paragraphs(rule))
+            offsets.append(len(counts))
+        # Rule i owns chunks offsets[i]:offsets[i + 1], in paragraph order
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.matrix = TfidfMatrix(counts=counts)
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def to_arrays(self):
+        """Arrays needed to restore the index with from_arrays()"""
+        arrays = {f'matrix.{name}': arr for name, arr in self.matrix.to_arrays().items()}
+        arrays['offsets'] = self.offsets
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, rules, arrays):
+        """Restore an index saved with to_arrays() without re-tokenizing the paragraphs"""
+        index = cls.__new__(cls)
+        index.rules = rules
+        index.offsets = arrays['offsets']
+        index.matrix = TfidfMatrix.from_arrays({name[len('matrix.'):]: arr for name, arr in arrays.items()
+                                                if name.startswith('matrix.')})
+        return index
+
+    def pack(self, query, rule_positions, budget):
+        """Best-scoring paragraphs of the given rules that fit in `budget` tokens
+
+        Every rule first gets its single best paragraph (in retrieval order) so
+        the answer stays anchored to each rule number; the remaining budget goes
+        to the highest-scoring paragraphs overall. Paragraphs whose normalized
+        text was already packed are skipped. Returns {rule position: [paragraph
+        text, ...]} with each rule's paragraphs in document order.
+        """
+        scores = self.matrix.score(query)
+        first_picks = []
+        rest = []
+        for rank, position in enumerate(rule_positions):
+            start, stop = int(self.offsets[position]), int(self.offsets[position + 1])
+            ranked = np.argsort(-scores[start:stop], kind='stable')
+            chunks = [(float(scores[start + i]), rank, int(i), position) for i in ranked]
+            first_picks.extend(chunks[:1])
+            rest.extend(chunks[1:])
+        rest.sort(key=lambda chunk: (-chunk[0], chunk[1], chunk[2]))
+
+        selected = {position: [] for position in rule_positions}
+        seen = set()
+        used = 0
+        for _, _, paragraph, position in first_picks + rest:
+            text = rule_paragraphs(self.rules[position])[paragraph]
+            key = normalize_query(text)
+            cost = estimate_tokens(text)
+            if key in seen or used + cost > budget:
+                continue
+            seen.add(key)
+            used += cost
+            selected[position].append(paragraph)
+
+        return {position: [rule_paragraphs(self.rules[position])[i] for i in sorted(chosen)]
+                for position, chosen in selected.items()}
+
+
 class FastRetriever:
     """Fast inverted index-based retriever with synonym support"""
     def __init__(self, rules, synonym_dict):
         self.rules = rules
         self.synonym_dict = synonym_dict
+        self.synonyms = SynonymIndex(synonym_dict)
         self.inverted_index = {}
         self.build_index()
     
     def build_index(self):
-        """Build inverted index: word -> [rule_ids] for O(1) lookup"""
+        """Build inverted index: term -> [rule_ids] for O(1) lookup"""
         print("Building inverted index...")
         for idx, rule in enumerate(self.rules):
             text = f"{rule.get('title', '')} {rule.get('description', '')} {rule.get('definition', '')}"
-            words = set(re.findall(r'\w+', text.lower()))
             
-            # Add word and all its synonyms to index
-            for word in words:
-                if word not in self.inverted_index:
-                    self.inverted_index[word] = []
-                if idx not in self.inverted_index[word]:
-                    self.inverted_index[word].append(idx)
-                
-                # Add synonyms
-                if word in self.synonym_dict:
-                    for syn in self.synonym_dict[word]:
-                        syn_normalized = syn.lower().replace(' ', '_')
-                        if syn_normalized not in self.inverted_index:
-                            self.inverted_index[syn_normalized] = []
-                        if idx not in self.inverted_index[syn_normalized]:
-                            self.inverted_index[syn_normalized].append(idx)
+            # Words and dictionary phrases only; synonyms are expanded on the
+            # query side. Rules are visited in order, so checking the last
+            # posting is enough to avoid duplicates.
+            for term in set(self.synonyms.terms(text)[1]):
+                postings = self.inverted_index.setdefault(term, [])
+                if not postings or postings[-1] != idx:
+                    postings.append(idx)
         
         print(f"Built inverted index with {len(self.inverted_index)} unique terms")
     
+    def to_arrays(self):
+        """Arrays needed to restore the index with from_arrays()"""
+        terms, offsets, ids = pack_postings(self.inverted_index)
+        return {'terms': terms, 'offsets': offsets, 'ids': ids}
+
+    @classmethod
+    def from_arrays(cls, rules, synonym_dict, arrays):
+        """Restore an index saved with to_arrays() without rebuilding it"""
+        retriever = cls.__new__(cls)
+        retriever.rules = rules
+        retriever.synonym_dict = synonym_dict
+        retriever.synonyms = SynonymIndex(synonym_dict)
+        retriever.inverted_index = unpack_postings(arrays['terms'], arrays['offsets'], arrays['ids'])
+        return retriever
+
+    def document_frequencies(self):
+        """term -> number of rules containing it"""
+        return {term: len(ids) for term, ids in self.inverted_index.items()}
+
     def search(self, query, top_k=5):
         """Fast search using inverted index"""
-        query_words = set(re.findall(r'\w+', query.lower()))
-        
-        # Find rules containing any query word or synonym
+        return [self.rules[rule_id] for rule_id in self.search_indices(query, top_k)]
+
+    def search_indices(self, query, top_k=5):
+        """Same as search(), but returns rule positions instead of rule dicts"""
+        # Find rules containing any query term or phrase; synonym matches count half
         rule_matches = Counter()
-        for word in query_words:
-            # Direct match
-            if word in self.inverted_index:
-                for rule_id in self.inverted_index[word]:
-                    rule_matches[rule_id] += 1
-            
-            # Synonym match
-            if word in self.synonym_dict:
-                for syn in self.synonym_dict[word]:
-                    syn_normalized = syn.lower().replace(' ', '_')
-                    if syn_normalized in self.inverted_index:
-                        for rule_id in self.inverted_index[syn_normalized]:
-                            rule_matches[rule_id] += 1
+        for term, weight in self.synonyms.query_terms(query).items():
+            for rule_id in self.inverted_index.get(term, ()):
+                rule_matches[rule_id] += weight
         
         # Return top-k by match count
         sorted_rules = sorted(rule_matches.items(), key=lambda x: x[1], reverse=True)
-        return [self.rules[rule_id] for rule_id, _ in sorted_rules[:top_k]]
+        return [rule_id for rule_id, _ in sorted_rules[:top_k]]
+
+
+class BM25Retriever:
+    """BM25-ranked inverted index with compact NumPy posting arrays and synonym expansion"""
+    def __init__(self, rules, synonym_dict, k1=1.2, b=0.75, synonym_weight=0.5, rule_counts=None):
+        """rule_counts optionally gives each rule's (word Counter, word count) so it is not re-tokenized"""
+        self.rules = rules
+        self.synonym_dict = synonym_dict
+        self.k1 = k1
+        self.b = b
+        self.synonym_weight = synonym_weight
+        self.postings = {}  # term -> (sorted rule positions, term frequencies)
+        self.doc_lengths = np.zeros(0, dtype=np.float32)
+        self.avg_doc_length = 0.0
+        self.synonyms = SynonymIndex(synonym_dict)
+        self.build_index(rule_counts)
+
+    def build_index(self, rule_counts=None):
+        """Build term -> (rule positions, term frequencies) postings in a single pass"""
+        print("Building BM25 index...")
+        doc_ids = {}
+        term_freqs = {}
+        doc_lengths = []
+        for idx, rule in enumerate(self.rules):
+            if rule_counts is not None:
+                word_counts, length = rule_counts[idx]
+            else:
+                word_counts, length = bm25_rule_counts(rule, self.synonyms)
+            doc_lengths.append(length)
+            for word, tf in word_counts.items():
+                doc_ids.setdefault(word, array('I')).append(idx)
+                term_freqs.setdefault(word, array('I')).append(tf)
+
+        # Rules are visited in order, so every posting list is already sorted
+        self.postings = {
+            word: (np.frombuffer(ids, dtype=np.uint32), np.frombuffer(term_freqs[word], dtype=np.uint32))
+            for word, ids in doc_ids.items()
+        }
+        self.doc_lengths = np.array(doc_lengths, dtype=np.float32)
+        self.avg_doc_length = float(self.doc_lengths.mean()) if doc_lengths else 0.0
+
+        print(f"Built BM25 index with {len(self.postings)} unique terms")
+
+    def to_arrays(self):
+        """Arrays needed to restore the index with from_arrays()"""
+        terms, offsets, ids = pack_postings({term: ids for term, (ids, _) in self.postings.items()})
+        _, _, tfs = pack_postings({term: tfs for term, (_, tfs) in self.postings.items()})
+        return {'terms': terms, 'offsets': offsets, 'ids': ids, 'tfs': tfs, 'doc_lengths': self.doc_lengths}
+
+    @classmethod
+    def from_arrays(cls, rules, synonym_dict, arrays, **params):
+        """Restore an index saved with to_arrays() without rebuilding it"""
+        retriever = cls.__new__(cls)
+        retriever.rules = rules
+        retriever.synonym_dict = synonym_dict
+        retriever.k1 = params.get('k1', 1.2)
+        retriever.b = params.get('b', 0.75)
+        retriever.synonym_weight = params.get('synonym_weight', 0.5)
+        retriever.synonyms = SynonymIndex(synonym_dict)
+        ids = unpack_postings(arrays['terms'], arrays['offsets'], arrays['ids'])
+        tfs = unpack_postings(arrays['terms'], arrays['offsets'], arrays['tfs'])
+        retriever.postings = {term: (ids[term], tfs[term]) for term in ids}
+        retriever.doc_lengths = arrays['doc_lengths']
+        retriever.avg_doc_length = float(retriever.doc_lengths.mean()) if len(retriever.doc_lengths) else 0.0
+        return retriever
+
+    def document_frequencies(self):
+        """term -> number of rules containing it"""
+        return {term: len(ids) for term, (ids, _) in self.postings.items()}
+
+    def _idf(self, doc_freq):
+        """BM25 IDF with the usual +1 so very common terms never score negative"""
+        n_docs = len(self.rules)
+        return np.log(1 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def query_terms(self, query):
+        """Query words and phrases plus their synonyms, with the weight each contributes to the score"""
+        return self.synonyms.query_terms(query, self.synonym_weight)
+
+    def score(self, query):
+        """BM25 score of every rule for the query (zero for rules sharing no terms)"""
+        scores = np.zeros(len(self.rules), dtype=np.float32)
+        if not self.avg_doc_length:
+            return scores
+        for term, weight in self.query_terms(query).items():
+            if term not in self.postings:
+                continue
+            ids, tfs = self.postings[term]
+            tf = tfs.astype(np.float32)
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[ids] / self.avg_doc_length)
+            scores[ids] += weight * self._idf(len(ids)) * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query, top_k=5):
+        """Top-k rules by BM25 score"""
+        return [self.rules[rule_id] for rule_id in self.search_indices(query, top_k)]
+
+    def search_indices(self, query, top_k=5):
+        """Top-k rule positions by BM25 score, selected with a bounded heap"""
+        scores = self.score(query)
+        candidates = np.flatnonzero(scores)
+        best = heapq.nlargest(top_k, zip(scores[candidates].tolist(), candidates.tolist()))
+        return [rule_id for _, rule_id in best]
 
 
 class DroneRAG:
-    def __init__(self, rules_file='parsed_rules.json'):
-        """Initialize the RAG system with drone rules"""
+    def __init__(self, rules_file='parsed_rules.json', snapshot_dir=INDEX_SNAPSHOT_DIR, previous=None):
+        """Initialize the RAG system with drone rules
+
+        When `previous` (the instance being replaced by a reload) is given, its
+        per-rule analyses and caches are reused so only changed rules are re-tokenized.
+        """
+        self.rules_file = rules_file
         self.rules = []
+        self.rules_hash = None
+        self.rule_positions = {}  # rule id -> position in self.rules
+        self.rule_fingerprints = {}  # rule id -> content hash, part of every answer cache key
+        self.rule_analyses = dict(previous.rule_analyses) if previous else {}  # content hash -> analyze_rule()
         self.embeddings = []
         self.synonym_dict = SYNONYM_DICT
         self.fast_retriever = None
+        self.spelling = None  # TrigramCorrector over the retriever vocabulary
+        self.paragraph_index = None  # paragraph chunks packed into prompts
         self.knowledge_base = None  # Will store extracted terms and concepts
+        self.important_words = set()  # knowledge_base['important_words'] for O(1) membership tests
+        self.rule_terms = []  # per-rule term/phrase table used by generate_followups
+        self.category_index = {}  # category -> positions of its rules, in file order
+        self.citation_graph = None  # § and subpart cross-references between rules
+        self.cursor_offsets = {}  # category -> {rule id: offset in category_index[category]}
+        # Encoded /api/rules and /api/categories bodies; never carried over a reload
+        self.response_cache = AnswerCache(None, ttl=float('inf'), memory_size=RULES_RESPONSE_CACHE_SIZE)
+        if previous:
+            self.followup_cache = previous.followup_cache
+            self.answer_cache = previous.answer_cache
+        else:
+            self.followup_cache = AnswerCache(None, ttl=float('inf'), memory_size=FOLLOWUP_CACHE_SIZE)
+            self.answer_cache = AnswerCache(ANSWER_CACHE_PATH or None, ttl=ANSWER_CACHE_TTL,
+                                            memory_size=ANSWER_CACHE_MEMORY_SIZE, disk_size=ANSWER_CACHE_DISK_SIZE)
         self.load_rules(rules_file)
+        self.build_category_index()
+        self.citation_graph = CitationGraph(self.rules)
+        if not (snapshot_dir and self.load_snapshot(snapshot_dir)):
+            self.build_indexes()
+        self.build_rule_terms()
+        self.build_spelling_corrector()
+        
+        # Drop analyses of rules that no longer exist
+        current = set(self.rule_fingerprints.values())
+        self.rule_analyses = {key: value for key, value in self.rule_analyses.items() if key in current}
+    
+    def rule_analysis(self, rule) -> Dict:
+        """analyze_rule() for a rule, reused while the rule's content is unchanged"""
+        key = self.rule_fingerprints.get(rule.get('id')) or rule_fingerprint(rule)
+        analysis = self.rule_analyses.get(key)
+        if analysis is None:
+            analysis = analyze_rule(rule)
+            self.rule_analyses[key] = analysis
+        return analysis
+    
+    def rule_versions(self, relevant_rules: List[Dict]) -> List[str]:
+        """Rule IDs tagged with their content hash, so cached answers expire when a rule is edited"""
+        return [f"{rule.get('id')}@{self.rule_fingerprints.get(rule.get('id'), '')[:12]}" for rule in relevant_rules]
+    
+    def build_indexes(self):
+        """Build every derived structure from self.rules"""
         self.create_embeddings()
         self.build_fast_retriever()
+        self.build_paragraph_index()
         self.build_knowledge_base()
         
     def load_rules(self, rules_file):
         """Load drone rules from JSON file"""
         try:
-            with open(rules_file, 'r', encoding='utf-8') as f:
-                self.rules = json.load(f)
+            with open(rules_file, 'rb') as f:
+                raw = f.read()
+            self.rules_hash = hashlib.sha256(raw).hexdigest()
+            self.rules = json.loads(raw.decode('utf-8'))
+            self.rule_positions = {rule.get('id'): idx for idx, rule in enumerate(self.rules)}
+            self.rule_fingerprints = {rule.get('id'): rule_fingerprint(rule) for rule in self.rules}
             print(f"Loaded {len(self.rules)} drone rules")
         except Exception as e:
             print(f"Error loading rules: {e}")
             self.rules = []
+            self.rules_hash = None
+    
+    def build_category_index(self):
+        """Category -> rule positions (None lists every rule), plus rule id -> offset for cursors"""
+        self.category_index = {None: list(range(len(self.rules)))}
+        for idx, rule in enumerate(self.rules):
+            self.category_index.setdefault(rule.get('category', 'unknown'), []).append(idx)
+        self.cursor_offsets = {
+            category: {self.rules[idx].get('id'): offset for offset, idx in enumerate(positions)}
+            for category, positions in self.category_index.items()
+        }
+    
+    def categories(self) -> List[str]:
+        """Sorted category names"""
+        return sorted(category for category in self.category_index if category is not None)
+    
+    def rules_page(self, category=None, cursor=None, limit=RULES_PAGE_SIZE) -> Dict:
+        """One page of rules in file order; `cursor` is the id of the first rule to return
+
+        Raises ValueError for a cursor that is not a rule of this category.
+        """
+        positions = self.category_index.get(category, [])
+        start = 0
+        if cursor is not None:
+            start = self.cursor_offsets.get(category, {}).get(cursor)
+            if start is None:
+                raise ValueError(f"Unknown cursor: {cursor}")
+        page = positions[start:start + limit]
+        end = start + len(page)
+        return {
+            'rules': [self.rules[idx] for idx in page],
+            'total': len(positions),
+            'limit': limit,
+            'next_cursor': self.rules[positions[end]].get('id') if end < len(positions) else None,
+        }
+    
+    def related_rules(self, rule_number) -> Dict:
+        """Rules a rule cites, the rules citing it, and the other subparts it refers to"""
+        graph = self.citation_graph
+        position = graph.positions[rule_number]
+        def brief(positions):
+            return [{key: self.rules[idx].get(key, 'N/A') for key in ('rule_number', 'title', 'category')}
+                    for idx in positions.tolist()]
+        return {
+            'rule_number': rule_number,
+            'title': self.rules[position].get('title', 'N/A'),
+            'subpart': graph.subparts[position],
+            'subpart_heading': graph.subpart_headings.get(graph.subparts[position]),
+            'cites': brief(graph.cites(position)),
+            'cited_by': brief(graph.cited_by(position)),
+            'cited_subparts': [
+                {'subpart': letter,
+                 'heading': graph.subpart_headings.get(letter),
+                 'rule_numbers': [self.rules[idx].get('rule_number') for idx in graph.subpart_members.get(letter, [])]}
+                for letter in graph.cited_subparts[position]
+            ],
+        }
+    
+    def encoded_response(self, key, build):
+        """(JSON bytes, gzipped bytes, content hash) for build()'s payload, serialized once per key"""
+        entry = self.response_cache.get(key)
+        if entry is None:
+            body = json.dumps(build(), separators=(',', ':')).encode('utf-8')
+            entry = (body, gzip.compress(body, compresslevel=6), hashlib.sha256(body).hexdigest()[:32])
+            self.response_cache.put(key, entry)
+        return entry
+    
+    def snapshot_key(self) -> Dict:
+        """Everything a snapshot must match to be reused: format, rules content and retriever mode"""
+        return {
+            'format_version': SNAPSHOT_FORMAT_VERSION,
+            'rules_sha256': self.rules_hash,
+            'retriever_mode': RETRIEVER_MODE,
+        }
+    
+    def save_snapshot(self, snapshot_dir):
+        """Write all derived structures as .npy arrays plus a manifest carrying the snapshot key"""
+        if not self.rules:
+            raise ValueError("No rules loaded; nothing to snapshot")
+        os.makedirs(snapshot_dir, exist_ok=True)
+        
+        arrays = {f'embeddings.{name}': arr for name, arr in self.embeddings.to_arrays().items()}
+        arrays.update({f'retriever.{name}': arr for name, arr in self.fast_retriever.to_arrays().items()})
+        arrays.update({f'paragraphs.{name}': arr for name, arr in self.paragraph_index.to_arrays().items()})
+        for name, arr in arrays.items():
+            np.save(os.path.join(snapshot_dir, f'{name}.npy'), arr, allow_pickle=False)
+        
+        # The manifest is written last so a half-written snapshot never validates
+        manifest = dict(self.snapshot_key(), arrays=sorted(arrays), knowledge_base=self.knowledge_base)
+        tmp_path = os.path.join(snapshot_dir, 'manifest.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, os.path.join(snapshot_dir, 'manifest.json'))
+        print(f"Wrote index snapshot to {snapshot_dir} ({len(arrays)} arrays)")
+    
+    def load_snapshot(self, snapshot_dir) -> bool:
+        """Memory-map a snapshot written by save_snapshot(); returns False if it is missing or stale"""
+        if not self.rules:
+            return False
+        try:
+            with open(os.path.join(snapshot_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return False
+        
+        if any(manifest.get(key) != value for key, value in self.snapshot_key().items()):
+            print("Index snapshot is stale (rules, format or retriever mode changed); rebuilding")
+            return False
+        
+        try:
+            arrays = {
+                name: np.load(os.path.join(snapshot_dir, f'{name}.npy'), mmap_mode='r', allow_pickle=False)
+                for name in manifest['arrays']
+            }
+            def group(prefix):
+                return {name[len(prefix):]: arr for name, arr in arrays.items() if name.startswith(prefix)}
+            
+            self.embeddings = TfidfMatrix.from_arrays(group('embeddings.'))
+            retriever_cls = FastRetriever if RETRIEVER_MODE == 'inverted' else BM25Retriever
+            self.fast_retriever = retriever_cls.from_arrays(self.rules, self.synonym_dict, group('retriever.'))
+            self.paragraph_index = ParagraphIndex.from_arrays(self.rules, group('paragraphs.'))
+            self.knowledge_base = manifest['knowledge_base']
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Error loading index snapshot: {e}; rebuilding")
+            self.embeddings = []
+            self.fast_retriever = None
+            self.paragraph_index = None
+            self.knowledge_base = None
+            return False
+        
+        print(f"Loaded index snapshot from {snapshot_dir}")
+        return True
     
     def build_fast_retriever(self):
-        """Build fast inverted index retriever"""
+        """Build the candidate retriever selected by RETRIEVER_MODE"""
+        if self.rules:
+            if RETRIEVER_MODE == 'inverted':
+                self.fast_retriever = FastRetriever(self.rules, self.synonym_dict)
+            else:
+                self.fast_retriever = BM25Retriever(
+                    self.rules, self.synonym_dict,
+                    rule_counts=[self.rule_analysis(rule)['bm25_counts'] for rule in self.rules]
+                )
+    
+    def build_spelling_corrector(self):
+        """Build the trigram index that maps misspelled query words to retriever terms"""
+        if not (QUERY_SPELL_CORRECTION and self.fast_retriever):
+            return
+        # Dictionary words are valid corrections even where no rule uses them,
+        # since the synonym expansion carries them to the words rules do use
+        frequencies = dict.fromkeys(self.fast_retriever.synonyms.words(), 0)
+        frequencies.update(self.fast_retriever.document_frequencies())
+        self.spelling = TrigramCorrector(frequencies)
+        print(f"Built spelling index over {len(self.spelling)} terms")
+    
+    def correct_query(self, query: str):
+        """(query with misspelled words replaced by the closest indexed terms, [{'token', 'correction'}, ...])"""
+        if not self.spelling:
+            return query, []
+        return self.spelling.correct_text(query)
+    
+    def build_paragraph_index(self):
+        """Build the paragraph chunk index used to pack prompts"""
         if self.rules:
-            self.fast_retriever = FastRetriever(self.rules, self.synonym_dict)
+            self.paragraph_index = ParagraphIndex(
+                self.rules, paragraph_counts=[self.rule_analysis(rule)['paragraph_counts'] for rule in self.rules]
+            )
+            print(f"Built paragraph index with {len(self.paragraph_index)} chunks")
     
     def build_knowledge_base(self):
-        """Extract all key terms, concepts, and entities from rules to build comprehensive knowledge base"""
+        """Extract all key terms, concepts, and entities from rules to build comprehensive knowledge base
+
+        Works rule by rule: one pass of KNOWLEDGE_PATTERN per field picks up key
+        phrases, operation types and numeric quantities together, so build time
+        and memory grow linearly with the corpus.
+        """
         if not self.rules:
             return
         
         print("Building knowledge base from rules...")
         
-        # Extract key terms
-        all_text = ' '.join([
-            f"{rule.get('title', '')} {rule.get('description', '')} {rule.get('definition', '')}"
-            for rule in self.rules
-        ])
+        word_freq = Counter()
+        operation_types = set()
+        numerical_values = set()
+        key_phrases = set()
+        rule_phrases = {}
         
-        # Extract important terms (nouns, technical terms, numbers)
-        words = re.findall(r'\b[a-zA-Z]{3,}\b', all_text.lower())
-        word_freq = Counter(words)
+        for rule in self.rules:
+            knowledge = self.rule_analysis(rule)['knowledge']
+            word_freq.update(knowledge['word_freq'])
+            operation_types.update(knowledge['operation_types'])
+            numerical_values.update(knowledge['numerical_values'])
+            key_phrases.update(knowledge['phrases'])
+            rule_phrases[rule.get('id', rule.get('rule_number', ''))] = sorted(knowledge['phrases'])
         
         # Filter out common words
         stop_words = {'the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'can', 'her', 'was', 'one', 'our', 'out', 'day', 'get', 'has', 'him', 'his', 'how', 'its', 'may', 'new', 'now', 'old', 'see', 'two', 'way', 'who', 'boy', 'did', 'its', 'let', 'put', 'say', 'she', 'too', 'use'}
@@ -154,62 +1022,11 @@ class DroneRAG:
         rule_numbers = [rule.get('rule_number', '') for rule in self.rules if rule.get('rule_number')]
         
         # Extract categories
-        categories = list(set([rule.get('category', '') for rule in self.rules if rule.get('category')]))
+        categories = sorted(set([rule.get('category', '') for rule in self.rules if rule.get('category')]))
         
-        # Extract operation types
-        operation_types = []
-        for rule in self.rules:
-            desc = rule.get('description', '').lower()
-            if 'package delivery' in desc:
-                operation_types.append('package delivery')
-            if 'agricultural' in desc or 'agriculture' in desc:
-                operation_types.append('agricultural')
-            if 'aerial surveying' in desc or 'surveying' in desc:
-                operation_types.append('aerial surveying')
-            if 'civic interest' in desc:
-                operation_types.append('civic interest')
-            if 'recreational' in desc:
-                operation_types.append('recreational')
-            if 'demonstration' in desc:
-                operation_types.append('demonstration')
-            if 'flight test' in desc:
-                operation_types.append('flight test')
-        
-        operation_types = list(set(operation_types))
-        
-        # Extract numerical values (weights, speeds, altitudes, distances)
-        numbers = re.findall(r'\b(\d{1,4}(?:,\d{3})*)\s*(pounds?|lbs?|feet?|ft|mph|knots?|miles?|nautical|hours?|days?|months?|years?)\b', all_text, re.IGNORECASE)
-        numerical_values = list(set([f"{num[0]} {num[1]}" for num in numbers]))
-        
-        # Extract key concepts (phrases)
-        key_phrases = []
-        phrase_patterns = [
-            r'operating (?:permit|certificate)',
-            r'airworthiness acceptance',
-            r'flight coordinator',
-            r'operations supervisor',
-            r'strategic deconfliction',
-            r'conformance monitoring',
-            r'detect and avoid',
-            r'remote identification',
-            r'population density',
-            r'category \d+',
-            r'BVLOS',
-            r'beyond visual line of sight',
-            r'ground control station',
-            r'command and control',
-            r'hazardous materials?',
-            r'safety management',
-            r'emergency procedures?',
-            r'preflight requirements?',
-            r'operating restrictions?',
-        ]
-        
-        for pattern in phrase_patterns:
-            matches = re.findall(pattern, all_text, re.IGNORECASE)
-            key_phrases.extend(matches)
-        
-        key_phrases = list(set([p.lower() for p in key_phrases]))
+        operation_types = sorted(operation_types)
+        numerical_values = sorted(numerical_values)
+        key_phrases = sorted(key_phrases)
         
         self.knowledge_base = {
             'important_words': list(important_words.keys())[:200],  # Top 200 words
@@ -218,52 +1035,40 @@ class DroneRAG:
             'operation_types': operation_types,
             'numerical_values': numerical_values[:50],  # Top 50 numerical values
             'key_phrases': key_phrases,
+            'rule_phrases': rule_phrases,  # rule id -> key phrases it contains
         }
         
         print(f"Knowledge base built: {len(important_words)} words, {len(rule_numbers)} rules, "
               f"{len(categories)} categories, {len(operation_types)} operation types, "
               f"{len(numerical_values)} numerical values, {len(key_phrases)} key phrases")
     
+    def build_rule_terms(self):
+        """Precompute, per rule, the text, words, title terms and operation types that follow-ups need"""
+        if not self.knowledge_base:
+            return
+        self.important_words = set(self.knowledge_base['important_words'])
+        self.rule_terms = []
+        for rule in self.rules:
+            text = f"{rule.get('title', '')} {rule.get('description', '')}".lower()
+            title = rule.get('title', '').lower().strip('.')
+            title_words = [w for w in re.findall(r'\b\w{4,}\b', title) if w not in ['this', 'that', 'with', 'from']]
+            description = rule.get('description', '').lower()
+            self.rule_terms.append({
+                'text': text,
+                'word_freq': Counter(re.findall(r'\b\w+\b', text)),
+                'title_terms': title_words[:2],
+                'operation_types': [op for op in self.knowledge_base['operation_types'] if op in description],
+            })
+    
     def create_embeddings(self):
-        """Create embeddings for all rules using simple word frequency"""
+        """Build the TF-IDF rules x terms matrix used for semantic scoring"""
         if not self.rules:
             return
         
         print("Creating embeddings for drone rules...")
-        self.embeddings = []
-        for rule in self.rules:
-            text = f"""
-            Rule {rule.get('rule_number', '')}: {rule.get('title', '')}
-            Category: {rule.get('category', '')}
-            Definition: {rule.get('definition', '')}
-            Description: {rule.get('description', '')}
-            """
-            embedding = create_simple_embedding(text)
-            self.embeddings.append(embedding)
-        
-        print(f"Created {len(self.embeddings)} embeddings")
-    
-    def _cosine_similarity(self, vec1, vec2):
-        """Calculate cosine similarity between two word frequency vectors"""
-        # Get all unique words
-        all_words = set(vec1.keys()) | set(vec2.keys())
-        
-        if not all_words:
-            return 0.0
-        
-        # Convert to vectors
-        v1 = np.array([vec1.get(word, 0) for word in all_words])
-        v2 = np.array([vec2.get(word, 0) for word in all_words])
+        self.embeddings = TfidfMatrix(counts=[self.rule_analysis(rule)['embedding_counts'] for rule in self.rules])
         
-        # Calculate cosine similarity
-        dot_product = np.dot(v1, v2)
-        norm1 = np.linalg.norm(v1)
-        norm2 = np.linalg.norm(v2)
-        
-        if norm1 == 0 or norm2 == 0:
-            return 0.0
-        
-        return dot_product / (norm1 * norm2)
+        print(f"Created {len(self.embeddings)} embeddings over {len(self.embeddings.vocabulary)} terms")
     
     def is_greeting(self, query: str) -> bool:
         """Detect if query is a greeting"""
@@ -286,63 +1091,117 @@ class DroneRAG:
 
 What would you like to know about drone regulations?"""
     
+    @metrics.timed('retrieval')
     def find_relevant_rules(self, query: str, top_k: int = 5) -> List[Dict]:
         """Find most relevant rules using fast inverted index + semantic similarity"""
         if not self.embeddings:
             return []
+        return self.rank_rules(self.correct_query(query)[0], top_k)
+    
+    def rank_rules(self, query: str, top_k: int = 5, similarities=None) -> List[Dict]:
+        """find_relevant_rules() for a query that has already been spell-corrected
+
+        `similarities` may carry this query's precomputed TF-IDF scores (see
+        find_relevant_rules_batch).
+        """
+        # One sparse matrix-vector product scores the query against every rule
+        if similarities is None:
+            similarities = self.embeddings.score(query)
         
         # Use fast inverted index first (with synonyms)
         if self.fast_retriever:
-            fast_results = self.fast_retriever.search(query, top_k=top_k * 2)
-            if fast_results:
-                # Score by semantic similarity too
-        query_embedding = create_simple_embedding(query)
-                scored_results = []
-                for rule in fast_results:
-                    rule_idx = self.rules.index(rule)
-                    rule_embedding = self.embeddings[rule_idx]
-                    semantic_score = self._cosine_similarity(query_embedding, rule_embedding)
-                    rule_copy = rule.copy()
-                    rule_copy['similarity_score'] = float(semantic_score)
-                    scored_results.append(rule_copy)
-                
-                # Sort by semantic score and return top-k
-                scored_results.sort(key=lambda x: x['similarity_score'], reverse=True)
-                return scored_results[:top_k]
-        
-        # Fallback to original semantic search
-        query_embedding = create_simple_embedding(query)
-        similarities = []
-        for rule_embedding in self.embeddings:
-            score = self._cosine_similarity(query_embedding, rule_embedding)
-            similarities.append(score)
-        
-        similarities = np.array(similarities)
-        top_indices = np.argsort(similarities)[-top_k:][::-1]
-        
+            candidates = self.fast_retriever.search_indices(query, top_k=top_k * 2)
+            if candidates:
+                # Re-rank the candidates by semantic score; the stable sort keeps
+                # the retriever's order for ties (e.g. query terms outside the vocabulary)
+                candidates = np.array(candidates)
+                top_indices = candidates[np.argsort(-similarities[candidates], kind='stable')[:top_k]]
+                return self._scored_rules(self.with_cited_rules(top_indices), similarities)
+        
+        # Fallback to semantic search over all rules
+        return self._scored_rules(self.with_cited_rules(top_k_indices(similarities, top_k)), similarities)
+    
+    def with_cited_rules(self, indices):
+        """Rule positions followed by up to CITATION_EXPANSION of their citation-graph neighbours"""
+        if not (CITATION_EXPANSION and self.citation_graph):
+            return indices
+        return list(indices) + self.citation_graph.expand(indices, CITATION_EXPANSION)
+    
+    @metrics.timed('retrieval')
+    def find_relevant_rules_batch(self, queries: List[str], top_k: int = 5):
+        """(find_relevant_rules() per query, correct_query() corrections per query)
+
+        Each query is corrected once and all of them are scored against the
+        rules with a single TF-IDF matrix product.
+        """
+        corrected = [self.correct_query(q) for q in queries]
+        corrections = [found for _, found in corrected]
+        if not self.embeddings:
+            return [[] for _ in queries], corrections
+        similarities = self.embeddings.score_batch([q for q, _ in corrected])
+        return [self.rank_rules(q, top_k, similarities=row) for (q, _), row in zip(corrected, similarities)], corrections
+    
+    def rules_from_scored_ids(self, scored_ids) -> List[Dict]:
+        """Rebuild find_relevant_rules() output from (rule id, score) pairs, skipping unknown IDs"""
+        relevant_rules = []
+        for rule_id, score in scored_ids:
+            idx = self.rule_positions.get(rule_id)
+            if idx is not None:
+                rule = self.rules[idx].copy()
+                rule['similarity_score'] = score
+                relevant_rules.append(rule)
+        return relevant_rules
+    
+    def _scored_rules(self, indices, similarities) -> List[Dict]:
+        """Copy the rules at the given positions and attach their similarity scores"""
         relevant_rules = []
-        for idx in top_indices:
+        for idx in indices:
             rule = self.rules[idx].copy()
             rule['similarity_score'] = float(similarities[idx])
             relevant_rules.append(rule)
-        
         return relevant_rules
     
+    @metrics.timed('followups')
     def generate_followups(self, query: str, relevant_rules: List[Dict]) -> List[str]:
-        """Generate comprehensive follow-up questions using knowledge base and query context"""
+        """Generate comprehensive follow-up questions using knowledge base and query context
+
+        Output depends only on the query and the retrieved rules (randomness is
+        seeded from both), so results are memoized on that pair.
+        """
         if not self.knowledge_base:
             return self._default_followups()
         
+        cache_key = make_cache_key(query, self.rule_versions(relevant_rules), 'followups', PROMPT_TEMPLATE_VERSION)
+        cached = self.followup_cache.get(cache_key)
+        if cached is not None:
+            return list(cached)
+        
+        rng = random.Random(int(cache_key[:16], 16))
+        follow_ups = self._generate_followups(query, relevant_rules, rng)
+        self.followup_cache.put(cache_key, tuple(follow_ups))
+        return follow_ups
+    
+    def _generate_followups(self, query: str, relevant_rules: List[Dict], rng: random.Random) -> List[str]:
+        """Uncached body of generate_followups(); all randomness comes from rng"""
         query_lower = query.lower()
         query_words = set(re.findall(r'\b\w+\b', query_lower))
         
+        # Look up precomputed per-rule terms (rules copied from self.rules keep their id)
+        rule_terms = []
+        for r in relevant_rules:
+            idx = self.rule_positions.get(r.get('id'))
+            rule_terms.append(self.rule_terms[idx] if idx is not None and idx < len(self.rule_terms) else None)
+        
         # Extract context from relevant rules
         rule_texts = ' '.join([
-            f"{r.get('title', '')} {r.get('description', '')}"
-            for r in relevant_rules[:5]
-        ]).lower()
+            terms['text'] if terms else f"{r.get('title', '')} {r.get('description', '')}".lower()
+            for r, terms in zip(relevant_rules[:5], rule_terms[:5])
+        ])
         
-        rule_words = set(re.findall(r'\b\w+\b', rule_texts))
+        rule_word_freq = Counter()
+        for terms in rule_terms[:5]:
+            if terms:
+                rule_word_freq.update(terms['word_freq'])
         
         # Find most common categories
         categories = Counter([r.get('category', 'unknown') for r in relevant_rules])
@@ -350,10 +1209,9 @@ What would you like to know about drone regulations?"""
         
         # Extract operation types from relevant rules
         operation_types_in_context = []
-        for rule in relevant_rules:
-            desc = rule.get('description', '').lower()
-            for op_type in self.knowledge_base['operation_types']:
-                if op_type in desc and op_type not in operation_types_in_context:
+        for terms in rule_terms:
+            for op_type in (terms['operation_types'] if terms else []):
+                if op_type not in operation_types_in_context:
                     operation_types_in_context.append(op_type)
         
         # Extract rule numbers from relevant rules
@@ -426,28 +1284,29 @@ What would you like to know about drone regulations?"""
         key_terms = []
         
         # Extract rule titles (often contain key concepts)
-        rule_titles = [r.get('title', '').lower().strip('.') for r in relevant_rules[:5] if r.get('title')]
-        for title in rule_titles:
-            # Extract meaningful words from titles
-            title_words = [w for w in re.findall(r'\b\w{4,}\b', title) if w not in ['this', 'that', 'with', 'from']]
-            key_terms.extend(title_words[:2])
+        for terms in rule_terms[:5]:
+            if terms:
+                key_terms.extend(terms['title_terms'])
         
         # Add terms from query (prioritize longer, more specific terms)
-        for word in sorted(query_words, key=len, reverse=True):
-            if word in self.knowledge_base['important_words'] and len(word) >= 4:
+        for word in sorted(query_words, key=lambda w: (-len(w), w)):
+            if word in self.important_words and len(word) >= 4:
                 key_terms.append(word)
         
         # Add terms from relevant rules (prioritize less common words)
-        rule_word_freq = Counter(rule_words)
-        for word, freq in sorted(rule_word_freq.items(), key=lambda x: x[1]):
-            if word in self.knowledge_base['important_words'] and word not in key_terms and len(word) >= 4:
+        for word, freq in sorted(rule_word_freq.items(), key=lambda x: (x[1], x[0])):
+            if word in self.important_words and word not in key_terms and len(word) >= 4:
                 key_terms.append(word)
                 if len(key_terms) >= 15:  # Limit to avoid too many
                     break
         
         # Add key phrases from rules (these are more specific)
+        rule_phrases = self.knowledge_base.get('rule_phrases', {})
+        context_phrases = set()
+        for r in relevant_rules[:5]:
+            context_phrases.update(rule_phrases.get(r.get('id', r.get('rule_number', '')), ()))
         for phrase in self.knowledge_base['key_phrases']:
-            if any(word in phrase for word in query_words) or phrase in rule_texts:
+            if any(word in phrase for word in query_words) or phrase in context_phrases:
                 if phrase not in key_terms:
                     key_terms.append(phrase)
         
@@ -483,9 +1342,8 @@ What would you like to know about drone regulations?"""
         template_usage = Counter()
         
         # Shuffle templates to get variety
-        import random
         shuffled_templates = question_templates.copy()
-        random.shuffle(shuffled_templates)
+        rng.shuffle(shuffled_templates)
         
         for template, placeholders in shuffled_templates:
             # Limit usage of each template
@@ -504,7 +1362,7 @@ What would you like to know about drone regulations?"""
                     
                     elif '{action}' in template and '{term}' in template:
                         # Use different actions for variety
-                        for action in random.sample(actions, min(2, len(actions))):
+                        for action in rng.sample(actions, min(2, len(actions))):
                             question = template.replace('{action}', action).replace('{term}', term)
                             if question not in candidate_questions and len(question) > 15:
                                 candidate_questions.append(question)
@@ -533,9 +1391,11 @@ What would you like to know about drone regulations?"""
         
         # Score and rank questions
         scored_questions = []
+        question_scores = {}
         for q in candidate_questions:
-            score = self._score_question_relevance(q, query_lower, rule_texts, key_terms)
+            score = self._score_question_relevance(q, query_words, rule_texts, key_terms)
             scored_questions.append((score, q))
+            question_scores.setdefault(q, score)
         
         # Sort by score and remove duplicates
         scored_questions.sort(reverse=True, key=lambda x: x[0])
@@ -567,7 +1427,7 @@ What would you like to know about drone regulations?"""
                             existing_starter = existing_q.lower().split()[0] if existing_q.lower().split() else ''
                             if existing_starter == q_starter:
                                 # Check if this is better
-                                existing_score = next((s for s, qq in scored_questions if qq == existing_q), 0)
+                                existing_score = question_scores.get(existing_q, 0)
                                 if score > existing_score:
                                     final_questions[i] = q
                                     seen.add(q_lower)
@@ -634,7 +1494,7 @@ What would you like to know about drone regulations?"""
         
         return questions
     
-    def _score_question_relevance(self, question: str, query: str, rule_text: str, key_terms: List[str]) -> float:
+    def _score_question_relevance(self, question: str, query_words: set, rule_text: str, key_terms: List[str]) -> float:
         """Score question relevance based on query and context - penalize repetitive patterns"""
         score = 0.0
         q_lower = question.lower()
@@ -649,7 +1509,6 @@ What would you like to know about drone regulations?"""
                 score += 2.0
         
         # Check if question relates to query
-        query_words = set(re.findall(r'\b\w+\b', query))
         q_words = set(re.findall(r'\b\w+\b', q_lower))
         common_words = query_words & q_words
         if common_words:
@@ -705,41 +1564,89 @@ What would you like to know about drone regulations?"""
     
     def generate_response(self, query: str, relevant_rules: List[Dict], summary_preference: str = None) -> Dict:
         """Generate response using Google Gemini API, returns dict with response and follow-ups"""
+        response_text = ''.join(self.generate_answer_chunks(query, relevant_rules, summary_preference, stream=False))
+        
+        return {
+            'response': response_text,
+            'follow_ups': self.followups_for(query, relevant_rules)
+        }
+    
+    def followups_for(self, query: str, relevant_rules: List[Dict]) -> List[str]:
+        """Follow-up questions for a query (fixed suggestions for greetings)"""
+        if self.is_greeting(query):
+            return [
+                "What are weight limits for drones?",
+                "What are the speed restrictions?",
+                "How do I get a BVLOS permit?"
+            ]
+        return self.generate_followups(query, relevant_rules)
+    
+    def generate_answer_chunks(self, query: str, relevant_rules: List[Dict], summary_preference: str = None,
+                               stream: bool = True):
+        """Yield the answer text piece by piece as the model produces it (a single piece when stream=False)"""
         # Handle greetings
         if self.is_greeting(query):
-            return {
-                'response': self.handle_greeting(),
-                'follow_ups': [
-                    "What are weight limits for drones?",
-                    "What are the speed restrictions?",
-                    "How do I get a BVLOS permit?"
-                ]
-            }
+            yield self.handle_greeting()
+            return
         
-        if not GOOGLE_API_KEY:
-            response_text = self._fallback_response(query, relevant_rules, summary_preference)
-        else:
+        if not llm_configured():
+            yield self._fallback_response(query, relevant_rules, summary_preference)
+            return
+        
+        cache_key = make_cache_key(query, self.rule_versions(relevant_rules), summary_preference,
+                                   [PROMPT_TEMPLATE_VERSION, PROMPT_TOKEN_BUDGET, ANSWER_MODEL_ID])
+        cached = self.answer_cache.get(cache_key)
+        if cached is not None:
+            metrics.inc('answer_cache_hits_total')
+            yield cached
+            return
+        metrics.inc('answer_cache_misses_total')
+        
+        parts = []
         try:
-            # Prepare context from relevant rules
-            context = "\n\n".join([
-                f"Rule {rule.get('rule_number', 'N/A')}: {rule.get('title', 'N/A')}\n"
-                f"Category: {rule.get('category', 'N/A')}\n"
-                f"Definition: {rule.get('definition', 'N/A')}\n"
-                f"Description: {rule.get('description', 'N/A')}"
-                for rule in relevant_rules
-            ])
-            
-                # Adjust prompt based on summary preference
-                if summary_preference == 'short':
-                    length_instruction = """Please provide a CONCISE answer (2-3 sentences maximum). Focus on the key facts and specific rule numbers. Be brief and to the point."""
-                elif summary_preference == 'detailed':
-                    length_instruction = """Please provide a COMPREHENSIVE and DETAILED answer. Include all relevant information, specific rule numbers, examples, exceptions, and practical implications. Be thorough and complete."""
+            prompt = self.build_prompt(query, relevant_rules, summary_preference)
+            # For streams this also covers the time the client takes to read each chunk
+            with metrics.span('llm'):
+                if stream:
+                    for text in llm_gateway.stream(prompt):
+                        if text:
+                            parts.append(text)
+                            yield text
                 else:
-                    # Default to detailed if no preference specified
-                    length_instruction = """Please provide a clear, detailed answer based on the regulations above. Include specific rule numbers when applicable."""
-                
-            # Create prompt for Gemini
-            prompt = f"""You are an expert drone regulation assistant. Based on the following FAA drone regulations, 
+                    parts.append(llm_gateway.generate(prompt))
+                    yield parts[-1]
+            # Only complete answers are cached; fallbacks and cut-off streams retry next time
+            self.answer_cache.put(cache_key, ''.join(parts))
+            
+        except LLMOverloaded:
+            # Backpressure is the caller's business (503), not a reason to fall back
+            metrics.inc('llm_overloaded_total')
+            raise
+        except Exception as e:
+            print(f"Error with Gemini API: {e}")
+            metrics.inc('llm_errors_total')
+            if not parts:
+                yield self._fallback_response(query, relevant_rules, summary_preference)
+            else:
+                yield "\n\n*The answer was cut short by an error from the AI service.*"
+    
+    @metrics.timed('prompt')
+    def build_prompt(self, query: str, relevant_rules: List[Dict], summary_preference: str = None) -> str:
+        """Assemble the Gemini prompt (changes here must bump PROMPT_TEMPLATE_VERSION)"""
+        # Prepare context from relevant rules
+        context = self.build_context(query, relevant_rules)
+
+        # Adjust prompt based on summary preference
+        if summary_preference == 'short':
+            length_instruction = """Please provide a CONCISE answer (2-3 sentences maximum). Focus on the key facts and specific rule numbers. Be brief and to the point."""
+        elif summary_preference == 'detailed':
+            length_instruction = """Please provide a COMPREHENSIVE and DETAILED answer. Include all relevant information, specific rule numbers, examples, exceptions, and practical implications. Be thorough and complete."""
+        else:
+            # Default to detailed if no preference specified
+            length_instruction = """Please provide a clear, detailed answer based on the regulations above. Include specific rule numbers when applicable."""
+
+        # Create prompt for Gemini
+        return f"""You are an expert drone regulation assistant. Based on the following FAA drone regulations, 
 answer the user's question accurately and comprehensively.
 
 RELEVANT REGULATIONS:
@@ -749,26 +1656,34 @@ USER QUESTION: {query}
 
 {length_instruction}
 If the regulations don't contain enough information to fully answer the question, acknowledge this and provide what information is available."""
-
-            # Use Gemini API (using the correct model name for the API version)
-            model = genai.GenerativeModel('gemini-2.5-flash')
-            response = model.generate_content(prompt)
-                response_text = response.text
-            
-        except Exception as e:
-            print(f"Error with Gemini API: {e}")
-                response_text = self._fallback_response(query, relevant_rules, summary_preference)
-        
-        # Generate follow-up questions
-        follow_ups = self.generate_followups(query, relevant_rules)
+    
+    def build_context(self, query: str, relevant_rules: List[Dict]) -> str:
+        """RELEVANT REGULATIONS block: packed paragraph excerpts, or whole rules when packing is off"""
+        positions = [self.rule_positions.get(rule.get('id')) for rule in relevant_rules]
+        if PROMPT_TOKEN_BUDGET <= 0 or self.paragraph_index is None or None in positions:
+            return "\n\n".join([
+                f"Rule {rule.get('rule_number', 'N/A')}: {rule.get('title', 'N/A')}\n"
+                f"Category: {rule.get('category', 'N/A')}\n"
+                f"Definition: {rule.get('definition', 'N/A')}\n"
+                f"Description: {rule.get('description', 'N/A')}"
+                for rule in relevant_rules
+            ])
         
-        return {
-            'response': response_text,
-            'follow_ups': follow_ups
-        }
+        excerpts = self.paragraph_index.pack(query, list(dict.fromkeys(positions)), PROMPT_TOKEN_BUDGET)
+        sections = []
+        for position in dict.fromkeys(positions):
+            rule = self.rules[position]
+            section = (f"Rule {rule.get('rule_number', 'N/A')}: {rule.get('title', 'N/A')}\n"
+                       f"Category: {rule.get('category', 'N/A')}")
+            if excerpts[position]:
+                section += "\nExcerpts:\n" + "\n".join(excerpts[position])
+            sections.append(section)
+        return "\n\n".join(sections)
     
+    @metrics.timed('fallback')
     def _fallback_response(self, query: str, relevant_rules: List[Dict], summary_preference: str = None) -> str:
         """Fallback response when Gemini API is not available"""
+        metrics.inc('fallbacks_total')
         if not relevant_rules:
             return "I couldn't find any relevant drone regulations for your query. Please try rephrasing your question."
         
@@ -780,11 +1695,11 @@ If the regulations don't contain enough information to fully answer the question
                 response += f"{rule.get('definition', 'N/A')[:150]}...\n\n"
         else:
             # Detailed response
-        response = f"Based on the drone regulations, here's what I found:\n\n"
-        for i, rule in enumerate(relevant_rules[:3], 1):
-            response += f"{i}. **Rule {rule.get('rule_number', 'N/A')} - {rule.get('title', 'N/A')}**\n"
-            response += f"   Category: {rule.get('category', 'N/A')}\n"
-            response += f"   {rule.get('definition', 'N/A')[:300]}...\n\n"
+            response = f"Based on the drone regulations, here's what I found:\n\n"
+            for i, rule in enumerate(relevant_rules[:3], 1):
+                response += f"{i}. **Rule {rule.get('rule_number', 'N/A')} - {rule.get('title', 'N/A')}**\n"
+                response += f"   Category: {rule.get('category', 'N/A')}\n"
+                response += f"   {rule.get('definition', 'N/A')[:300]}...\n\n"
         
         response += "\n*Note: Google Gemini API key not configured. Set GOOGLE_API_KEY environment variable for enhanced AI responses.*"
         return response
@@ -794,8 +1709,163 @@ def format_category_name(category):
     """Format category name for display"""
     return category.replace('_', ' ').title()
 
+def summarize_rules(relevant_rules):
+    """Compact rule summaries returned alongside answers"""
+    return [
+        {
+            'rule_number': rule.get('rule_number', 'N/A'),
+            'title': rule.get('title', 'N/A'),
+            'category': rule.get('category', 'N/A'),
+            'similarity_score': rule.get('similarity_score', 0)
+        }
+        for rule in relevant_rules[:3]
+    ]
+
+def overloaded_response(error):
+    """503 with Retry-After when the LLM queue is full"""
+    response = jsonify({'error': 'Server is busy, please retry shortly'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def encoded_json_response(entry):
+    """Serve an encoded_response() entry with a strong ETag, 304 on If-None-Match and gzip when accepted"""
+    body, gzipped_body, digest = entry
+    use_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+    # The gzip and identity bodies are different representations, so they get different tags
+    etag = f'"{digest}-gzip"' if use_gzip else f'"{digest}"'
+    requested = [tag.strip().replace('W/', '', 1) for tag in request.headers.get('If-None-Match', '').split(',')]
+    if '*' in requested or f'"{digest}"' in requested or f'"{digest}-gzip"' in requested:
+        response = Response(status=304)
+    else:
+        response = Response(gzipped_body if use_gzip else body, mimetype='application/json')
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+    response.headers['ETag'] = etag
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'  # always revalidate; unchanged pages come back as 304
+    return response
+
+def sse_event(event, data):
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 # Initialize RAG system
 rag_system = DroneRAG()
+retrieval_tokens = RetrievalTokenStore(ttl=RETRIEVAL_TOKEN_TTL, max_entries=RETRIEVAL_TOKEN_MAX)
+prefetch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='prefetch') if SPECULATIVE_PREFETCH else None
+batch_pool = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS, thread_name_prefix='batch')
+
+reload_lock = threading.Lock()
+reload_status = {'state': 'idle', 'last_reload': None, 'last_error': None, 'changes': None}
+
+def diff_rules(old_fingerprints, new_fingerprints):
+    """Count rules added, changed, removed and unchanged between two id -> fingerprint maps"""
+    changed = sum(1 for rule_id, fp in new_fingerprints.items()
+                  if rule_id in old_fingerprints and old_fingerprints[rule_id] != fp)
+    added = sum(1 for rule_id in new_fingerprints if rule_id not in old_fingerprints)
+    removed = sum(1 for rule_id in old_fingerprints if rule_id not in new_fingerprints)
+    return {'added': added, 'changed': changed, 'removed': removed,
+            'unchanged': len(new_fingerprints) - added - changed}
+
+def reload_rules(force=False):
+    """Rebuild the indexes from the rules file and swap them in atomically
+
+    The new DroneRAG is fully built before the module-level reference is
+    replaced, and requests hold on to the instance they started with, so
+    in-flight queries never see a half-built index. Unchanged rules reuse
+    their previous analysis. Returns True if a new index was swapped in.
+    """
+    global rag_system
+    with reload_lock:
+        current = rag_system
+        try:
+            with open(current.rules_file, 'rb') as f:
+                new_hash = hashlib.sha256(f.read()).hexdigest()
+            if not force and new_hash == current.rules_hash:
+                return False
+            
+            reload_status['state'] = 'building'
+            started = time.time()
+            replacement = DroneRAG(current.rules_file, previous=current)
+            if not replacement.rules:
+                raise ValueError(f"{current.rules_file} has no rules; keeping the current index")
+            
+            changes = diff_rules(current.rule_fingerprints, replacement.rule_fingerprints)
+            rag_system = replacement
+            reload_status.update(state='idle', last_reload=time.time(), last_error=None,
+                                 changes=dict(changes, seconds=round(time.time() - started, 3)))
+            print(f"Reloaded rules: {changes}")
+            return True
+        except Exception as e:
+            print(f"Error reloading rules: {e}")
+            reload_status.update(state='idle', last_error=str(e))
+            return False
+
+def start_background_reload(force=False):
+    """Run reload_rules() on a background thread unless one is already running"""
+    if reload_lock.locked():
+        return False
+    threading.Thread(target=reload_rules, kwargs={'force': force}, name='rules-reload', daemon=True).start()
+    return True
+
+def poll_rules_file(interval):
+    """Reload whenever the rules file's modification time or size changes"""
+    def signature():
+        try:
+            stat = os.stat(rag_system.rules_file)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+    
+    last = signature()
+    while True:
+        time.sleep(interval)
+        current = signature()
+        if current is not None and current != last:
+            last = current
+            reload_rules()
+
+if RULES_RELOAD_INTERVAL > 0:
+    threading.Thread(target=poll_rules_file, args=(RULES_RELOAD_INTERVAL,), name='rules-poller', daemon=True).start()
+
+def retrieve_for_request(rag, user_query, retrieval_token=None):
+    """Relevant rules for a query, reusing a retrieval token's results when it is still valid"""
+    if retrieval_token:
+        scored_ids = retrieval_tokens.redeem(retrieval_token, user_query)
+        if scored_ids is not None:
+            return rag.rules_from_scored_ids(scored_ids)
+    return rag.find_relevant_rules(user_query, top_k=5)
+
+def issue_retrieval_token(rag, user_query, relevant_rules):
+    """Remember this retrieval for the summary-preference follow-up and optionally start both answers"""
+    token = retrieval_tokens.issue(
+        user_query, [(rule.get('id'), rule.get('similarity_score', 0)) for rule in relevant_rules]
+    )
+    if prefetch_pool is not None:
+        for preference in ('short', 'detailed'):
+            prefetch_pool.submit(prefetch_answer, rag, user_query, relevant_rules, preference)
+    return token
+
+def prefetch_answer(rag, user_query, relevant_rules, summary_preference):
+    """Generate an answer only to warm the answer cache"""
+    try:
+        for _ in rag.generate_answer_chunks(user_query, relevant_rules, summary_preference, stream=False):
+            pass
+    except LLMOverloaded:
+        pass  # Speculative work is the first thing to drop under load
+
+@app.before_request
+def start_request_timing():
+    metrics.start_request()
+
+@app.after_request
+def add_server_timing(response):
+    """Per-stage durations of this request (stages finished before the headers went out)"""
+    timings = metrics.request_timings()
+    if timings:
+        response.headers['Server-Timing'] = Metrics.server_timing(timings)
+    return response
 
 @app.route('/')
 def index():
@@ -805,84 +1875,406 @@ def index():
 @app.route('/api/query', methods=['POST'])
 def query():
     """Handle user queries"""
+    rag = rag_system  # one consistent index for the whole request, even across a reload
     try:
         data = request.get_json()
         user_query = data.get('query', '').strip()
         summary_preference = data.get('summary_preference', None)  # 'short' or 'detailed' or None
+        retrieval_token = data.get('retrieval_token', None)  # from a previous ask_summary_preference reply
         
         if not user_query:
             return jsonify({'error': 'Please provide a query'}), 400
         
-        # Find relevant rules (skip for greetings)
-        if not rag_system.is_greeting(user_query):
-        relevant_rules = rag_system.find_relevant_rules(user_query, top_k=5)
+        # Find relevant rules (skip for greetings); retrieval runs on the corrected query
+        if not rag.is_greeting(user_query):
+            relevant_rules = retrieve_for_request(rag, user_query, retrieval_token)
+            corrections = rag.correct_query(user_query)[1]
         else:
             relevant_rules = []
+            corrections = []
         
         # If no summary preference provided, ask the user
-        if summary_preference is None and not rag_system.is_greeting(user_query) and relevant_rules:
+        if summary_preference is None and not rag.is_greeting(user_query) and relevant_rules:
             return jsonify({
                 'ask_summary_preference': True,
                 'query': user_query,
-                'relevant_rules': [
-                    {
-                        'rule_number': rule.get('rule_number', 'N/A'),
-                        'title': rule.get('title', 'N/A'),
-                        'category': rule.get('category', 'N/A'),
-                        'similarity_score': rule.get('similarity_score', 0)
-                    }
-                    for rule in relevant_rules[:3]
-                ]
+                'retrieval_token': issue_retrieval_token(rag, user_query, relevant_rules),
+                'relevant_rules': summarize_rules(relevant_rules),
+                'corrections': corrections
             })
         
         # Generate response (includes follow-ups) with summary preference
-        result = rag_system.generate_response(user_query, relevant_rules, summary_preference)
+        result = rag.generate_response(user_query, relevant_rules, summary_preference)
         
         return jsonify({
             'response': result['response'],
             'follow_ups': result.get('follow_ups', []),
-            'relevant_rules': [
-                {
-                    'rule_number': rule.get('rule_number', 'N/A'),
-                    'title': rule.get('title', 'N/A'),
-                    'category': rule.get('category', 'N/A'),
-                    'similarity_score': rule.get('similarity_score', 0)
-                }
-                for rule in relevant_rules[:3]
-            ]
+            'relevant_rules': summarize_rules(relevant_rules),
+            'corrections': corrections
         })
         
+    except LLMOverloaded as e:
+        return overloaded_response(e)
     except Exception as e:
         print(f"Error processing query: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/rules', methods=['GET'])
-def get_rules():
-    """Get all rules or filter by category"""
+@app.route('/api/query/stream', methods=['POST'])
+def query_stream():
+    """Streaming variant of /api/query (Server-Sent Events)
+
+    Events, in order: `rules` (retrieved rules and query corrections), then either
+    `ask_summary_preference`, or `chunk` messages with answer text followed
+    by `follow_ups`; the stream always ends with `done` (or `error`).
+    """
+    rag = rag_system
+    data = request.get_json(silent=True) or {}
+    user_query = data.get('query', '').strip()
+    summary_preference = data.get('summary_preference', None)
+    retrieval_token = data.get('retrieval_token', None)
+    
+    if not user_query:
+        return jsonify({'error': 'Please provide a query'}), 400
+    
+    # Reject up front while we can still send a status code
+    if llm_gateway.is_overloaded():
+        return overloaded_response(LLMOverloaded(llm_gateway.retry_after))
+    
+    def events():
+        try:
+            is_greeting = rag.is_greeting(user_query)
+            relevant_rules = [] if is_greeting else retrieve_for_request(rag, user_query, retrieval_token)
+            corrections = [] if is_greeting else rag.correct_query(user_query)[1]
+            yield sse_event('rules', {'relevant_rules': summarize_rules(relevant_rules), 'corrections': corrections})
+            
+            if summary_preference is None and not is_greeting and relevant_rules:
+                yield sse_event('ask_summary_preference', {
+                    'query': user_query,
+                    'retrieval_token': issue_retrieval_token(rag, user_query, relevant_rules)
+                })
+            else:
+                for text in rag.generate_answer_chunks(user_query, relevant_rules, summary_preference):
+                    yield sse_event('chunk', {'text': text})
+                yield sse_event('follow_ups', {'follow_ups': rag.followups_for(user_query, relevant_rules)})
+            yield sse_event('done', {})
+        except Exception as e:
+            print(f"Error streaming query: {e}")
+            yield sse_event('error', {'error': str(e)})
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/query/batch', methods=['POST'])
+def query_batch():
+    """Answer a checklist of questions in one request
+
+    Body: {"queries": [str | {"query": str, "summary_preference": str}, ...],
+    "summary_preference": default for items without one}. All questions are
+    spell-corrected once and scored against the rules in one vectorized
+    TF-IDF pass; questions that end up
+    with the same retrieval context share one generated answer, and answers
+    are generated on a bounded worker pool. Results keep the request order
+    and carry a per-item `status` ('ok', 'error' or 'overloaded') and the
+    item's spelling `corrections`, as in /api/query.
+    """
+    rag = rag_system
+    data = request.get_json(silent=True) or {}
+    items = data.get('queries')
+    default_preference = data.get('summary_preference', None)
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Please provide a non-empty "queries" list'}), 400
+    if len(items) > BATCH_MAX_QUERIES:
+        return jsonify({'error': f'At most {BATCH_MAX_QUERIES} queries per batch'}), 400
+    
+    parsed = []
+    for item in items:
+        if isinstance(item, dict):
+            parsed.append((str(item.get('query', '')).strip(), item.get('summary_preference', default_preference)))
+        else:
+            parsed.append((str(item).strip(), default_preference))
+    
     try:
-        category = request.args.get('category', None)
-        
-        if category:
-            filtered_rules = [r for r in rag_system.rules if r.get('category') == category]
+        # Retrieval for every non-greeting question in one pass
+        retrieval_positions = [i for i, (q, _) in enumerate(parsed) if q and not rag.is_greeting(q)]
+        retrieved, corrections = rag.find_relevant_rules_batch([parsed[i][0] for i in retrieval_positions], top_k=5)
+        relevant_by_position = dict(zip(retrieval_positions, retrieved))
+        corrections_by_position = dict(zip(retrieval_positions, corrections))
+    except Exception as e:
+        print(f"Error processing batch retrieval: {e}")
+        return jsonify({'error': str(e)}), 500
+    
+    # One generation per distinct (question, retrieved rules, preference) context
+    futures = {}
+    item_keys = []
+    for i, (user_query, preference) in enumerate(parsed):
+        if not user_query:
+            item_keys.append(None)
+            continue
+        relevant_rules = relevant_by_position.get(i, [])
+        key = make_cache_key(user_query, [rule.get('id') for rule in relevant_rules], preference, PROMPT_TEMPLATE_VERSION)
+        if key not in futures:
+            futures[key] = batch_pool.submit(rag.generate_response, user_query, relevant_rules, preference)
+        item_keys.append(key)
+    
+    results = []
+    for i, ((user_query, _), key) in enumerate(zip(parsed, item_keys)):
+        result = {'index': i, 'query': user_query, 'corrections': corrections_by_position.get(i, [])}
+        if key is None:
+            result.update(status='error', error='Empty query')
         else:
-            filtered_rules = rag_system.rules
-        
+            try:
+                answer = futures[key].result()
+                result.update(status='ok', response=answer['response'], follow_ups=answer.get('follow_ups', []),
+                              relevant_rules=summarize_rules(relevant_by_position.get(i, [])))
+            except LLMOverloaded as e:
+                result.update(status='overloaded', error=str(e), retry_after=e.retry_after)
+            except Exception as e:
+                result.update(status='error', error=str(e))
+        results.append(result)
+    
+    return jsonify({
+        'results': results,
+        'total': len(results),
+        'unique_contexts': len(futures),
+        'succeeded': sum(1 for r in results if r['status'] == 'ok')
+    })
+
+@app.route('/api/sora/batch', methods=['POST'])
+def sora_batch():
+    """SORA iGRC, final GRC, SAIL and TMPR for a whole fleet of missions
+
+    Accepts a JSON list of missions (or {"missions": [...]}), a CSV body
+    (Content-Type text/csv) or an uploaded CSV `file`; see sora.py for the
+    mission fields. Answers JSON, or CSV with `?format=csv`. Missions that
+    cannot be assessed carry an `error` instead of failing the request.
+    """
+    try:
+        if 'file' in request.files:
+            missions = sora.missions_from_csv(request.files['file'].read().decode('utf-8-sig'))
+        elif request.mimetype in ('text/csv', 'text/plain'):
+            missions = sora.missions_from_csv(request.get_data(as_text=True))
+        else:
+            data = request.get_json(silent=True)
+            missions = data.get('missions') if isinstance(data, dict) else data
+        
+        if not isinstance(missions, list) or not missions:
+            return jsonify({'error': 'Provide a non-empty list of missions as JSON or CSV'}), 400
+        if len(missions) > SORA_BATCH_MAX_MISSIONS:
+            return jsonify({'error': f'At most {SORA_BATCH_MAX_MISSIONS} missions per request'}), 413
+        
+        with metrics.span('sora'):
+            geometry_errors = {}
+            if population_raster:
+                geometry_errors.update(population_raster.annotate_missions(missions))
+            if airspace_index:
+                geometry_errors.update(airspace_index.annotate_missions(missions))
+            assessments = sora.assess_missions(missions)
+        for row, error in geometry_errors.items():
+            assessments[row] = {'id': assessments[row]['id'], 'error': error}
+        if request.args.get('format') == 'csv':
+            return Response(sora.assessments_to_csv(assessments), mimetype='text/csv')
+        return jsonify({'results': assessments, 'summary': sora.summarize_assessments(assessments)})
+    
+    except Exception as e:
+        print(f"Error processing SORA batch: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/sora/population', methods=['POST'])
+def sora_population():
+    """Maximum population density band inside each footprint, from the population raster
+
+    Takes {"footprints": [...]}, each with a `footprint` polygon or a `route`
+    (GeoJSON geometry or [[lon, lat], ...]) and an optional `buffer_m`.
+    """
+    if population_raster is None:
+        return jsonify({'error': 'No population raster is configured (POPULATION_RASTER_PATH)'}), 503
+    try:
+        data = request.get_json(silent=True) or {}
+        footprints = data.get('footprints') if isinstance(data, dict) else data
+        if not isinstance(footprints, list) or not footprints:
+            return jsonify({'error': 'Provide a non-empty list of footprints'}), 400
+        if len(footprints) > SORA_BATCH_MAX_MISSIONS:
+            return jsonify({'error': f'At most {SORA_BATCH_MAX_MISSIONS} footprints per request'}), 413
+        
+        mean = request.args.get('mean') == '1'
+        results = []
+        with metrics.span('population'):
+            for row, item in enumerate(footprints):
+                try:
+                    if not isinstance(item, dict) or (item.get('footprint') is None and item.get('route') is None):
+                        raise GeometryError('each footprint needs a `footprint` polygon or a `route`')
+                    result = population_raster.lookup(Footprint.from_mission(item), mean=mean)
+                except GeometryError as e:
+                    result = {'error': str(e)}
+                results.append(dict(result, id=item.get('id', row) if isinstance(item, dict) else row))
+        return jsonify({'results': results})
+    
+    except Exception as e:
+        print(f"Error looking up population density: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/sora/airspace', methods=['POST'])
+def sora_airspace():
+    """ARC of every segment of each route, and the worst one, from the airspace volumes
+
+    Takes {"routes": [...]}, each with a `route` of [lon, lat] or
+    [lon, lat, altitude_m] waypoints (or a GeoJSON LineString) and an optional `id`.
+    """
+    if airspace_index is None:
+        return jsonify({'error': 'No airspace volumes are configured (AIRSPACE_GEOJSON_PATH)'}), 503
+    try:
+        data = request.get_json(silent=True) or {}
+        routes = data.get('routes') if isinstance(data, dict) else data
+        if not isinstance(routes, list) or not routes:
+            return jsonify({'error': 'Provide a non-empty list of routes'}), 400
+        if len(routes) > SORA_BATCH_MAX_MISSIONS:
+            return jsonify({'error': f'At most {SORA_BATCH_MAX_MISSIONS} routes per request'}), 413
+        
+        with metrics.span('airspace'):
+            results = airspace_index.assess_routes([item.get('route') if isinstance(item, dict) else None
+                                                    for item in routes])
+        for row, (item, result) in enumerate(zip(routes, results)):
+            result['id'] = item.get('id', row) if isinstance(item, dict) else row
+        return jsonify({'results': results})
+    
+    except Exception as e:
+        print(f"Error assessing airspace: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/sora/sweep', methods=['GET'])
+def sora_sweep():
+    """SAIL and final GRC heatmaps over speed x population for one UA size and set of mitigations
+
+    `max_dimension` is required; `m1a`, `m1b`, `m1c` and `m2` default to
+    none. Without `residual_arc` there is one heatmap per ARC.
+    """
+    try:
+        dimension = sora.encode_dimension(request.args.get('max_dimension', ''))
+        combo = sora.mitigation_combo_index({name: request.args.get(name) for name in sora.MITIGATIONS})
+        arc = request.args.get('residual_arc')
+        arcs = [sora.encode_arc(arc, 'residual_arc')] if arc else range(len(sora.ARCS))
+        with metrics.span('sora'):
+            heatmaps = [sora.heatmap(dimension, combo, index) for index in arcs]
+        return jsonify({'max_dimension': sora.DIMENSION_NAMES[dimension], 'heatmaps': heatmaps})
+
+    except sora.MissionError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error computing SORA sweep: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/sora/sweep/mitigations', methods=['GET'])
+def sora_minimal_mitigations():
+    """The least mitigation combinations that bring one operation down to each target SAIL
+
+    Takes `max_dimension`, `max_speed`, `population_density` and
+    `residual_arc`; `target_sail` (I to VI) narrows the answer to one target.
+    """
+    try:
+        dimension = sora.encode_dimension(request.args.get('max_dimension', ''))
+        speed = sora.encode_speed(request.args.get('max_speed', ''))
+        population = sora.encode_population(request.args.get('population_density', ''))
+        arc = sora.encode_arc(request.args.get('residual_arc', ''), 'residual_arc')
+        with metrics.span('sora'):
+            targets = sora.minimal_mitigations(dimension, speed, population, arc)
+        target = request.args.get('target_sail')
+        if target:
+            if target.upper() not in targets:
+                return jsonify({'error': f"target_sail must be one of {', '.join(targets)}"}), 400
+            targets = {target.upper(): targets[target.upper()]}
         return jsonify({
-            'rules': filtered_rules[:50],  # Limit to 50 for performance
-            'total': len(filtered_rules)
+            'max_dimension': sora.DIMENSION_NAMES[dimension],
+            'max_speed': sora.SPEED_NAMES[speed],
+            'population_density': sora.POPULATION_BANDS[population],
+            'residual_arc': sora.ARCS[arc],
+            'unmitigated': sora.heatmap(dimension, 0, arc)['sail'][speed][population],
+            'targets': targets,
         })
+
+    except sora.MissionError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error computing SORA mitigations: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/rules', methods=['GET'])
+def get_rules():
+    """Get all rules or filter by category, one page at a time (`limit`, `cursor`)"""
+    rag = rag_system
+    try:
+        category = request.args.get('category') or None
+        cursor = request.args.get('cursor') or None
+        try:
+            limit = int(request.args.get('limit', RULES_PAGE_SIZE))
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+        if not 1 <= limit <= RULES_PAGE_MAX:
+            return jsonify({'error': f'limit must be between 1 and {RULES_PAGE_MAX}'}), 400
+        if cursor is not None and cursor not in rag.cursor_offsets.get(category, {}):
+            return jsonify({'error': f'Unknown cursor: {cursor}'}), 400
+        
+        entry = rag.encoded_response(('rules', category, cursor, limit),
+                                     lambda: rag.rules_page(category, cursor, limit))
+        return encoded_json_response(entry)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/rules/<rule_number>/related', methods=['GET'])
+def get_related_rules(rule_number):
+    """Rules linked to one rule by § citations in either direction, plus the subparts it refers to"""
+    rag = rag_system
+    try:
+        if rule_number not in rag.citation_graph.positions:
+            return jsonify({'error': f'Unknown rule: {rule_number}'}), 404
+        entry = rag.encoded_response(('related', rule_number), lambda: rag.related_rules(rule_number))
+        return encoded_json_response(entry)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Answer cache hit/miss counters"""
+    return jsonify(rag_system.answer_cache.get_stats())
+
+@app.route('/api/llm/stats', methods=['GET'])
+def get_llm_stats():
+    """LLM gateway queue depth and call counters"""
+    return jsonify(llm_gateway.get_stats())
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Stage latency histograms and counters in Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/admin/reload', methods=['GET', 'POST'])
+def admin_reload():
+    """POST starts a background reload of the rules file; GET reports the last reload"""
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Reload endpoint is disabled (ADMIN_TOKEN not set)'}), 404
+    if request.headers.get('X-Admin-Token', '') != ADMIN_TOKEN:
+        return jsonify({'error': 'Invalid admin token'}), 403
+    
+    if request.method == 'POST':
+        force = request.args.get('force', '0') == '1'
+        started = start_background_reload(force=force)
+        return jsonify(dict(reload_status, started=started)), 202
+    return jsonify(dict(reload_status, rules=len(rag_system.rules), rules_sha256=rag_system.rules_hash))
+
 @app.route('/api/categories', methods=['GET'])
 def get_categories():
     """Get all unique categories"""
+    rag = rag_system
     try:
-        categories = list(set(rule.get('category', 'unknown') for rule in rag_system.rules))
-        return jsonify({'categories': sorted(categories)})
+        return encoded_json_response(rag.encoded_response(('categories',), lambda: {'categories': rag.categories()}))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    if '--build-index' in sys.argv:
+        # Rebuild from scratch (ignoring any existing snapshot) and write it out
+        DroneRAG(snapshot_dir=None).save_snapshot(INDEX_SNAPSHOT_DIR)
+    else:
+        app.run(debug=FLASK_DEBUG, host='0.0.0.0', port=5000)
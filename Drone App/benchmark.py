@@ -0,0 +1,226 @@
+"""Offline benchmark and retrieval-quality suite for DroneRAG.
+
+Replays benchmarks/questions.json against DroneRAG with the deterministic
+stub model (no network, no API key) and reports per-stage latency
+percentiles, index build time, peak memory and recall@k / MRR against each
+question's expected rule numbers. The JSON report can be compared with a
+report from another commit:
+
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+STAGES = ('retrieval', 'prompt', 'llm', 'followups', 'end_to_end')
+
+
+def percentiles(samples):
+    """p50/p95/p99/mean/max in milliseconds"""
+    if not samples:
+        return {}
+    ms = np.array(samples) * 1000
+    return {
+        'n': len(samples),
+        'p50_ms': round(float(np.percentile(ms, 50)), 4),
+        'p95_ms': round(float(np.percentile(ms, 95)), 4),
+        'p99_ms': round(float(np.percentile(ms, 99)), 4),
+        'mean_ms': round(float(ms.mean()), 4),
+        'max_ms': round(float(ms.max()), 4),
+    }
+
+
+def timed(func, *args, **kwargs):
+    """(result, seconds)"""
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure_build(app, rules_file, repeats):
+    """Cold index build time and traced peak memory, plus the time to load a snapshot of it"""
+    build_times = []
+    peak_bytes = 0
+    rag = None
+    for _ in range(repeats):
+        tracemalloc.start()
+        rag, seconds = timed(app.DroneRAG, rules_file, snapshot_dir=None)
+        peak_bytes = max(peak_bytes, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        build_times.append(seconds)
+
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        rag.save_snapshot(snapshot_dir)
+        _, load_seconds = timed(app.DroneRAG, rules_file, snapshot_dir=snapshot_dir)
+
+    return rag, {
+        'rules': len(rag.rules),
+        'build_ms': percentiles(build_times),
+        'snapshot_load_ms': round(load_seconds * 1000, 3),
+        'peak_traced_mb': round(peak_bytes / 2 ** 20, 3),
+    }
+
+
+def ranking_quality(retrieved, expected, ks):
+    """recall@k for each k and the reciprocal rank of the first expected rule"""
+    expected = set(expected)
+    recall = {k: len(expected & set(retrieved[:k])) / len(expected) for k in ks}
+    reciprocal_rank = next((1.0 / rank for rank, number in enumerate(retrieved, 1) if number in expected), 0.0)
+    return recall, reciprocal_rank
+
+
+def run_questions(app, rag, questions, repeats, top_k, ks, summary_preference):
+    """Time every stage for each question and score the retrieval once per question"""
+    samples = {stage: [] for stage in STAGES}
+    per_question = []
+
+    for i in range(repeats + 1):
+        warmup = i == 0
+        for item in questions:
+            query = item['query']
+            rules, retrieval = timed(rag.find_relevant_rules, query, top_k=top_k)
+            prompt, prompt_seconds = timed(rag.build_prompt, query, rules, summary_preference)
+            _, llm_seconds = timed(app.llm_gateway.generate, prompt)
+            # Memoized results would hide the real cost, so both caches start empty
+            rag.followup_cache.clear()
+            _, followup_seconds = timed(rag.generate_followups, query, rules)
+            rag.followup_cache.clear()
+            rag.answer_cache.clear()
+            started = time.perf_counter()
+            rag.generate_response(query, rag.find_relevant_rules(query, top_k=top_k), summary_preference)
+            end_to_end = time.perf_counter() - started
+
+            if warmup:
+                retrieved = [rule.get('rule_number') for rule in rules]
+                recall, reciprocal_rank = ranking_quality(retrieved, item['expected'], ks)
+                per_question.append({
+                    'query': query,
+                    'expected': item['expected'],
+                    'retrieved': retrieved,
+                    'recall': {f'@{k}': value for k, value in recall.items()},
+                    'reciprocal_rank': reciprocal_rank,
+                })
+                continue
+
+            for stage, seconds in zip(STAGES, (retrieval, prompt_seconds, llm_seconds, followup_seconds, end_to_end)):
+                samples[stage].append(seconds)
+
+    quality = {f'recall@{k}': round(float(np.mean([q['recall'][f'@{k}'] for q in per_question])), 4) for k in ks}
+    quality['mrr'] = round(float(np.mean([q['reciprocal_rank'] for q in per_question])), 4)
+    return {stage: percentiles(values) for stage, values in samples.items()}, quality, per_question
+
+
+def compare(report, baseline):
+    """Print stage latencies and quality next to a baseline report"""
+    print(f"\nCompared with {baseline['meta'].get('commit') or 'baseline'}:")
+    rows = [(f"{stage} p50", ('stages', stage, 'p50_ms')) for stage in STAGES]
+    rows += [(f"{stage} p95", ('stages', stage, 'p95_ms')) for stage in STAGES]
+    rows += [('build p50 (ms)', ('build', 'build_ms', 'p50_ms')), ('peak MB', ('build', 'peak_traced_mb'))]
+    rows += [(name, ('quality', name)) for name in report['quality']]
+    for label, path in rows:
+        old, new = baseline, report
+        for key in path:
+            old = old.get(key, {}) if isinstance(old, dict) else {}
+            new = new.get(key, {}) if isinstance(new, dict) else {}
+        if isinstance(old, (int, float)) and isinstance(new, (int, float)):
+            change = f"{(new - old) / old * 100:+.1f}%" if old else ''
+            print(f"  {label:<22} {old:>12.4f} -> {new:<12.4f} {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', default=os.path.join('benchmarks', 'questions.json'))
+    parser.add_argument('--rules', default='parsed_rules.json')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed passes over the questions (after one warm-up)')
+    parser.add_argument('--build-repeat', type=int, default=3, help='Cold index builds to time')
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--summary', default='short', choices=['short', 'detailed'])
+    parser.add_argument('--llm-latency', type=float, default=0.0, help='Stub model time to first token, in seconds')
+    parser.add_argument('--output', default='benchmark_report.json', help="Report path ('-' for stdout only)")
+    parser.add_argument('--compare', help='Earlier report to compare against')
+    args = parser.parse_args()
+
+    # app.py reads its configuration at import time
+    os.environ['LLM_BACKEND'] = 'stub'
+    os.environ['STUB_LLM_LATENCY'] = str(args.llm_latency)
+    os.environ['ANSWER_CACHE_PATH'] = ''
+    os.environ['INDEX_SNAPSHOT_DIR'] = ''
+    os.environ['RULES_RELOAD_INTERVAL'] = '0'
+    import app
+
+    with open(args.questions, 'r', encoding='utf-8') as f:
+        questions = json.load(f)
+    ks = sorted({1, 3, args.top_k})
+
+    rag, build = measure_build(app, args.rules, args.build_repeat)
+    stages, quality, per_question = run_questions(app, rag, questions, args.repeat, args.top_k, ks, args.summary)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'questions': len(questions),
+            'repeat': args.repeat,
+            'top_k': args.top_k,
+            'summary_preference': args.summary,
+            'llm_latency': args.llm_latency,
+            'retriever_mode': app.RETRIEVER_MODE,
+            'prompt_token_budget': app.PROMPT_TOKEN_BUDGET,
+        },
+        'build': build,
+        'stages': stages,
+        'quality': quality,
+        'peak_rss_mb': (round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+                        if resource and sys.platform != 'darwin' else None),
+        'per_question': per_question,
+    }
+
+    print(f"\nIndex build p50 {build['build_ms']['p50_ms']:.1f} ms, snapshot load {build['snapshot_load_ms']:.1f} ms, "
+          f"peak traced {build['peak_traced_mb']} MB")
+    for stage in STAGES:
+        s = stages[stage]
+        print(f"  {stage:<11} p50 {s['p50_ms']:>9.3f} ms   p95 {s['p95_ms']:>9.3f} ms   p99 {s['p99_ms']:>9.3f} ms")
+    print('  ' + '   '.join(f"{name} {value:.3f}" for name, value in quality.items()))
+    misses = [q['query'] for q in per_question if q['reciprocal_rank'] == 0]
+    if misses:
+        print(f"  {len(misses)} question(s) with no expected rule in the top {args.top_k}")
+
+    if args.output != '-':
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Cross-references between Part 108 sections, parsed once when the rules are loaded.
+
+Rule texts cite other sections ("in accordance with § 108.185",
+"§§ 108.400 through 108.415") and whole subparts ("subparts G and H of
+this part"). CitationGraph keeps those links as CSR arrays: the sections
+a rule cites, the reverse (the rules citing it), and the subparts it
+refers to. The neighbours of a rule are then a slice of one array, so
+related-rule lookups and retrieval-time expansion cost O(degree).
+
+Each rule's own subpart is read from its `subpart` and `subpart_heading`
+fields, which Parser/ingest_federal_register.py takes from the enclosing
+<SUBPART> of the Federal Register XML.
+
+Citations of other parts of the chapter (§ 91.227, 49 CFR ...) are
+ignored, since only Part 108 is loaded.
+"""
+import bisect
+import re
+
+import numpy as np
+
+PART = 108
+
+# "§ 108.185", "§§ 108.40 and 108.45", "§§ 108.400 through 108.415", "§ 108.505(b)(2)"
+SECTION_LIST_PATTERN = re.compile(
+    r'§§?\s*(\d+\.\d+(?:\([0-9a-z]+\))*'
+    r'(?:\s*(?:,\s*and|,\s*or|,|and|or|through)\s*\d+\.\d+(?:\([0-9a-z]+\))*)*)'
+)
+SECTION_PATTERN = re.compile(r'(through\s*)?(\d+)\.(\d+)')
+# "subpart E", "subparts G and H of this part"; the whole list is matched before
+# OTHER_PART_PATTERN checks what follows it, so "subparts G and H of part 21"
+# cannot be cut back to a bare "subpart G"
+SUBPART_PATTERN = re.compile(r'\b[Ss]ubparts?\s+([A-H](?:\s*(?:,\s*and|,|and|or)\s*[A-H])*)\b')
+OTHER_PART_PATTERN = re.compile(r'\s+of\s+part\s+(\d+)')
+
+
+def section_number(rule_number):
+    """108.45 -> 45, or None for a section outside Part 108"""
+    part, _, section = str(rule_number).partition('.')
+    if part != str(PART) or not section.isdigit():
+        return None
+    return int(section)
+
+
+def rule_citation_text(rule):
+    """Every text field of a rule that may cite other sections"""
+    return ' '.join([rule.get('title', ''), rule.get('definition', ''), rule.get('description', ''),
+                     *rule.get('paragraphs', [])])
+
+
+def parse_citations(text):
+    """([(first, last) Part 108 section ranges], {subpart letters}) cited in a text"""
+    ranges = []
+    for match in SECTION_LIST_PATTERN.finditer(text):
+        for through, part, section in SECTION_PATTERN.findall(match.group(1)):
+            section = int(section)
+            if int(part) != PART:
+                continue
+            if through and ranges and ranges[-1][0] == ranges[-1][1]:
+                ranges[-1] = (ranges[-1][0], section)
+            else:
+                ranges.append((section, section))
+    subparts = set()
+    for match in SUBPART_PATTERN.finditer(text):
+        other_part = OTHER_PART_PATTERN.match(text, match.end())
+        if other_part and int(other_part.group(1)) != PART:
+            continue
+        subparts.update(re.findall(r'\b[A-H]\b', match.group(1)))
+    return ranges, subparts
+
+
+def pack(lists):
+    """(offsets, values) CSR arrays for a list of integer lists"""
+    offsets = np.zeros(len(lists) + 1, dtype=np.int32)
+    offsets[1:] = np.cumsum([len(values) for values in lists])
+    values = np.fromiter((value for values in lists for value in values), dtype=np.int32, count=int(offsets[-1]))
+    return offsets, values
+
+
+class CitationGraph:
+    """Section -> cited sections (and the reverse) plus subpart membership for a list of rules"""
+    def __init__(self, rules):
+        self.positions = {}  # rule_number -> position in rules
+        numbered = []  # (section number, position), for resolving "through" ranges
+        for position, rule in enumerate(rules):
+            rule_number = rule.get('rule_number')
+            section = section_number(rule_number)
+            if section is not None and rule_number not in self.positions:
+                self.positions[rule_number] = position
+                numbered.append((section, position))
+        numbered.sort()
+        sections = [section for section, _ in numbered]
+
+        cites = []
+        self.subparts = []  # position -> own subpart letter (or None)
+        self.cited_subparts = []  # position -> sorted letters of other subparts it refers to
+        for position, rule in enumerate(rules):
+            ranges, subparts = parse_citations(rule_citation_text(rule))
+            targets = set()
+            for first, last in ranges:
+                lo, hi = bisect.bisect_left(sections, first), bisect.bisect_right(sections, last)
+                targets.update(target for _, target in numbered[lo:hi])
+            targets.discard(position)
+            own = rule.get('subpart')
+            cites.append(sorted(targets))
+            self.subparts.append(own)
+            self.cited_subparts.append(sorted(subparts - {own}))
+
+        self.cite_offsets, self.cite_targets = pack(cites)
+        cited_by = [[] for _ in rules]
+        for source, targets in enumerate(cites):
+            for target in targets:
+                cited_by[target].append(source)
+        self.cited_by_offsets, self.cited_by_sources = pack(cited_by)
+
+        self.subpart_members = {}  # letter -> positions in file order
+        self.subpart_headings = {}  # letter -> heading, e.g. 'E' -> 'Certificated Operations'
+        for position, letter in enumerate(self.subparts):
+            if letter is not None:
+                self.subpart_members.setdefault(letter, []).append(position)
+                self.subpart_headings.setdefault(letter, rules[position].get('subpart_heading'))
+
+    def __len__(self):
+        """Number of section -> section citations"""
+        return len(self.cite_targets)
+
+    def cites(self, position):
+        """Positions of the rules this rule cites"""
+        return self.cite_targets[self.cite_offsets[position]:self.cite_offsets[position + 1]]
+
+    def cited_by(self, position):
+        """Positions of the rules citing this rule"""
+        return self.cited_by_sources[self.cited_by_offsets[position]:self.cited_by_offsets[position + 1]]
+
+    def expand(self, positions, limit):
+        """Up to `limit` rules cited by, then citing, the given ones (best-ranked first), excluding them"""
+        positions = [int(position) for position in positions]
+        seen = set(positions)
+        extra = []
+        for neighbours in [self.cites(p) for p in positions] + [self.cited_by(p) for p in positions]:
+            for neighbour in neighbours.tolist():
+                if len(extra) >= limit:
+                    return extra
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    extra.append(neighbour)
+        return extra
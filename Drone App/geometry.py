@@ -0,0 +1,124 @@
+"""Small planar geometry helpers for footprints, routes and airspace volumes.
+
+Coordinates come in as (longitude, latitude) degrees, as in GeoJSON, and
+are projected onto a local equirectangular plane in metres around a
+reference point. Over the extent of one flight (tens of kilometres) the
+distortion is far below the size of a raster cell or a ground-risk buffer.
+"""
+import numpy as np
+
+METRES_PER_DEGREE_LAT = 110540.0
+METRES_PER_DEGREE_LON = 111320.0  # at the equator; scaled by cos(latitude)
+
+
+class GeometryError(ValueError):
+    """A footprint or route that cannot be interpreted"""
+
+
+def _coordinates(value, closed):
+    """(raw coordinate array, closed) from GeoJSON or a plain list"""
+    if isinstance(value, dict):
+        if value.get('type') == 'Feature':
+            return _coordinates(value.get('geometry'), closed)
+        kind = value.get('type')
+        coordinates = value.get('coordinates')
+        if kind == 'Polygon':
+            coordinates, closed = (coordinates or [None])[0], True
+        elif kind == 'LineString':
+            closed = False
+        elif kind == 'Point':
+            coordinates, closed = [coordinates], False
+        else:
+            raise GeometryError(f"unsupported geometry type {kind!r}")
+        value = coordinates
+    try:
+        coordinates = np.array(value, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise GeometryError('coordinates must be a list of [longitude, latitude] pairs')
+    if coordinates.ndim != 2 or coordinates.shape[1] < 2 or not len(coordinates):
+        raise GeometryError('coordinates must be a list of [longitude, latitude] pairs')
+    vertices = coordinates[:, :2]
+    if not np.isfinite(vertices).all() or (np.abs(vertices[:, 1]) > 90).any() or (np.abs(vertices[:, 0]) > 180).any():
+        raise GeometryError('coordinates must be valid longitudes and latitudes')
+    return coordinates, closed
+
+
+def parse_geometry(value, closed=False):
+    """(vertices as an (N, 2) lon/lat array, closed) from GeoJSON or a list of [lon, lat] pairs
+
+    GeoJSON Polygons (outer ring), LineStrings, Points and Features wrapping
+    them are accepted; a plain list is a ring if `closed`, else a route.
+    """
+    coordinates, closed = _coordinates(value, closed)
+    vertices = coordinates[:, :2]
+    if closed and len(vertices) > 1 and (vertices[0] == vertices[-1]).all():
+        vertices = vertices[:-1]
+    if closed and len(vertices) < 3:
+        raise GeometryError('a polygon needs at least three distinct vertices')
+    return vertices, closed
+
+
+def parse_route(value):
+    """(N, 2) lon/lat waypoints and their altitudes in metres (None unless every waypoint has one)"""
+    coordinates, closed = _coordinates(value, False)
+    if closed:
+        raise GeometryError('a route must be a LineString or a list of waypoints')
+    altitudes = None
+    if coordinates.shape[1] >= 3:
+        altitudes = coordinates[:, 2]
+        if not np.isfinite(altitudes).all():
+            raise GeometryError('waypoint altitudes must be numbers of metres')
+    return coordinates[:, :2], altitudes
+
+
+class LocalProjection:
+    """Equirectangular projection to metres around (lon0, lat0)"""
+    def __init__(self, lon0, lat0):
+        self.lon0 = lon0
+        self.lat0 = lat0
+        self.x_scale = METRES_PER_DEGREE_LON * np.cos(np.radians(lat0))
+        self.y_scale = METRES_PER_DEGREE_LAT
+
+    @classmethod
+    def around(cls, vertices):
+        """Projection centred on the bounding box of (N, 2) lon/lat vertices"""
+        lo, hi = vertices.min(axis=0), vertices.max(axis=0)
+        return cls((lo[0] + hi[0]) / 2, (lo[1] + hi[1]) / 2)
+
+    def to_xy(self, lonlat):
+        """(N, 2) lon/lat -> (N, 2) metres"""
+        lonlat = np.asarray(lonlat, dtype=np.float64)
+        return np.column_stack(((lonlat[..., 0] - self.lon0) * self.x_scale, (lonlat[..., 1] - self.lat0) * self.y_scale))
+
+    def degrees(self, metres):
+        """(longitude, latitude) degrees spanned by a distance in metres"""
+        return metres / max(self.x_scale, 1e-9), metres / self.y_scale
+
+
+def edges(vertices, closed):
+    """(start, end) arrays of the polyline segments; a single vertex is a zero-length segment"""
+    if closed:
+        return vertices, np.roll(vertices, -1, axis=0)
+    if len(vertices) == 1:
+        return vertices, vertices
+    return vertices[:-1], vertices[1:]
+
+
+def distance_to_edges(points, starts, ends):
+    """Shortest distance from each of (N, 2) points to any of the segments, vectorized over both"""
+    seg = ends - starts
+    length2 = (seg ** 2).sum(axis=1)
+    rel = points[:, None, :] - starts[None, :, :]
+    t = np.clip((rel * seg[None]).sum(axis=2) / np.where(length2 > 0, length2, 1.0), 0.0, 1.0)
+    nearest = rel - t[..., None] * seg[None]
+    return np.sqrt((nearest ** 2).sum(axis=2).min(axis=1))
+
+
+def points_in_polygon(points, starts, ends):
+    """Even-odd point-in-polygon test for (N, 2) points against a ring given by its edges"""
+    x, y = points[:, 0:1], points[:, 1:2]
+    x1, y1, x2, y2 = starts[:, 0], starts[:, 1], ends[:, 0], ends[:, 1]
+    crosses = (y1 > y) != (y2 > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_at = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+    return (crosses & (x < x_at)).sum(axis=1) % 2 == 1
@@ -0,0 +1,140 @@
+import asyncio
+import queue
+import threading
+
+
+class LLMOverloaded(Exception):
+    """Raised when too many LLM calls are already queued; callers should answer 503"""
+    def __init__(self, retry_after):
+        super().__init__(f"LLM queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class LLMTimeout(Exception):
+    """Raised when an LLM call misses its deadline"""
+
+
+class LLMGateway:
+    """Bounded-concurrency gateway in front of a single shared model client
+
+    Calls are made on one background event loop, but the app is served over
+    WSGI, so every request thread still blocks on `future.result()` (or on the
+    stream's queue) until its answer is finished. That blocking only bounds
+    how many calls reach the model; it does not free the request thread, so a
+    server needs as many threads as questions it should hold in flight.
+    What the gateway adds is admission control: at most
+    `max_concurrency` calls reach the model at once, and once `max_queue`
+    calls are running or waiting, new calls are rejected with LLMOverloaded
+    instead of piling up threads. Each call, including its wait for a slot,
+    must finish within `timeout` seconds.
+    """
+    def __init__(self, model_factory, max_concurrency=32, max_queue=256, timeout=30.0, retry_after=5):
+        self.model_factory = model_factory
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._model = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.stats = {'calls': 0, 'rejected': 0, 'timeouts': 0, 'errors': 0}
+
+        self.loop = asyncio.new_event_loop()
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.thread = threading.Thread(target=self.loop.run_forever, name='llm-gateway', daemon=True)
+        self.thread.start()
+
+    @property
+    def model(self):
+        """The shared model client, created on first use"""
+        with self._lock:
+            if self._model is None:
+                self._model = self.model_factory()
+            return self._model
+
+    def queue_depth(self):
+        """Calls currently running or waiting for a slot"""
+        return self._pending
+
+    def is_overloaded(self):
+        return self._pending >= self.max_queue
+
+    def _admit(self):
+        with self._lock:
+            if self._pending >= self.max_queue:
+                self.stats['rejected'] += 1
+                raise LLMOverloaded(self.retry_after)
+            self._pending += 1
+            self.stats['calls'] += 1
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    def _count(self, outcome):
+        with self._lock:
+            self.stats[outcome] += 1
+
+    async def _generate(self, prompt):
+        async with self.semaphore:
+            response = await self.model.generate_content_async(prompt)
+            return response.text
+
+    def generate(self, prompt):
+        """Full answer text; the calling thread blocks until it arrives"""
+        self._admit()
+        try:
+            future = asyncio.run_coroutine_threadsafe(asyncio.wait_for(self._generate(prompt), self.timeout), self.loop)
+            return future.result()
+        except asyncio.TimeoutError:
+            self._count('timeouts')
+            raise LLMTimeout(f"LLM call exceeded {self.timeout}s")
+        except Exception:
+            self._count('errors')
+            raise
+        finally:
+            self._release()
+
+    def stream(self, prompt):
+        """Generator of answer chunks, blocking the consuming thread between them; the deadline covers the whole stream"""
+        self._admit()
+        chunks = queue.Queue()
+
+        async def run():
+            async with self.semaphore:
+                response = await self.model.generate_content_async(prompt, stream=True)
+                async for chunk in response:
+                    chunks.put(('chunk', chunk.text))
+
+        async def pump():
+            try:
+                await asyncio.wait_for(run(), self.timeout)
+                chunks.put(('done', None))
+            except asyncio.TimeoutError:
+                chunks.put(('error', LLMTimeout(f"LLM stream exceeded {self.timeout}s")))
+            except Exception as e:
+                chunks.put(('error', e))
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self.loop)
+        try:
+            while True:
+                kind, value = chunks.get()
+                if kind == 'chunk':
+                    yield value
+                elif kind == 'done':
+                    return
+                else:
+                    self._count('timeouts' if isinstance(value, LLMTimeout) else 'errors')
+                    raise value
+        finally:
+            # Stop generating if the client went away mid-stream
+            future.cancel()
+            self._release()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            pending = self._pending
+        stats.update(queue_depth=pending, max_concurrency=self.max_concurrency,
+                     max_queue=self.max_queue, timeout=self.timeout)
+        return stats
@@ -0,0 +1,291 @@
+"""Closed-loop load generator for the Drone App HTTP API.
+
+Virtual users each loop request -> response -> think time against
+/api/query (the two-step summary-preference flow), /api/rules and
+/api/categories, in a configurable mix. Each step of --users runs for
+--duration seconds. The tool reports throughput, latency percentiles and
+error rates per step, and the saturation point: the last step before
+throughput stops growing, query latency blows up or errors appear.
+
+By default it starts its own server on a free port with the stub LLM
+(LLM_BACKEND=stub) and a threaded WSGI server. Pass --url to test an
+already running instance instead:
+
+    python loadtest.py --users 1,4,16,64 --duration 15 --llm-latency 0.8
+    python loadtest.py --url http://localhost:5000 --mix query=1
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+OPERATIONS = ('query', 'rules', 'categories')
+SERVER_CODE = "import sys, app; app.app.run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True)"
+
+
+def parse_mix(text):
+    """'query=6,rules=2,categories=2' -> {'query': 6.0, ...}"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation {name!r}; choose from {', '.join(OPERATIONS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args):
+    """Launch app.py with the stub LLM on a free port and wait until it answers"""
+    port = free_port()
+    env = dict(os.environ, LLM_BACKEND='stub', STUB_LLM_LATENCY=str(args.llm_latency),
+               STUB_LLM_TOKEN_DELAY=str(args.llm_token_delay), RULES_RELOAD_INTERVAL='0')
+    if not args.answer_cache:
+        # Every question must reach the model, otherwise repeats would only measure the cache
+        env.update(ANSWER_CACHE_PATH='', ANSWER_CACHE_MEMORY_SIZE='0')
+    server = subprocess.Popen([sys.executable, '-c', SERVER_CODE, str(port)], env=env,
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError('Server exited during startup')
+        try:
+            urllib.request.urlopen(url + '/api/categories', timeout=1).read()
+            return server, url
+        except OSError:
+            time.sleep(0.25)
+    server.terminate()
+    raise RuntimeError('Server did not start within 120s')
+
+
+class Pacer:
+    """Caps the combined request start rate of all users (None means no cap)"""
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_slot = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.perf_counter()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        time.sleep(max(0.0, slot - now))
+
+
+class VirtualUser:
+    """One simulated browser: keeps ETags like a browser cache and answers the summary-preference prompt"""
+    def __init__(self, url, mix, questions, timeout, seed):
+        self.url = url
+        self.operations = list(mix)
+        self.weights = [mix[name] for name in self.operations]
+        self.questions = questions
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.etags = {}
+
+    def request(self, method, path, body=None):
+        """(status or None on a connection error, parsed JSON or None, seconds)"""
+        headers = {'Accept': 'application/json'}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        if method == 'GET' and path in self.etags:
+            headers['If-None-Match'] = self.etags[path]
+        request = urllib.request.Request(self.url + path, data=data, method=method, headers=headers)
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                raw = response.read()
+                status = response.status
+                if response.headers.get('ETag'):
+                    self.etags[path] = response.headers['ETag']
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code, None, time.perf_counter() - started
+        except OSError:
+            return None, None, time.perf_counter() - started
+        elapsed = time.perf_counter() - started
+        try:
+            return status, json.loads(raw) if raw else None, elapsed
+        except ValueError:
+            return status, None, elapsed
+
+    def run_once(self, record):
+        """Perform one randomly chosen operation, passing (name, status, seconds) to record for each HTTP call"""
+        operation = self.rng.choices(self.operations, self.weights)[0]
+        if operation == 'rules':
+            record('rules', *self.request('GET', '/api/rules')[::2])
+        elif operation == 'categories':
+            record('categories', *self.request('GET', '/api/categories')[::2])
+        else:
+            question = self.rng.choice(self.questions)
+            status, payload, seconds = self.request('POST', '/api/query', {'query': question})
+            record('query_ask', status, seconds)
+            if status == 200 and payload and payload.get('ask_summary_preference'):
+                status, _, seconds = self.request('POST', '/api/query', {
+                    'query': question,
+                    'summary_preference': self.rng.choice(['short', 'detailed']),
+                    'retrieval_token': payload.get('retrieval_token'),
+                })
+                record('query_answer', status, seconds)
+
+
+def run_step(url, users, args, mix, questions):
+    """Run `users` closed-loop users for args.duration seconds; returns per-endpoint samples"""
+    samples = {}
+    lock = threading.Lock()
+    pacer = Pacer(args.rate)
+    stop_at = time.perf_counter() + args.duration
+
+    def record(name, status, seconds):
+        with lock:
+            samples.setdefault(name, []).append((status, seconds))
+
+    def loop(seed):
+        user = VirtualUser(url, mix, questions, args.timeout, seed)
+        while time.perf_counter() < stop_at:
+            pacer.wait()
+            user.run_once(record)
+            if args.think_time:
+                time.sleep(user.rng.expovariate(1.0 / args.think_time))
+
+    threads = [threading.Thread(target=loop, args=(args.seed * 100003 + i,), daemon=True) for i in range(users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+
+def summarize(samples, elapsed):
+    """Throughput, error counts and latency percentiles per endpoint and overall"""
+    endpoints = {}
+    for name, results in sorted(samples.items()):
+        latencies = np.array([seconds for _, seconds in results]) * 1000
+        ok = sum(1 for status, _ in results if status in (200, 304))
+        rejected = sum(1 for status, _ in results if status == 503)
+        endpoints[name] = {
+            'requests': len(results),
+            'throughput_rps': round(len(results) / elapsed, 2),
+            'errors': len(results) - ok - rejected,
+            'rejected_503': rejected,
+            'p50_ms': round(float(np.percentile(latencies, 50)), 2),
+            'p95_ms': round(float(np.percentile(latencies, 95)), 2),
+            'p99_ms': round(float(np.percentile(latencies, 99)), 2),
+        }
+    total = sum(e['requests'] for e in endpoints.values())
+    failed = sum(e['errors'] + e['rejected_503'] for e in endpoints.values())
+    return {
+        'seconds': round(elapsed, 2),
+        'requests': total,
+        'throughput_rps': round(total / elapsed, 2) if elapsed else 0.0,
+        'error_rate': round(failed / total, 4) if total else 0.0,
+        'endpoints': endpoints,
+    }
+
+
+def find_saturation(steps, args):
+    """Last step before throughput gain < --min-gain, query p95 > --max-latency-factor x the first step, or errors"""
+    def query_p95(step):
+        endpoint = step['endpoints'].get('query_answer') or step['endpoints'].get('query_ask') or {}
+        return endpoint.get('p95_ms')
+
+    baseline = query_p95(steps[0]) if steps else None
+    for previous, step in zip(steps, steps[1:]):
+        reasons = []
+        if step['throughput_rps'] < previous['throughput_rps'] * (1 + args.min_gain):
+            reasons.append('throughput stopped growing')
+        p95 = query_p95(step)
+        if baseline and p95 and p95 > baseline * args.max_latency_factor:
+            reasons.append(f'query p95 above {args.max_latency_factor}x the single-step baseline')
+        if step['error_rate'] > args.max_error_rate:
+            reasons.append('error rate above threshold')
+        if reasons:
+            return {'users': previous['users'], 'throughput_rps': previous['throughput_rps'],
+                    'next_users': step['users'], 'reasons': reasons}
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='Test this running server instead of starting one with the stub LLM')
+    parser.add_argument('--users', default='1,2,4,8,16,32', help='Comma-separated concurrent users per step')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per step')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('query=6,rules=2,categories=2'))
+    parser.add_argument('--rate', type=float, help='Cap on request starts per second across all users')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Mean seconds a user waits between operations')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--questions', default=os.path.join('benchmarks', 'questions.json'))
+    parser.add_argument('--llm-latency', type=float, default=0.5, help='Stub model time to first token (own server only)')
+    parser.add_argument('--llm-token-delay', type=float, default=0.0)
+    parser.add_argument('--answer-cache', action='store_true', help='Keep the answer cache on (own server only)')
+    parser.add_argument('--min-gain', type=float, default=0.1, help='Throughput gain per step still counted as scaling')
+    parser.add_argument('--max-latency-factor', type=float, default=3.0)
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the JSON report here')
+    args = parser.parse_args()
+
+    with open(args.questions, 'r', encoding='utf-8') as f:
+        questions = [item['query'] for item in json.load(f)]
+
+    server = None
+    url = args.url
+    if not url:
+        server, url = start_server(args)
+        print(f"Started stub-LLM server at {url} (LLM latency {args.llm_latency}s)")
+
+    steps = []
+    try:
+        for users in [int(n) for n in args.users.split(',')]:
+            samples, elapsed = run_step(url, users, args, args.mix, questions)
+            step = dict(summarize(samples, elapsed), users=users)
+            steps.append(step)
+            query = step['endpoints'].get('query_answer', {})
+            print(f"{users:>5} users  {step['throughput_rps']:>8.1f} req/s  errors {step['error_rate']:.2%}  "
+                  f"answer p50 {query.get('p50_ms', 0):>8.1f} ms  p95 {query.get('p95_ms', 0):>8.1f} ms  "
+                  f"p99 {query.get('p99_ms', 0):>8.1f} ms")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    saturation = find_saturation(steps, args)
+    if saturation:
+        print(f"Saturation at ~{saturation['users']} users ({saturation['throughput_rps']} req/s); "
+              f"at {saturation['next_users']} users: {', '.join(saturation['reasons'])}")
+    else:
+        print('No saturation within the tested user counts')
+
+    if args.output:
+        report = {'url': url, 'mix': args.mix, 'duration': args.duration, 'rate': args.rate,
+                  'think_time': args.think_time, 'llm_latency': None if args.url else args.llm_latency,
+                  'steps': steps, 'saturation': saturation}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
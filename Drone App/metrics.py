@@ -0,0 +1,112 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Metrics:
+    """Per-stage latency histograms and event counters, rendered in Prometheus text format
+
+    Stages are timed with `span()` (or the `timed()` decorator). Spans that
+    run on a thread between `start_request()` and `request_timings()` are
+    also collected for that request's Server-Timing header.
+    """
+    def __init__(self, prefix, counters=None, buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self.counter_help = dict(counters or {})
+        self.counters = {name: 0 for name in self.counter_help}
+        self.histograms = {}  # stage -> [bucket counts..., +Inf count], sum
+        self.gauges = {}  # name -> (help, callable returning the current value)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def inc(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge(self, name, help_text, read):
+        """Register a value read at scrape time"""
+        self.gauges[name] = (help_text, read)
+
+    def observe(self, stage, seconds):
+        """Record one duration for a stage"""
+        with self.lock:
+            counts, total = self.histograms.get(stage) or ([0] * (len(self.buckets) + 1), 0.0)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            self.histograms[stage] = (counts, total + seconds)
+        timings = getattr(self.local, 'timings', None)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def span(self, stage):
+        """Time the enclosed block as one observation of `stage`"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def timed(self, stage):
+        """Decorator form of span()"""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def start_request(self):
+        """Begin collecting this thread's spans for one request"""
+        self.local.timings = {}
+        self.local.started = time.perf_counter()
+
+    def request_timings(self):
+        """Stage -> seconds spent so far in the current request (plus 'total'), and stop collecting"""
+        timings = getattr(self.local, 'timings', None)
+        if timings is None:
+            return {}
+        timings = dict(timings, total=time.perf_counter() - self.local.started)
+        self.local.timings = None
+        return timings
+
+    @staticmethod
+    def server_timing(timings):
+        """Server-Timing header value (durations in milliseconds)"""
+        return ', '.join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items())
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        name = f"{self.prefix}_stage_duration_seconds"
+        lines = [f"# HELP {name} Time spent in each stage of answering a question",
+                 f"# TYPE {name} histogram"]
+        with self.lock:
+            histograms = {stage: (list(counts), total) for stage, (counts, total) in self.histograms.items()}
+            counters = dict(self.counters)
+        for stage, (counts, total) in sorted(histograms.items()):
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {counts[-1]}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {counts[-1]}')
+
+        for counter, value in sorted(counters.items()):
+            full_name = f"{self.prefix}_{counter}"
+            lines.append(f"# HELP {full_name} {self.counter_help.get(counter, counter)}")
+            lines.append(f"# TYPE {full_name} counter")
+            lines.append(f"{full_name} {value}")
+
+        for gauge, (help_text, read) in sorted(self.gauges.items()):
+            full_name = f"{self.prefix}_{gauge}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} gauge")
+            lines.append(f"{full_name} {read()}")
+        return '\n'.join(lines) + '\n'
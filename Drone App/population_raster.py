@@ -0,0 +1,321 @@
+"""Maximum population density inside a flight footprint, from a gridded raster.
+
+The raster is a 2-D float array of people per km² on a regular lon/lat grid
+(e.g. GPW or WorldPop at 30 arc-seconds), stored as `<name>.npy` with a
+`<name>.json` sidecar holding `west`, `north` and `cell_size` in degrees.
+It is opened as a memory map, so only the pages a query touches are read.
+ESRI ASCII grids can be converted once:
+
+    python population_raster.py convert gpw_density.asc population.npy
+
+On load a pyramid of per-tile max and mean density is built (and cached in
+`<name>.pyramid.npz`). A footprint query is a best-first search down that
+pyramid: tiles are expanded in order of their max, and the search stops at
+the first cell, or the first tile lying wholly in the footprint, whose max
+beats every tile still queued. Most queries touch a handful of tiles and
+one or two 16 x 16 blocks of cells.
+
+Cells and tiles are tested by their circumscribed circle, so a cell the
+footprint only grazes still counts: the result errs towards the higher
+density, which is the safe side for a ground risk class.
+"""
+import argparse
+import heapq
+import json
+import os
+
+import numpy as np
+
+import sora
+from geometry import GeometryError, LocalProjection, distance_to_edges, edges, parse_geometry, points_in_polygon
+
+TILE_CELLS = 16  # cells per side of a finest-level tile
+PYRAMID_FACTOR = 4  # tiles per side merged into one tile of the next level
+PYRAMID_VERSION = 1
+START_TILES = 16  # a search starts at the finest level where the footprint spans at most this many tiles
+
+
+class Footprint:
+    """A polygon (operational volume) or a route, grown by a ground-risk buffer in metres"""
+    def __init__(self, vertices, closed, buffer_m=0.0):
+        if buffer_m < 0:
+            raise GeometryError('buffer_m must not be negative')
+        self.vertices = vertices
+        self.closed = closed
+        self.buffer = float(buffer_m)
+        self.projection = LocalProjection.around(vertices)
+        self.xy = self.projection.to_xy(vertices)
+        self.starts, self.ends = edges(self.xy, closed)
+        margin_lon, margin_lat = self.projection.degrees(self.buffer)
+        lo, hi = vertices.min(axis=0), vertices.max(axis=0)
+        self.bounds = (lo[0] - margin_lon, lo[1] - margin_lat, hi[0] + margin_lon, hi[1] + margin_lat)
+
+    @classmethod
+    def from_mission(cls, mission):
+        """Footprint of a mission with a `footprint` polygon or a `route`, plus optional `buffer_m`"""
+        if mission.get('footprint') is not None:
+            vertices, closed = parse_geometry(mission['footprint'], closed=True)
+        else:
+            vertices, closed = parse_geometry(mission['route'], closed=False)
+        try:
+            buffer_m = float(mission.get('buffer_m') or 0)
+        except (TypeError, ValueError):
+            raise GeometryError(f"buffer_m must be a number of metres, got {mission.get('buffer_m')!r}")
+        return cls(vertices, closed, buffer_m)
+
+    def classify(self, xy, radius):
+        """(intersects, fully inside) for circles of `radius` metres around (N, 2) projected centres"""
+        distance = distance_to_edges(xy, self.starts, self.ends)
+        inside = points_in_polygon(xy, self.starts, self.ends) if self.closed else np.zeros(len(xy), dtype=bool)
+        intersects = inside | (distance <= self.buffer + radius)
+        within = (inside & (distance >= radius - self.buffer)) | (distance + radius <= self.buffer)
+        return intersects, within
+
+
+def build_pyramid(density, tile=TILE_CELLS, factor=PYRAMID_FACTOR, strip_tiles=64):
+    """[(max, mean), ...] per tile, finest level first, up to a level of a single tile
+
+    The raster is read `strip_tiles` tile rows at a time so memory use
+    stays flat however large the memory map is.
+    """
+    rows, cols = density.shape
+    tile_rows, tile_cols = -(-rows // tile), -(-cols // tile)
+    maxima = np.zeros((tile_rows, tile_cols), dtype=np.float32)
+    sums = np.zeros((tile_rows, tile_cols), dtype=np.float64)
+    counts = np.zeros((tile_rows, tile_cols), dtype=np.int64)
+    for first in range(0, tile_rows, strip_tiles):
+        last = min(first + strip_tiles, tile_rows)
+        strip = np.zeros(((last - first) * tile, tile_cols * tile), dtype=np.float32)
+        chunk = np.asarray(density[first * tile:last * tile], dtype=np.float32)
+        strip[:len(chunk), :cols] = np.nan_to_num(np.maximum(chunk, 0))
+        blocks = strip.reshape(last - first, tile, tile_cols, tile)
+        maxima[first:last] = blocks.max(axis=(1, 3))
+        sums[first:last] = blocks.sum(axis=(1, 3), dtype=np.float64)
+    cell_rows = np.minimum(tile, rows - np.arange(tile_rows) * tile)
+    cell_cols = np.minimum(tile, cols - np.arange(tile_cols) * tile)
+    counts[:] = np.outer(cell_rows, cell_cols)
+
+    levels = [(maxima, (sums / counts).astype(np.float32))]
+    while maxima.shape[0] > 1 or maxima.shape[1] > 1:
+        h, w = -(-maxima.shape[0] // factor), -(-maxima.shape[1] // factor)
+        pad = ((0, h * factor - maxima.shape[0]), (0, w * factor - maxima.shape[1]))
+        maxima = np.pad(maxima, pad).reshape(h, factor, w, factor).max(axis=(1, 3))
+        sums = np.pad(sums, pad).reshape(h, factor, w, factor).sum(axis=(1, 3))
+        counts = np.pad(counts, pad).reshape(h, factor, w, factor).sum(axis=(1, 3))
+        levels.append((maxima, (sums / counts).astype(np.float32)))
+    return levels
+
+
+class PopulationRaster:
+    """Memory-mapped population density grid with max/mean tile pyramids"""
+    def __init__(self, density, west, north, cell_size, tile=TILE_CELLS, factor=PYRAMID_FACTOR, levels=None):
+        self.density = density
+        self.west = float(west)
+        self.north = float(north)
+        self.cell_size = float(cell_size)
+        self.tile = tile
+        self.factor = factor
+        self.levels = levels if levels is not None else build_pyramid(density, tile, factor)
+        self.rows, self.cols = density.shape
+
+    @classmethod
+    def load(cls, path):
+        """Open `<name>.npy` read-only with its sidecar, reusing a cached pyramid when it is current"""
+        stem = os.path.splitext(path)[0]
+        with open(stem + '.json', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        density = np.load(path, mmap_mode='r')
+        pyramid_path = stem + '.pyramid.npz'
+        stamp = np.array([PYRAMID_VERSION, TILE_CELLS, PYRAMID_FACTOR, os.path.getmtime(path), os.path.getsize(path)])
+        levels = None
+        try:
+            with np.load(pyramid_path) as cached:
+                if np.array_equal(cached['stamp'], stamp):
+                    levels = [(cached[f'max_{i}'], cached[f'mean_{i}']) for i in range(int(cached['levels']))]
+        except (OSError, KeyError, ValueError):
+            pass
+        raster = cls(density, meta['west'], meta['north'], meta['cell_size'], levels=levels)
+        if levels is None:
+            arrays = {f'{kind}_{i}': level[j] for i, level in enumerate(raster.levels) for j, kind in enumerate(('max', 'mean'))}
+            try:
+                np.savez(pyramid_path, stamp=stamp, levels=len(raster.levels), **arrays)
+            except OSError as e:
+                print(f"Could not cache the population pyramid: {e}")
+        return raster
+
+    @staticmethod
+    def save(path, density, west, north, cell_size):
+        """Write a density array and its sidecar in the format load() expects"""
+        np.save(path, np.asarray(density, dtype=np.float32))
+        with open(os.path.splitext(path)[0] + '.json', 'w', encoding='utf-8') as f:
+            json.dump({'west': west, 'north': north, 'cell_size': cell_size}, f)
+
+    def _centres(self, footprint, level, rows, cols):
+        """Centres of the given tiles (level >= 0) or cells (level -1), in the footprint's projection"""
+        size = self.cell_size * (self.tile * self.factor ** level if level >= 0 else 1)
+        projection = footprint.projection
+        xy = np.empty((len(rows), 2))
+        xy[:, 0] = (self.west - projection.lon0 + (cols + 0.5) * size) * projection.x_scale
+        xy[:, 1] = (self.north - projection.lat0 - (rows + 0.5) * size) * projection.y_scale
+        return xy
+
+    def _radius(self, footprint, level):
+        """Half-diagonal in metres of a tile (level >= 0) or cell (level -1) near the footprint"""
+        size = self.cell_size * (self.tile * self.factor ** level if level >= 0 else 1)
+        projection = footprint.projection
+        return float(np.hypot(size * projection.x_scale, size * projection.y_scale)) / 2
+
+    def _span(self, footprint, level):
+        """Row and column ranges of the tiles (or cells, level -1) covering the footprint's bounds"""
+        cells = self.tile * self.factor ** level if level >= 0 else 1
+        west, south, east, north = footprint.bounds
+        r0 = int(np.floor((self.north - north) / self.cell_size)) // cells
+        r1 = int(np.floor((self.north - south) / self.cell_size)) // cells
+        c0 = int(np.floor((west - self.west) / self.cell_size)) // cells
+        c1 = int(np.floor((east - self.west) / self.cell_size)) // cells
+        limit_rows = -(-self.rows // cells)
+        limit_cols = -(-self.cols // cells)
+        return max(r0, 0), min(r1, limit_rows - 1), max(c0, 0), min(c1, limit_cols - 1)
+
+    def _candidates(self, footprint, level, r0, r1, c0, c1):
+        """(rows, cols, intersects, fully inside) for the tiles or cells in a block (empty if r0 > r1 or c0 > c1)"""
+        if r0 > r1 or c0 > c1:
+            # A parent tile's circle can reach past the raster edge, where its clipped block is empty
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0, dtype=bool), np.zeros(0, dtype=bool)
+        rows = np.repeat(np.arange(r0, r1 + 1), c1 - c0 + 1)
+        cols = np.tile(np.arange(c0, c1 + 1), r1 - r0 + 1)
+        intersects, within = footprint.classify(self._centres(footprint, level, rows, cols), self._radius(footprint, level))
+        return rows, cols, intersects, within
+
+    def max_density(self, footprint):
+        """Highest people/km² of any cell the footprint touches, or None if it misses the raster"""
+        # Start from the finest level at which the footprint's bounds span only a few tiles
+        top = 0
+        r0, r1, c0, c1 = self._span(footprint, top)
+        while top < len(self.levels) - 1 and (r1 - r0 + 1) * (c1 - c0 + 1) > START_TILES:
+            top += 1
+            r0, r1, c0, c1 = self._span(footprint, top)
+        if r0 > r1 or c0 > c1:
+            return None
+
+        heap = []
+
+        def push(level, block):
+            rows, cols, intersects, within = self._candidates(footprint, level, *block)
+            if not intersects.any():
+                return
+            if level < 0:
+                r0, r1, c0, c1 = block
+                values = np.asarray(self.density[r0:r1 + 1, c0:c1 + 1]).ravel()[intersects]
+                # fmax skips NaN (no-data) cells; a block of only no-data cells counts as empty land
+                heapq.heappush(heap, (-float(np.nan_to_num(np.fmax.reduce(values))), -1, True, 0, 0))
+                return
+            maxima = self.levels[level][0]
+            for row, col, whole in zip(rows[intersects].tolist(), cols[intersects].tolist(), within[intersects].tolist()):
+                heapq.heappush(heap, (-float(maxima[row, col]), level, whole, row, col))
+
+        push(top, (r0, r1, c0, c1))
+        while heap:
+            negative, level, exact, row, col = heapq.heappop(heap)
+            if exact:
+                # Nothing left in the queue can beat this value, and it is attained inside the footprint
+                return max(-negative, 0.0)
+            child_level = level - 1
+            cells = self.tile * self.factor ** child_level if child_level >= 0 else 1
+            span = self.tile * self.factor ** level // cells
+            b0, b1, d0, d1 = self._span(footprint, child_level)
+            push(child_level, (max(row * span, b0), min((row + 1) * span - 1, b1),
+                               max(col * span, d0), min((col + 1) * span - 1, d1)))
+        # Tiles whose circles reached the footprint, but none of whose cells do
+        return None
+
+    def mean_density(self, footprint):
+        """Approximate mean people/km² over the footprint, from the finest tile means it touches"""
+        r0, r1, c0, c1 = self._span(footprint, 0)
+        if r0 > r1 or c0 > c1:
+            return None
+        rows, cols, intersects, _ = self._candidates(footprint, 0, r0, r1, c0, c1)
+        if not intersects.any():
+            return None
+        return float(self.levels[0][1][rows[intersects], cols[intersects]].mean())
+
+    def lookup(self, footprint, mean=False):
+        """{'max_density', 'population_density' band name[, 'mean_density']} for one footprint"""
+        density = self.max_density(footprint)
+        if density is None:
+            raise GeometryError('footprint lies outside the population raster')
+        result = {
+            'max_density': round(density, 3),
+            'population_density': sora.POPULATION_BANDS[int(sora.population_band_index(density))],
+        }
+        if mean:
+            result['mean_density'] = round(self.mean_density(footprint), 3)
+        return result
+
+    def annotate_missions(self, missions):
+        """Fill in `population_density` for missions that give a footprint or route instead
+
+        Returns {row: error message} for missions whose geometry could not be used.
+        """
+        errors = {}
+        for row, mission in enumerate(missions):
+            if not isinstance(mission, dict) or mission.get('population_density') not in (None, ''):
+                continue
+            if mission.get('footprint') is None and mission.get('route') is None:
+                continue
+            try:
+                mission['population_density'] = self.lookup(Footprint.from_mission(mission))['population_density']
+            except GeometryError as e:
+                errors[row] = str(e)
+        return errors
+
+
+def read_ascii_grid(path):
+    """(density, west, north, cell_size) from an ESRI ASCII grid; NODATA cells become 0"""
+    header = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        while len(header) < 6:
+            position = f.tell()
+            line = f.readline()
+            key, _, value = line.strip().partition(' ')
+            if not key or not key[0].isalpha():
+                f.seek(position)
+                break
+            header[key.lower()] = float(value)
+        density = np.loadtxt(f, dtype=np.float32, ndmin=2)
+    rows, cols = int(header['nrows']), int(header['ncols'])
+    cell_size = header['cellsize']
+    west = header.get('xllcorner', header.get('xllcenter', 0.0) - cell_size / 2)
+    south = header.get('yllcorner', header.get('yllcenter', 0.0) - cell_size / 2)
+    density = density.reshape(rows, cols)
+    if 'nodata_value' in header:
+        density[density == header['nodata_value']] = 0
+    return np.maximum(density, 0), west, south + rows * cell_size, cell_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Population density rasters for SORA footprints')
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert = commands.add_parser('convert', help='ESRI ASCII grid -> .npy + sidecar + pyramid')
+    convert.add_argument('input')
+    convert.add_argument('output')
+    query = commands.add_parser('query', help='Max density along a route of lon,lat points')
+    query.add_argument('raster')
+    query.add_argument('points', nargs='+', help='lon,lat')
+    query.add_argument('--buffer', type=float, default=0.0, help='Ground risk buffer in metres')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        density, west, north, cell_size = read_ascii_grid(args.input)
+        PopulationRaster.save(args.output, density, west, north, cell_size)
+        raster = PopulationRaster.load(args.output)
+        print(f"Wrote {args.output}: {raster.rows} x {raster.cols} cells, {len(raster.levels)} pyramid levels")
+    else:
+        raster = PopulationRaster.load(args.raster)
+        route = [[float(v) for v in point.split(',')] for point in args.points]
+        print(json.dumps(raster.lookup(Footprint(*parse_geometry(route), args.buffer), mean=True)))
+
+
+if __name__ == '__main__':
+    main()
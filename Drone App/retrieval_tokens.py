@@ -0,0 +1,50 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from answer_cache import normalize_query
+
+
+class RetrievalTokenStore:
+    """Short-lived, size-bounded store of retrieval results keyed by opaque tokens
+
+    Lets the second half of the summary-preference round trip reuse the
+    first half's retrieval instead of running it again. Only rule IDs and
+    scores are kept, never the rule bodies.
+    """
+    def __init__(self, ttl=300, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # token -> (created_at, normalized query, [(rule_id, score)])
+        self.lock = threading.Lock()
+        self.stats = {'issued': 0, 'redeemed': 0, 'expired_or_unknown': 0}
+
+    def issue(self, query, scored_ids):
+        """Store (rule_id, score) pairs for a query and return a new token"""
+        token = secrets.token_urlsafe(16)
+        now = time.time()
+        with self.lock:
+            self.entries[token] = (now, normalize_query(query), list(scored_ids))
+            self.stats['issued'] += 1
+            # Entries are in creation order, so expired ones and overflow sit at the front
+            while self.entries:
+                oldest_token, (created_at, _, _) = next(iter(self.entries.items()))
+                if len(self.entries) <= self.max_entries and now - created_at <= self.ttl:
+                    break
+                del self.entries[oldest_token]
+        return token
+
+    def redeem(self, token, query):
+        """Scored rule IDs stored for token, or None if it is unknown, expired or for another query"""
+        with self.lock:
+            entry = self.entries.get(token)
+            if entry is None or time.time() - entry[0] > self.ttl or entry[1] != normalize_query(query):
+                self.stats['expired_or_unknown'] += 1
+                return None
+            self.stats['redeemed'] += 1
+            return entry[2]
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, active=len(self.entries))
@@ -0,0 +1,359 @@
+"""SORA ground/air risk evaluation over whole fleets of missions.
+
+The tables mirror `calculateSORA()` in Parser/sora_risk_assessment_ui.html,
+encoded as NumPy arrays so that any number of missions is evaluated with a
+few array lookups. Missions are given as dicts, e.g. from JSON or
+csv.DictReader:
+
+    max_dimension       metres (1, 3, 8, 20, 40, '>40' or any number)
+    max_speed           m/s (25, 35, 75, 120, 200 or any number up to 200)
+    population_density  'controlled', '<5', ... '>50000', or people per km²
+    m1a, m1b, m1c, m2   0 / -1 / -2, or the level names used by the calculator
+    initial_arc         'a' to 'd'
+    residual_arc        'a' to 'd' (defaults to initial_arc)
+    ua_weight           grams (optional)
+    id                  optional, echoed back
+"""
+import csv
+import io
+from functools import lru_cache
+
+import numpy as np
+
+DIMENSION_BOUNDS = np.array([1, 3, 8, 20, 40], dtype=np.float64)  # '>40' uses the 40 m row
+SPEED_BOUNDS = np.array([25, 35, 75, 120, 200], dtype=np.float64)
+POPULATION_BANDS = ('controlled', '<5', '<50', '<500', '<5000', '<50000', '>50000')
+POPULATION_BOUNDS = np.array([5, 50, 500, 5000, 50000], dtype=np.float64)  # upper bounds of '<5' ... '<50000'
+ARCS = ('a', 'b', 'c', 'd')
+SAIL_NAMES = ('N/A', 'I', 'II', 'III', 'IV', 'V', 'VI', 'Category C (Certified)')
+CERTIFIED = 7  # SAIL code for a final GRC above 7
+
+# Mitigation -> {level name: GRC reduction}; numbers are accepted as long as they are allowed values
+MITIGATIONS = {
+    'm1a': {'none': 0, 'low': -1, 'medium': -2},
+    'm1b': {'none': 0, 'medium': -1, 'high': -2},
+    'm1c': {'none': 0, 'low': -1},
+    'm2': {'none': 0, 'medium': -1, 'high': -2},
+}
+
+# iGRC (Table 2): [dimension row][speed column][population band]; 0 marks combinations outside SORA scope
+_SMALL_UA = [
+    [1, 1, 1, 1, 1, 1, 1],
+    [1, 1, 1, 1, 1, 1, 1],
+    [1, 1, 2, 2, 2, 2, 2],
+    [1, 1, 2, 3, 3, 3, 3],
+    [1, 1, 2, 3, 3, 3, 3],
+]
+_LARGER_UA = [
+    [1, 2, 3, 4, 5, 6, 7],
+    [1, 3, 4, 5, 6, 7, 8],
+    [2, 4, 5, 6, 7, 8, 0],
+    [3, 5, 6, 7, 8, 9, 0],
+    [3, 6, 7, 8, 9, 10, 0],
+]
+IGRC_TABLE = np.array([_SMALL_UA] + [_LARGER_UA] * 4, dtype=np.int8)
+
+# Lowest iGRC in each dimension x speed column: mitigations never take the final GRC below it
+MIN_GRC = np.where(IGRC_TABLE > 0, IGRC_TABLE, np.int8(127)).min(axis=2)
+
+# SAIL (Table 7): [final GRC 0..7][ARC]; GRC <= 2 share one row
+SAIL_TABLE = np.array([
+    [1, 2, 4, 6],
+    [1, 2, 4, 6],
+    [1, 2, 4, 6],
+    [2, 2, 4, 6],
+    [3, 3, 4, 6],
+    [4, 4, 4, 6],
+    [5, 5, 5, 6],
+    [6, 6, 6, 6],
+], dtype=np.int8)
+
+# TMPR (Table 6) per residual ARC
+TMPR = (
+    {'level': 'No requirement', 'robustness': 'No requirement'},
+    {'level': 'Low', 'robustness': 'Low'},
+    {'level': 'Medium', 'robustness': 'Medium'},
+    {'level': 'High', 'robustness': 'High'},
+)
+
+
+class MissionError(ValueError):
+    """A mission field that cannot be interpreted"""
+
+
+def _number(value):
+    try:
+        return float(str(value).strip().replace(',', ''))
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def encode_dimension(value):
+    """Dimension row index (0..4)"""
+    text = str(value).strip()
+    if text.startswith('>'):
+        return len(DIMENSION_BOUNDS) - 1
+    number = _number(text)
+    if number is None or number <= 0:
+        raise MissionError(f"max_dimension must be a positive number of metres or '>40', got {value!r}")
+    return min(int(np.searchsorted(DIMENSION_BOUNDS, number, side='left')), len(DIMENSION_BOUNDS) - 1)
+
+
+@lru_cache(maxsize=4096)
+def encode_speed(value):
+    """Speed column index (0..4)"""
+    number = _number(value)
+    if number is None or number <= 0 or number > SPEED_BOUNDS[-1]:
+        raise MissionError(f"max_speed must be between 0 and {SPEED_BOUNDS[-1]:.0f} m/s, got {value!r}")
+    return int(np.searchsorted(SPEED_BOUNDS, number, side='left'))
+
+
+def population_band_index(density):
+    """Band index (1..6) for people per km², vectorized over arrays"""
+    return np.searchsorted(POPULATION_BOUNDS, density, side='right') + 1
+
+
+@lru_cache(maxsize=4096)
+def encode_population(value):
+    """Population band index (0..6)"""
+    text = str(value).strip().lower()
+    if text in POPULATION_BANDS:
+        return POPULATION_BANDS.index(text)
+    number = _number(text)
+    if number is None or number < 0:
+        raise MissionError(f"population_density must be one of {', '.join(POPULATION_BANDS)} "
+                           f"or people per km², got {value!r}")
+    return int(population_band_index(number))
+
+
+@lru_cache(maxsize=4096)
+def encode_mitigation(name, value):
+    """GRC reduction (0, -1 or -2) of one mitigation"""
+    levels = MITIGATIONS[name]
+    if value is None or str(value).strip() == '':
+        return 0
+    text = str(value).strip().lower()
+    if text in levels:
+        return levels[text]
+    number = _number(text)
+    if number is None or int(number) != number or int(number) not in levels.values():
+        raise MissionError(f"{name} must be one of {sorted(levels.values())} or {', '.join(levels)}, got {value!r}")
+    return int(number)
+
+
+@lru_cache(maxsize=4096)
+def encode_arc(value, field):
+    text = str(value).strip().lower().replace('arc-', '')
+    if text not in ARCS:
+        raise MissionError(f"{field} must be one of a, b, c, d, got {value!r}")
+    return ARCS.index(text)
+
+
+def encode_missions(missions):
+    """Column arrays for evaluate() plus {row: error message} for rows that could not be encoded"""
+    # Fleets repeat the same few field values, so the (cached) encoders mostly hit
+    rows = []
+    errors = {}
+    for row, mission in enumerate(missions):
+        try:
+            if not isinstance(mission, dict):
+                raise MissionError('each mission must be an object')
+            for field in ('max_dimension', 'max_speed', 'population_density', 'initial_arc'):
+                if mission.get(field) in (None, ''):
+                    raise MissionError(f"{field} is required")
+            initial_arc = encode_arc(mission['initial_arc'], 'initial_arc')
+            residual = mission.get('residual_arc')
+            weight = mission.get('ua_weight')
+            rows.append((
+                encode_dimension(mission['max_dimension']),
+                encode_speed(mission['max_speed']),
+                encode_population(mission['population_density']),
+                sum(encode_mitigation(name, mission.get(name)) for name in MITIGATIONS),
+                initial_arc,
+                encode_arc(residual, 'residual_arc') if residual not in (None, '') else initial_arc,
+                (_number(weight) or 0.0) if weight not in (None, '') else 0.0,
+            ))
+        except MissionError as e:
+            errors[row] = str(e)
+            rows.append((0, 0, 0, 0, 0, 0, 0.0))
+        except TypeError:  # an unhashable field value such as a list
+            errors[row] = 'mission fields must be strings or numbers'
+            rows.append((0, 0, 0, 0, 0, 0, 0.0))
+    table = np.array(rows, dtype=np.float64).reshape(-1, 7)
+    names = ('dimension', 'speed', 'population', 'mitigation', 'initial_arc', 'residual_arc')
+    columns = {name: table[:, i].astype(np.int8) for i, name in enumerate(names)}
+    columns['weight'] = table[:, 6]
+    return columns, errors
+
+
+def evaluate(dimension, speed, population, mitigation, residual_arc, weight=None):
+    """iGRC, final GRC and SAIL code for every mission at once
+
+    All arguments are equal-length integer arrays of table indexes
+    (mitigation is the summed GRC reduction). Returns a dict of arrays;
+    `in_scope` is False where the iGRC table has no value, and SAIL code
+    7 means the certified category.
+    """
+    igrc = IGRC_TABLE[dimension, speed, population].astype(np.int16)
+    if weight is not None:
+        # UA of at most 250 g flying at no more than 25 m/s always has iGRC 1
+        igrc = np.where((weight > 0) & (weight <= 250) & (speed == 0), 1, igrc)
+    in_scope = igrc > 0
+    min_grc = MIN_GRC[dimension, speed].astype(np.int16)
+    final_grc = np.maximum(igrc + mitigation, min_grc)
+    sail = np.where(final_grc > 7, CERTIFIED, SAIL_TABLE[np.clip(final_grc, 0, 7), residual_arc])
+    sail = np.where(in_scope, sail, 0)
+    return {'igrc': igrc, 'min_grc': min_grc, 'final_grc': final_grc, 'sail': sail, 'in_scope': in_scope}
+
+
+def assess_missions(missions):
+    """Evaluate a list of mission dicts; one result dict per mission, in order"""
+    columns, errors = encode_missions(missions)
+    result = evaluate(columns['dimension'], columns['speed'], columns['population'], columns['mitigation'],
+                      columns['residual_arc'], columns['weight'])
+    igrc, final_grc, min_grc = result['igrc'].tolist(), result['final_grc'].tolist(), result['min_grc'].tolist()
+    sail, in_scope = result['sail'].tolist(), result['in_scope'].tolist()
+    mitigation, residual = columns['mitigation'].tolist(), columns['residual_arc'].tolist()
+
+    assessments = []
+    for row, mission in enumerate(missions):
+        assessment = {'id': mission.get('id', row) if isinstance(mission, dict) else row}
+        if row in errors:
+            assessment['error'] = errors[row]
+        elif not in_scope[row]:
+            assessment['error'] = 'Invalid combination of UA characteristics; the operation may be outside SORA scope'
+        else:
+            assessment.update(
+                igrc=igrc[row],
+                mitigation=mitigation[row],
+                min_grc=min_grc[row],
+                final_grc=final_grc[row],
+                residual_arc=ARCS[residual[row]],
+                sail=SAIL_NAMES[sail[row]],
+                certified_category=sail[row] == CERTIFIED,
+                tmpr=TMPR[residual[row]],
+            )
+        assessments.append(assessment)
+    return assessments
+
+
+def summarize_assessments(assessments):
+    """Mission and error counts plus how many missions landed in each SAIL"""
+    sail_counts = {}
+    for assessment in assessments:
+        if 'sail' in assessment:
+            sail_counts[assessment['sail']] = sail_counts.get(assessment['sail'], 0) + 1
+    return {
+        'missions': len(assessments),
+        'errors': sum(1 for assessment in assessments if 'error' in assessment),
+        'sail_counts': {name: sail_counts[name] for name in SAIL_NAMES if name in sail_counts},
+    }
+
+
+def missions_from_csv(text):
+    """Mission dicts from CSV text with a header row of mission field names"""
+    return [{key.strip(): value for key, value in row.items() if key} for row in csv.DictReader(io.StringIO(text))]
+
+
+CSV_COLUMNS = ('id', 'igrc', 'mitigation', 'min_grc', 'final_grc', 'residual_arc', 'sail',
+               'certified_category', 'tmpr_level', 'tmpr_robustness', 'error')
+
+
+def assessments_to_csv(assessments):
+    """CSV text with one row per assessment"""
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=CSV_COLUMNS, extrasaction='ignore')
+    writer.writeheader()
+    for assessment in assessments:
+        tmpr = assessment.get('tmpr') or {}
+        writer.writerow(dict(assessment, tmpr_level=tmpr.get('level', ''), tmpr_robustness=tmpr.get('robustness', '')))
+    return out.getvalue()
+
+
+# Sensitivity sweeps ------------------------------------------------------
+#
+# The whole input space is small: 5 dimension rows x 5 speed columns x 7
+# population bands x 54 mitigation combinations x 4 ARCs. It is evaluated
+# once, on first use, and every heatmap or minimal-mitigation answer is then
+# a slice of that grid, memoized per set of parameters.
+
+SPEED_NAMES = tuple(str(int(bound)) for bound in SPEED_BOUNDS)
+DIMENSION_NAMES = tuple(str(int(bound)) for bound in DIMENSION_BOUNDS)  # '40' also covers '>40'
+
+# Every mitigation combination as per-mitigation level indexes (0 = none) and their summed reduction
+_LEVELS = [sorted(levels.items(), key=lambda item: -item[1]) for levels in MITIGATIONS.values()]
+MITIGATION_COMBOS = np.array(np.meshgrid(*[np.arange(len(levels)) for levels in _LEVELS], indexing='ij'),
+                             dtype=np.int8).reshape(len(MITIGATIONS), -1).T
+MITIGATION_REDUCTIONS = np.array([sum(_LEVELS[m][level][1] for m, level in enumerate(combo))
+                                  for combo in MITIGATION_COMBOS.tolist()], dtype=np.int16)
+
+
+def mitigation_combo_index(levels):
+    """Row of MITIGATION_COMBOS for {'m1a': reduction or level name, ...} (missing means none)"""
+    wanted = []
+    for m, name in enumerate(MITIGATIONS):
+        reduction = encode_mitigation(name, levels.get(name))
+        wanted.append(next(i for i, (_, value) in enumerate(_LEVELS[m]) if value == reduction))
+    return int(np.flatnonzero((MITIGATION_COMBOS == wanted).all(axis=1))[0])
+
+
+def describe_combo(index):
+    """{'m1a': 'low', ...} for the mitigations a combination applies (none are omitted)"""
+    return {name: _LEVELS[m][level][0]
+            for m, (name, level) in enumerate(zip(MITIGATIONS, MITIGATION_COMBOS[index].tolist())) if level}
+
+
+@lru_cache(maxsize=1)
+def sweep_grid():
+    """(final GRC [dim, speed, pop, combo], SAIL code [dim, speed, pop, combo, arc]) for the full input grid"""
+    dim, speed, pop, combo = np.meshgrid(np.arange(len(DIMENSION_BOUNDS)), np.arange(len(SPEED_BOUNDS)),
+                                         np.arange(len(POPULATION_BANDS)), np.arange(len(MITIGATION_COMBOS)),
+                                         indexing='ij')
+    final_grc = None
+    sails = []
+    for arc in range(len(ARCS)):
+        result = evaluate(dim, speed, pop, MITIGATION_REDUCTIONS[combo], np.full(dim.shape, arc))
+        final_grc = np.where(result['in_scope'], result['final_grc'], 0)
+        sails.append(result['sail'])
+    return final_grc, np.stack(sails, axis=-1)
+
+
+@lru_cache(maxsize=1024)
+def heatmap(dimension, combo, arc):
+    """Final GRC and SAIL over speed x population band for one UA size, mitigation combination and ARC"""
+    final_grc, sail = sweep_grid()
+    return {
+        'speeds': SPEED_NAMES,
+        'population_bands': POPULATION_BANDS,
+        'mitigations': describe_combo(combo),
+        'residual_arc': ARCS[arc],
+        'final_grc': [[value or None for value in row] for row in final_grc[dimension, :, :, combo].tolist()],
+        'sail': [[SAIL_NAMES[code] if code else None for code in row] for row in sail[dimension, :, :, combo, arc].tolist()],
+    }
+
+
+@lru_cache(maxsize=8192)
+def minimal_mitigations(dimension, speed, population, arc):
+    """For each target SAIL, the least mitigation combinations that reach it (or better)
+
+    A combination is kept only if no other combination reaching the target
+    uses every mitigation at the same or a lower level. Lists are ordered by
+    total mitigation level, lightest first; targets that no combination
+    reaches map to an empty list.
+    """
+    final_grc, sail = sweep_grid()
+    codes = sail[dimension, speed, population, :, arc]
+    effort = MITIGATION_COMBOS.sum(axis=1)
+    result = {}
+    for target in range(1, CERTIFIED):
+        reaching = np.flatnonzero((codes > 0) & (codes <= target))
+        minimal = [i for i in reaching.tolist()
+                   if not any(j != i and (MITIGATION_COMBOS[j] <= MITIGATION_COMBOS[i]).all() for j in reaching.tolist())]
+        minimal.sort(key=lambda i: (effort[i], i))
+        result[SAIL_NAMES[target]] = [
+            {'mitigations': describe_combo(i), 'final_grc': int(final_grc[dimension, speed, population, i]),
+             'sail': SAIL_NAMES[codes[i]]}
+            for i in minimal
+        ]
+    return result
@@ -0,0 +1,155 @@
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Inflection endings: a word that only differs from a term by these is a word form, not a typo
+SUFFIXES = ('ations', 'ation', 'ally', 'ings', 'ions', 'ing', 'ion', 'ers', 'er', 'ed', 'es', 'al', 'ly', 's')
+# Trigram (Dice) similarity a correction two edits away must reach
+MIN_SIMILARITY = 0.6
+
+
+def trigrams(word):
+    """Character trigrams of a word padded with ^ and $, so prefixes and suffixes count"""
+    padded = f'^{word}$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance (an adjacent transposition costs 1), or limit + 1 once it exceeds limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, before[j - 2] + 1)
+            current[j] = value
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+def max_edits(word):
+    """Edits allowed when correcting a word: none below 5 letters, 1 up to 7, then 2
+
+    Short words are left alone: most four-letter words are one edit away
+    from some term ("fast" -> "past", "many" -> "may").
+    """
+    if len(word) < 5:
+        return 0
+    return 1 if len(word) <= 7 else 2
+
+
+def word_forms(word, depth=2):
+    """The word and every stem left by removing up to `depth` inflection endings (at least four letters)"""
+    forms = {word}
+    if depth:
+        for suffix in SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+                forms |= word_forms(word[:-len(suffix)], depth - 1)
+    return forms
+
+
+class TrigramCorrector:
+    """Maps misspelled words to the closest vocabulary terms via a character-trigram index
+
+    Each trigram keeps the (sorted) ids of the terms containing it. A word
+    within d edits of a term shares all but at most 4 * d of its trigrams,
+    so only terms reaching that count are candidates. The best of them
+    by shared trigrams are checked with a bounded edit distance, and ties go
+    to the term that occurs in more rules. Corrections are memoized per word.
+
+    Out-of-vocabulary words are often valid English, so a candidate is
+    rejected when it is only another form of the word ("observer" ->
+    "observed", "definition" -> "definitions"), when it starts with a
+    different letter ("insurance" -> "assurance"), or when it is two edits
+    away and shares too few trigrams ("licences" -> "license").
+    """
+    def __init__(self, frequencies, max_candidates=12, cache_size=4096):
+        """`frequencies`: term -> number of rules containing it; only alphabetic terms are candidates"""
+        self.vocabulary = set(frequencies)
+        self.terms = sorted(term for term in frequencies if term.isalpha() and len(term) >= 3)
+        self.frequencies = np.array([frequencies[term] for term in self.terms], dtype=np.int64)
+        self.lengths = np.array([len(term) for term in self.terms], dtype=np.int64)
+        self.trigram_counts = np.array([len(trigrams(term)) for term in self.terms], dtype=np.int64)
+        self.max_candidates = max_candidates
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # word -> correction or None
+        self.lock = threading.Lock()
+
+        postings = {}
+        for term_id, term in enumerate(self.terms):
+            for gram in trigrams(term):
+                postings.setdefault(gram, []).append(term_id)
+        self.postings = {gram: np.array(ids, dtype=np.uint32) for gram, ids in postings.items()}
+
+    def __len__(self):
+        return len(self.terms)
+
+    def correct(self, word):
+        """Closest vocabulary term for a lowercase word, or None if it is known or nothing is close enough"""
+        if word in self.vocabulary or not word.isalpha():
+            return None
+        limit = max_edits(word)
+        if not limit:
+            return None
+        with self.lock:
+            if word in self.cache:
+                self.cache.move_to_end(word)
+                return self.cache[word]
+
+        correction = self._lookup(word, limit)
+        with self.lock:
+            self.cache[word] = correction
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return correction
+
+    def _lookup(self, word, limit):
+        grams = trigrams(word)
+        lists = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not lists:
+            return None
+        ids, shared = np.unique(np.concatenate(lists), return_counts=True)
+        keep = (shared >= len(grams) - 4 * limit) & (np.abs(self.lengths[ids] - len(word)) <= limit)
+        ids, shared = ids[keep], shared[keep]
+        if not len(ids):
+            return None
+        order = np.lexsort((-self.frequencies[ids], -shared))[:self.max_candidates]
+        similarities = 2 * shared[order] / (len(grams) + self.trigram_counts[ids[order]])
+
+        best = None
+        forms = word_forms(word)
+        for term_id, similarity in zip(ids[order].tolist(), similarities.tolist()):
+            term = self.terms[term_id]
+            if term[0] != word[0] or forms & word_forms(term):
+                continue
+            distance = edit_distance(word, term, limit)
+            if distance > limit:
+                continue
+            if distance > 1 and similarity < MIN_SIMILARITY:
+                continue
+            key = (distance, -int(self.frequencies[term_id]), term)
+            if best is None or key < best:
+                best = key
+        return best[2] if best else None
+
+    def correct_text(self, text):
+        """(text with misspelled words replaced, [{'token', 'correction'}, ...] in order)"""
+        corrections = []
+
+        def replace(match):
+            correction = self.correct(match.group().lower())
+            if correction is None:
+                return match.group()
+            corrections.append({'token': match.group(), 'correction': correction})
+            return correction
+
+        corrected = re.sub(r'\w+', replace, text)
+        return corrected, corrections
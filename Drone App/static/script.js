@@ -49,7 +49,7 @@ function autoResizeTextarea() {
 }
 
 // Send message
-async function sendMessage(summaryPreference = null) {
+async function sendMessage(summaryPreference = null, retrievalToken = null) {
     const query = userInput.value.trim();
     
     if (!query || isProcessing) return;
@@ -76,38 +76,55 @@ async function sendMessage(summaryPreference = null) {
     const typingId = addTypingIndicator();
     
     try {
-        // Send request to backend
-        const response = await fetch('/api/query', {
+        // Stream the answer from the backend (Server-Sent Events over fetch)
+        const response = await fetch('/api/query/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
             body: JSON.stringify({ 
                 query: query,
-                summary_preference: summaryPreference
+                summary_preference: summaryPreference,
+                retrieval_token: retrievalToken
             })
         });
         
-        if (!response.ok) {
+        if (!response.ok || !response.body) {
             throw new Error('Failed to get response');
         }
         
-        const data = await response.json();
+        let relevantRules = [];
+        let streamingMessage = null;
+        let answerText = '';
         
-        // Remove typing indicator
-        removeTypingIndicator(typingId);
+        await readEventStream(response, (event, data) => {
+            if (event === 'rules') {
+                relevantRules = data.relevant_rules;
+            } else if (event === 'ask_summary_preference') {
+                removeTypingIndicator(typingId);
+                addSummaryPreferencePrompt(data.query, relevantRules, data.retrieval_token);
+            } else if (event === 'chunk') {
+                // Replace the typing indicator with the answer as soon as the first chunk arrives
+                if (!streamingMessage) {
+                    removeTypingIndicator(typingId);
+                    streamingMessage = addStreamingMessage(relevantRules);
+                }
+                answerText += data.text;
+                streamingMessage.setText(answerText);
+            } else if (event === 'follow_ups') {
+                if (data.follow_ups && data.follow_ups.length > 0) {
+                    addFollowUpButtons(data.follow_ups);
+                }
+                
+                // Update query count
+                queriesCount++;
+                queriesCountEl.textContent = queriesCount;
+            } else if (event === 'error') {
+                throw new Error(data.error);
+            }
+        });
         
-        // Check if we need to ask for summary preference
-        if (data.ask_summary_preference) {
-            addSummaryPreferencePrompt(data.query, data.relevant_rules);
-        } else {
-            // Add bot response
-            addMessage(data.response, 'bot', data.relevant_rules, data.follow_ups);
-            
-            // Update query count
-            queriesCount++;
-            queriesCountEl.textContent = queriesCount;
-        }
+        removeTypingIndicator(typingId);
         
     } catch (error) {
         console.error('Error:', error);
@@ -120,8 +137,53 @@ async function sendMessage(summaryPreference = null) {
     }
 }
 
+// Read a text/event-stream response body, calling onEvent(event, data) per message
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        // Messages are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawMessage = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let event = 'message';
+            let data = '';
+            rawMessage.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) {
+                    event = line.slice(7);
+                } else if (line.startsWith('data: ')) {
+                    data += line.slice(6);
+                }
+            });
+            onEvent(event, data ? JSON.parse(data) : {});
+        }
+    }
+}
+
+// Add a bot message whose text is filled in as answer chunks arrive
+function addStreamingMessage(relevantRules) {
+    addMessage('', 'bot', relevantRules);
+    const messageDiv = chatMessages.lastElementChild;
+    const textDiv = messageDiv.querySelector('.message-text');
+    
+    return {
+        setText(text) {
+            textDiv.innerHTML = formatMessage(text);
+            scrollToBottom();
+        }
+    };
+}
+
 // Add summary preference prompt
-function addSummaryPreferencePrompt(query, relevantRules) {
+function addSummaryPreferencePrompt(query, relevantRules, retrievalToken = null) {
     const messageDiv = document.createElement('div');
     messageDiv.className = 'message bot-message';
     messageDiv.id = 'summary-preference-' + Date.now();
@@ -149,7 +211,7 @@ function addSummaryPreferencePrompt(query, relevantRules) {
     shortBtn.textContent = '📝 Short Summary';
     shortBtn.addEventListener('click', () => {
         userInput.value = query;
-        sendMessage('short');
+        sendMessage('short', retrievalToken);
         messageDiv.remove();
     });
     
@@ -158,7 +220,7 @@ function addSummaryPreferencePrompt(query, relevantRules) {
     detailedBtn.textContent = '📚 Detailed Explanation';
     detailedBtn.addEventListener('click', () => {
         userInput.value = query;
-        sendMessage('detailed');
+        sendMessage('detailed', retrievalToken);
         messageDiv.remove();
     });
     
@@ -186,8 +248,10 @@ function addMessage(content, type, relevantRules = null, followUps = null) {
     messageContent.className = 'message-content';
     
     // Format content with markdown-like support
-    const formattedContent = formatMessage(content);
-    messageContent.innerHTML = formattedContent;
+    const textDiv = document.createElement('div');
+    textDiv.className = 'message-text';
+    textDiv.innerHTML = formatMessage(content);
+    messageContent.appendChild(textDiv);
     
     // Add relevant rules if available
     if (relevantRules && relevantRules.length > 0) {
@@ -341,10 +405,10 @@ async function loadCategories() {
     }
 }
 
-// Load total rules count
+// Load total rules count (a one-rule page is enough; the ETag lets the browser revalidate with a 304)
 async function loadTotalRules() {
     try {
-        const response = await fetch('/api/rules');
+        const response = await fetch('/api/rules?limit=1');
         const data = await response.json();
         
         if (data.total !== undefined) {
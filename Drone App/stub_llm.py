@@ -0,0 +1,63 @@
+import asyncio
+import re
+import time
+
+
+class StubChunk:
+    """Mimics the `.text` attribute of a Gemini response or stream chunk"""
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """Deterministic offline stand-in for genai.GenerativeModel
+
+    The answer is derived from the rule numbers found in the prompt, so the
+    same prompt always yields the same text. `latency` seconds are spent
+    before the first token and `token_delay` between streamed chunks.
+    """
+    def __init__(self, model_name='stub', latency=0.0, token_delay=0.0):
+        self.model_name = model_name
+        self.latency = latency
+        self.token_delay = token_delay
+
+    def answer_for(self, prompt):
+        """Build the canned answer for a prompt"""
+        rule_numbers = list(dict.fromkeys(re.findall(r'Rule (\d+\.\d+)', prompt)))
+        question = re.search(r'USER QUESTION: (.*)', prompt)
+        question = question.group(1).strip() if question else 'your question'
+        if not rule_numbers:
+            return f"[stub] No regulations were provided for: {question}"
+        cited = ', '.join(f"**Rule {number}**" for number in rule_numbers)
+        return (f"[stub] Regarding \"{question}\", the applicable regulations are {cited}. "
+                f"Rule {rule_numbers[0]} is the most relevant starting point.")
+
+    def generate_content(self, prompt, stream=False):
+        """Return a response object, or an iterator of chunks when stream=True"""
+        if self.latency:
+            time.sleep(self.latency)
+        text = self.answer_for(prompt)
+        if not stream:
+            return StubChunk(text)
+        return self._stream(text)
+
+    def _stream(self, text):
+        for i, token in enumerate(re.findall(r'\S+\s*', text)):
+            if i and self.token_delay:
+                time.sleep(self.token_delay)
+            yield StubChunk(token)
+
+    async def generate_content_async(self, prompt, stream=False):
+        """Async counterpart of generate_content (an async iterator of chunks when stream=True)"""
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        text = self.answer_for(prompt)
+        if not stream:
+            return StubChunk(text)
+        return self._stream_async(text)
+
+    async def _stream_async(self, text):
+        for i, token in enumerate(re.findall(r'\S+\s*', text)):
+            if i and self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield StubChunk(token)
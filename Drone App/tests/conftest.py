@@ -0,0 +1,13 @@
+import os
+import sys
+
+# The app's modules live side by side in "Drone App", not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing app builds the index at module level: use the offline stub model and
+# keep caches and snapshots in memory so tests never touch files in the tree
+os.environ['LLM_BACKEND'] = 'stub'
+os.environ['ANSWER_CACHE_PATH'] = ''
+os.environ['INDEX_SNAPSHOT_DIR'] = ''
+os.environ['STUB_LLM_LATENCY'] = '0'
+os.environ['STUB_LLM_TOKEN_DELAY'] = '0'
@@ -0,0 +1,78 @@
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from airspace import AirspaceIndex, STRTree, segments_cross
+
+
+def random_boxes(rng, count, spread=100.0):
+    lo = rng.uniform(0, spread, size=(count, 2))
+    return np.column_stack((lo, lo + rng.uniform(0, spread / 10, size=(count, 2))))
+
+
+def linear_scan(stored, queries):
+    """Every (query row, stored index) whose boxes overlap (touching counts), by checking all pairs"""
+    return {(q, s) for q, box in enumerate(queries) for s, other in enumerate(stored)
+            if box[0] <= other[2] and other[0] <= box[2] and box[1] <= other[3] and other[1] <= box[3]}
+
+
+@pytest.mark.parametrize('count, capacity', [(0, 16), (1, 16), (16, 16), (17, 16), (300, 16), (1000, 4), (257, 2)])
+def test_str_query_matches_linear_scan(count, capacity):
+    rng = np.random.default_rng(count * 31 + capacity)
+    stored = random_boxes(rng, count)
+    queries = np.vstack((random_boxes(rng, 60, spread=110.0), stored[:5]))  # includes exact duplicates
+    tree = STRTree(stored, capacity=capacity)
+    rows, indices = tree.query_pairs(queries)
+    assert len(tree) == count
+    assert len(set(zip(rows.tolist(), indices.tolist()))) == len(rows)  # no duplicate pairs
+    assert set(zip(rows.tolist(), indices.tolist())) == linear_scan(stored, queries)
+
+
+def segments_meet(p, q, a, b):
+    """Exact intersection test on rational coordinates, by solving p + t (q - p) = a + u (b - a)"""
+    p, q, a, b = ([Fraction(int(v)) for v in point] for point in (p, q, a, b))
+    r = (q[0] - p[0], q[1] - p[1])
+    s = (b[0] - a[0], b[1] - a[1])
+    d = (a[0] - p[0], a[1] - p[1])
+    denominator = r[0] * s[1] - r[1] * s[0]
+    if denominator:
+        t = (d[0] * s[1] - d[1] * s[0]) / denominator
+        u = (d[0] * r[1] - d[1] * r[0]) / denominator
+        return 0 <= t <= 1 and 0 <= u <= 1
+    if d[0] * r[1] - d[1] * r[0] or d[0] * s[1] - d[1] * s[0]:
+        return False  # parallel on different lines
+    # Collinear (or degenerate): compare extents along both axes
+    return all(min(p[k], q[k]) <= max(a[k], b[k]) and min(a[k], b[k]) <= max(p[k], q[k]) for k in (0, 1))
+
+
+def test_segments_cross_matches_exact_solution():
+    rng = np.random.default_rng(5)
+    # A small integer grid makes touching, collinear and degenerate segments common
+    p, q, a, b = (rng.integers(0, 6, size=(5000, 2)).astype(np.float64) for _ in range(4))
+    expected = [segments_meet(*points) for points in zip(p, q, a, b)]
+    assert segments_cross(p, q, a, b).tolist() == expected
+
+
+def test_hover_point_beside_a_sloped_edge_is_outside_the_volume():
+    # A one-waypoint route becomes a zero-length segment; (0.8, 0.8) is inside the
+    # hypotenuse's bounding box but outside the triangle
+    triangle = {'type': 'Feature', 'properties': {'arc': 'c', 'name': 'triangle'},
+                'geometry': {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 0], [0, 1], [0, 0]]]}}
+    index = AirspaceIndex.from_geojson({'type': 'FeatureCollection', 'features': [triangle]}, default_arc='b')
+    outside, inside = index.assess_routes([[[0.8, 0.8]], [[0.2, 0.2]]])
+    assert outside['segments'][0]['volumes'] == []
+    assert outside['worst_arc'] == index.assess_routes([[[5.0, 5.0]]])[0]['worst_arc']
+    assert inside['segments'][0]['volumes'] == ['triangle']
+
+
+def test_segregated_volume_lowers_arc_below_the_default():
+    square = {'type': 'Feature', 'properties': {'arc': 'a', 'name': 'segregated'},
+              'geometry': {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]]}}
+    index = AirspaceIndex.from_geojson({'type': 'FeatureCollection', 'features': [square]}, default_arc='b')
+    inside, crossing_out = index.assess_routes([[[0.2, 0.2], [0.8, 0.8]], [[0.5, 0.5], [2.0, 2.0], [3.0, 3.0]]])
+    assert [segment['arc'] for segment in inside['segments']] == ['a']
+    assert inside['worst_arc'] == 'a'
+    # Leaving the volume: the first segment still touches it, the second takes the default
+    assert [segment['arc'] for segment in crossing_out['segments']] == ['a', 'b']
+    assert crossing_out['worst_arc'] == 'b'
@@ -0,0 +1,89 @@
+from unittest import mock
+
+import pytest
+
+import answer_cache
+import app
+from answer_cache import AnswerCache, make_cache_key, normalize_query
+
+
+class Clock:
+    """Stand-in for time.time() that only moves when told to"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    clock = Clock()
+    with mock.patch.object(answer_cache.time, 'time', clock):
+        yield clock
+
+
+def test_key_ignores_trivial_rewrites_and_rule_order():
+    key = make_cache_key('What is the max altitude?', ['3', '12'], 'short', 2)
+    assert normalize_query('  WHAT is   the max-altitude ') == 'what is the max altitude'
+    assert make_cache_key('what is the  MAX altitude', ['12', '3'], 'short', 2) == key
+
+
+def test_key_separates_rules_preference_and_template_version():
+    key = make_cache_key('max altitude', ['3', '12'], 'short', 2)
+    assert make_cache_key('max altitude', ['3'], 'short', 2) != key
+    assert make_cache_key('max altitude', ['3', '12'], 'detailed', 2) != key
+    assert make_cache_key('max altitude', ['3', '12'], None, 2) != key
+    assert make_cache_key('max altitude', ['3', '12'], 'short', 3) != key
+
+
+def test_memory_tier_evicts_least_recently_used(clock):
+    cache = AnswerCache(None, memory_size=2)
+    cache.put('a', 'A')
+    cache.put('b', 'B')
+    assert cache.get('a') == 'A'  # 'b' is now the least recently used
+    cache.put('c', 'C')
+    assert [cache.get(key) for key in 'abc'] == ['A', None, 'C']
+    assert cache.get_stats()['evictions'] == 1
+
+
+def test_entries_expire_after_ttl(clock, tmp_path):
+    cache = AnswerCache(str(tmp_path / 'answers.sqlite3'), ttl=60)
+    cache.put('a', 'A')
+    clock.now += 60
+    assert cache.get('a') == 'A'
+    clock.now += 1
+    assert cache.get('a') is None
+    assert cache.get_stats()['disk_entries'] == 0
+
+
+def test_disk_tier_survives_restart_and_evicts_least_recently_read(clock, tmp_path):
+    path = str(tmp_path / 'answers.sqlite3')
+    cache = AnswerCache(path, memory_size=1, disk_size=2)
+    cache.put('a', 'A')
+    clock.now += 1
+    cache.put('b', 'B')
+    clock.now += 1
+    assert cache.get('a') == 'A'  # read back from SQLite, which refreshes its access time
+    clock.now += 1
+    cache.put('c', 'C')
+
+    restarted = AnswerCache(path, memory_size=1, disk_size=2)
+    assert [restarted.get(key) for key in 'abc'] == ['A', None, 'C']
+    assert restarted.get_stats()['disk_hits'] == 2
+
+
+def test_answers_are_cached_per_model(monkeypatch):
+    rag = app.rag_system
+    rag.answer_cache.clear()
+    query = 'What records must a remote pilot keep?'
+    relevant_rules = rag.find_relevant_rules(query)
+    with mock.patch.object(app.llm_gateway, 'generate', return_value='first answer') as generate:
+        assert list(rag.generate_answer_chunks(query, relevant_rules, 'short', stream=False)) == ['first answer']
+        assert list(rag.generate_answer_chunks(query, relevant_rules, 'short', stream=False)) == ['first answer']
+        assert generate.call_count == 1
+
+        monkeypatch.setattr(app, 'ANSWER_MODEL_ID', 'gemini:another-model')
+        generate.return_value = 'second answer'
+        assert list(rag.generate_answer_chunks(query, relevant_rules, 'short', stream=False)) == ['second answer']
+        assert generate.call_count == 2
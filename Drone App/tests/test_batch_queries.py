@@ -0,0 +1,61 @@
+from unittest import mock
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def test_batch_corrects_each_question_once():
+    rag = app.rag_system
+    queries = ['max altitud for BVLSO', 'remote pilot certficate', 'How fast can my drone fly?']
+    with mock.patch.object(rag.spelling, 'correct_text', wraps=rag.spelling.correct_text) as correct_text:
+        batch, corrections = rag.find_relevant_rules_batch(queries)
+    assert correct_text.call_count == len(queries)
+    assert corrections == [
+        [{'token': 'altitud', 'correction': 'altitude'}, {'token': 'BVLSO', 'correction': 'bvlos'}],
+        [{'token': 'certficate', 'correction': 'certificate'}],
+        [],
+    ]
+    # Same rules, in the same order, as asking one question at a time
+    for rules, query in zip(batch, queries):
+        assert [r['id'] for r in rules] == [r['id'] for r in rag.find_relevant_rules(query)]
+
+
+def test_batch_results_carry_corrections(client):
+    body = client.post('/api/query/batch', json={
+        'queries': ['remote pilot certficate', 'hello', ''], 'summary_preference': 'short',
+    }).get_json()
+    assert [r['corrections'] for r in body['results']] == [
+        [{'token': 'certficate', 'correction': 'certificate'}], [], [],
+    ]
+
+
+def test_duplicate_questions_share_one_llm_call(client):
+    app.rag_system.answer_cache.clear()
+    question = 'What records must a remote pilot keep?'
+    with mock.patch.object(app.llm_gateway, 'generate', return_value='one answer') as generate:
+        body = client.post('/api/query/batch', json={
+            'queries': [question, question.upper(), {'query': question, 'summary_preference': 'short'}],
+            'summary_preference': 'short',
+        }).get_json()
+    assert generate.call_count == 1
+    assert body['unique_contexts'] == 1 and body['succeeded'] == 3
+    assert [r['response'] for r in body['results']] == ['one answer'] * 3
+    assert [r['index'] for r in body['results']] == [0, 1, 2]
+
+
+def test_full_llm_queue_marks_items_overloaded(client):
+    app.rag_system.answer_cache.clear()
+    with mock.patch.object(app.llm_gateway, 'generate', side_effect=app.LLMOverloaded(7)):
+        body = client.post('/api/query/batch', json={
+            'queries': ['remote pilot certificate', 'hello'], 'summary_preference': 'short',
+        }).get_json()
+    overloaded, greeting = body['results']
+    assert overloaded['status'] == 'overloaded' and overloaded['retry_after'] == 7
+    assert greeting['status'] == 'ok'
+    assert body['succeeded'] == 1
@@ -0,0 +1,63 @@
+import math
+
+import numpy as np
+import pytest
+
+import app
+from app import SYNONYM_DICT, BM25Retriever, bm25_rule_counts
+
+QUERIES = [
+    'maximum altitude for beyond visual line of sight operations',
+    'BVLOS flight over people',
+    'remote pilot certificate',
+    'aircraft weight limit pounds',
+    'zzzq qqqx',
+]
+
+
+@pytest.fixture(scope='module')
+def retriever():
+    return BM25Retriever(app.rag_system.rules, SYNONYM_DICT)
+
+
+def brute_force_scores(retriever, query, k1=1.2, b=0.75):
+    """Oracle: the BM25 formula evaluated rule by rule from each rule's term counts"""
+    counts = [bm25_rule_counts(rule)[0] for rule in retriever.rules]
+    lengths = [bm25_rule_counts(rule)[1] for rule in retriever.rules]
+    avg_length = sum(lengths) / len(lengths)
+    scores = []
+    for word_counts, length in zip(counts, lengths):
+        score = 0.0
+        for term, weight in retriever.query_terms(query).items():
+            tf = word_counts.get(term, 0)
+            if not tf:
+                continue
+            df = sum(1 for other in counts if term in other)
+            idf = math.log(1 + (len(counts) - df + 0.5) / (df + 0.5))
+            score += weight * idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_length))
+        scores.append(score)
+    return np.array(scores)
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_scores_match_brute_force(retriever, query):
+    assert np.allclose(retriever.score(query), brute_force_scores(retriever, query), rtol=1e-4, atol=1e-5)
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_heap_top_k_matches_full_sort(retriever, query):
+    scores = retriever.score(query)
+    for top_k in (1, 5, 10, 500):
+        top = retriever.search_indices(query, top_k)
+        expected = sorted(np.flatnonzero(scores).tolist(), key=lambda i: scores[i], reverse=True)[:top_k]
+        assert scores[top].tolist() == scores[expected].tolist()
+        assert all(scores[i] > 0 for i in top)
+    assert retriever.search_indices('zzzq qqqx', 5) == []
+
+
+def test_arrays_round_trip(retriever):
+    restored = BM25Retriever.from_arrays(retriever.rules, SYNONYM_DICT, retriever.to_arrays())
+    assert restored.avg_doc_length == pytest.approx(retriever.avg_doc_length)
+    for query in QUERIES:
+        assert np.array_equal(restored.score(query), retriever.score(query))
+        assert restored.search_indices(query, 5) == retriever.search_indices(query, 5)
@@ -0,0 +1,83 @@
+import json
+import os
+import sys
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from citations import CitationGraph, parse_citations
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PARSER_DIR = os.path.join(os.path.dirname(APP_DIR), 'Parser')
+sys.path.insert(0, PARSER_DIR)
+
+from ingest_federal_register import SUBPART_HEADING_PATTERN, iter_sections  # noqa: E402
+
+
+@pytest.mark.parametrize('text, sections, subparts', [
+    ('in accordance with § 108.185.', [(185, 185)], set()),
+    ('as required under §§ 108.40 and 108.45;', [(40, 40), (45, 45)], set()),
+    ('as defined in §§ 108.400 through 108.415, and', [(400, 415)], set()),
+    ('pursuant to §§ 108.130(a)(4) and 108.135;', [(130, 130), (135, 135)], set()),
+    ('submitted in accordance with § 108.505(b)(2).', [(505, 505)], set()),
+    ('the provisions of §§ 91.133, 91.137 through 91.145, and 99.7 of this chapter', [], set()),
+    ('must comply with § 91.227 and § 108.30', [(30, 30)], set()),
+    ('in accordance with subparts G and H of this part;', [], {'G', 'H'}),
+    ('Except as provided in subpart E, no operator may', [], {'E'}),
+    ('the requirements of this subpart and subpart H of this part', [], {'H'}),
+    ('complies with subpart F of part 89 of this chapter.', [], set()),
+    ('meets subparts G and H of part 21 of this chapter', [], set()),
+    ('meets subparts G, H, and E of part 21', [], set()),
+    ('under subpart D of part 108', [], {'D'}),
+    ('subpart E, and a copy', [], {'E'}),
+    ('Subpart C—Flight Operations Personnel', [], {'C'}),
+])
+def test_parse_citations(text, sections, subparts):
+    assert parse_citations(text) == (sections, subparts)
+
+
+def test_ingest_subparts_match_table_of_contents():
+    xml_path = os.path.join(PARSER_DIR, 'federal_register.xml')
+    # Oracle: the part's <CONTENTS> lists every section number under its subpart heading
+    part = next(p for p in ET.parse(xml_path).iter('PART') if 'PART 108' in (p.findtext('HD') or ''))
+    expected = {}
+    for subpart in part.find('CONTENTS').iter('SUBPART'):
+        letter, heading = SUBPART_HEADING_PATTERN.match(subpart.findtext('HD')).groups()
+        for sectno in subpart.iter('SECTNO'):
+            expected[sectno.text.strip()] = (letter, heading)
+
+    records = list(iter_sections(xml_path))
+    assert {r['rule_number']: (r['subpart'], r['subpart_heading']) for r in records} == expected
+    # The body spells one heading "SUBPART C"; it must still come out as C
+    assert expected['108.300'] == ('C', 'Operations Personnel')
+
+    with open(os.path.join(APP_DIR, 'parsed_rules.json'), encoding='utf-8') as f:
+        curated = json.load(f)
+    assert {r['rule_number']: (r['subpart'], r['subpart_heading']) for r in curated} == expected
+
+
+def test_graph_matches_pairwise_citations():
+    rules = [
+        {'rule_number': '108.40', 'subpart': 'A', 'subpart_heading': 'General',
+         'description': 'See § 108.135 and subpart E of this part.'},
+        {'rule_number': '108.135', 'subpart': 'B', 'subpart_heading': 'Operating Rules',
+         'description': 'As required under §§ 108.40 and 108.45; see § 108.135(a).'},
+        {'rule_number': '108.45', 'subpart': 'A', 'subpart_heading': 'General', 'description': 'Nothing cited.'},
+        {'rule_number': '108.400', 'subpart': 'D', 'subpart_heading': 'Permitted Operations',
+         'description': 'Operations under §§ 108.40 through 108.135.'},
+        {'rule_number': '108.500', 'subpart': 'E', 'subpart_heading': 'Certificated Operations',
+         'description': 'Subparts D and E of part 21 do not count.'},
+    ]
+    graph = CitationGraph(rules)
+    # Brute force: rule i cites rule j when one of i's ranges covers j's section number
+    for i, rule in enumerate(rules):
+        ranges, _ = parse_citations(rule['description'])
+        expected = [j for j, other in enumerate(rules)
+                    if j != i and any(lo <= int(other['rule_number'].split('.')[1]) <= hi for lo, hi in ranges)]
+        assert graph.cites(i).tolist() == expected
+        assert graph.cited_by(i).tolist() == [j for j in range(len(rules)) if i in graph.cites(j).tolist()]
+    assert graph.cited_subparts == [['E'], [], [], [], []]
+    assert graph.subpart_members == {'A': [0, 2], 'B': [1], 'D': [3], 'E': [4]}
+    assert graph.subpart_headings['E'] == 'Certificated Operations'
+    assert graph.expand([1], 2) == [0, 2]
+    assert graph.expand([1], 5) == [0, 2, 3]
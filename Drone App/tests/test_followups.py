@@ -0,0 +1,42 @@
+import random
+from unittest import mock
+
+import pytest
+
+import app
+
+QUERY = 'Can I fly a drone at night beyond visual line of sight?'
+
+
+@pytest.fixture
+def rag():
+    rag = app.rag_system
+    rag.followup_cache.clear()
+    return rag
+
+
+def test_followups_are_deterministic(rag):
+    relevant_rules = rag.find_relevant_rules(QUERY)
+    random.seed(1)
+    first = rag.generate_followups(QUERY, relevant_rules)
+    rag.followup_cache.clear()
+    random.seed(2)  # the global random state must not matter
+    assert rag.generate_followups(QUERY, relevant_rules) == first
+    assert first and all(isinstance(question, str) and question for question in first)
+
+
+def test_followups_are_memoized_per_query_and_rules(rag):
+    relevant_rules = rag.find_relevant_rules(QUERY)
+    with mock.patch.object(rag, '_generate_followups', wraps=rag._generate_followups) as generate:
+        first = rag.generate_followups(QUERY, relevant_rules)
+        assert rag.generate_followups(QUERY.upper(), relevant_rules) == first
+        assert generate.call_count == 1
+
+        rag.generate_followups(QUERY, relevant_rules[:2])
+        assert generate.call_count == 2
+
+        # An edited rule gets a new fingerprint, so its follow-ups are generated again
+        rule_id = relevant_rules[0]['id']
+        with mock.patch.dict(rag.rule_fingerprints, {rule_id: 'edited' + rag.rule_fingerprints[rule_id]}):
+            rag.generate_followups(QUERY, relevant_rules)
+        assert generate.call_count == 3
@@ -0,0 +1,62 @@
+import re
+import threading
+
+import app
+from metrics import Metrics
+
+
+def test_render_prometheus_text():
+    metrics = Metrics('demo', counters={'hits_total': 'Cache hits'}, buckets=(0.1, 1.0))
+    metrics.gauge('queue_depth', 'Calls waiting', lambda: 3)
+    for seconds in (0.05, 0.5, 0.5, 2.0):
+        metrics.observe('llm', seconds)
+    metrics.inc('hits_total', 2)
+    assert metrics.render() == '\n'.join([
+        '# HELP demo_stage_duration_seconds Time spent in each stage of answering a question',
+        '# TYPE demo_stage_duration_seconds histogram',
+        'demo_stage_duration_seconds_bucket{stage="llm",le="0.1"} 1',
+        'demo_stage_duration_seconds_bucket{stage="llm",le="1.0"} 3',
+        'demo_stage_duration_seconds_bucket{stage="llm",le="+Inf"} 4',
+        'demo_stage_duration_seconds_sum{stage="llm"} 3.05',
+        'demo_stage_duration_seconds_count{stage="llm"} 4',
+        '# HELP demo_hits_total Cache hits',
+        '# TYPE demo_hits_total counter',
+        'demo_hits_total 2',
+        '# HELP demo_queue_depth Calls waiting',
+        '# TYPE demo_queue_depth gauge',
+        'demo_queue_depth 3',
+    ]) + '\n'
+
+
+def test_request_timings_only_cover_their_own_thread():
+    metrics = Metrics('demo')
+    metrics.start_request()
+    with metrics.span('retrieval'):
+        pass
+    other = threading.Thread(target=metrics.observe, args=('retrieval', 5.0))
+    other.start()
+    other.join()
+    timings = metrics.request_timings()
+    assert set(timings) == {'retrieval', 'total'} and timings['retrieval'] < 5.0
+    assert metrics.request_timings() == {}
+    assert Metrics.server_timing({'retrieval': 0.0012, 'total': 0.5}) == 'retrieval;dur=1.20, total;dur=500.00'
+
+
+def stage_count(text, stage):
+    match = re.search(rf'drone_rag_stage_duration_seconds_count{{stage="{stage}"}} (\d+)', text)
+    return int(match.group(1)) if match else 0
+
+
+def test_queries_are_timed_and_exported():
+    client = app.app.test_client()
+    before = client.get('/metrics').get_data(as_text=True)
+    response = client.post('/api/query', json={'query': 'night operations', 'summary_preference': 'short'})
+    assert re.search(r'\bretrieval;dur=[\d.]+', response.headers['Server-Timing'])
+    assert 'total;dur=' in response.headers['Server-Timing']
+
+    scrape = client.get('/metrics')
+    assert scrape.mimetype == 'text/plain'
+    after = scrape.get_data(as_text=True)
+    assert stage_count(after, 'retrieval') == stage_count(before, 'retrieval') + 1
+    assert 'drone_rag_llm_queue_depth 0' in after
+    assert re.search(r'^drone_rag_answer_cache_misses_total \d+$', after, re.MULTILINE)
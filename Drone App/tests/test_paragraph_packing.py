@@ -0,0 +1,57 @@
+import pytest
+
+import app
+from app import ParagraphIndex, estimate_tokens, rule_paragraphs
+
+QUERIES = ['maximum altitude for BVLOS operations', 'remote pilot training and records', 'cybersecurity']
+
+
+@pytest.mark.parametrize('budget', [0, 40, 200, 1200])
+@pytest.mark.parametrize('query', QUERIES)
+def test_packing_stays_under_budget_and_in_document_order(query, budget):
+    rag = app.rag_system
+    positions = [rag.rule_positions[rule['id']] for rule in rag.find_relevant_rules(query)]
+    packed = rag.paragraph_index.pack(query, positions, budget)
+    assert list(packed) == positions
+    assert sum(estimate_tokens(text) for texts in packed.values() for text in texts) <= budget
+    for position, texts in packed.items():
+        paragraphs = rule_paragraphs(rag.rules[position])
+        indices = [paragraphs.index(text) for text in texts]
+        assert indices == sorted(indices)
+
+
+def test_every_rule_gets_its_best_paragraph_before_any_second_one():
+    rules = [
+        {'paragraphs': ['Drone altitude limits and drone altitude waivers.', 'Fees for the application.',
+                        'Altitude records for every drone flight.']},
+        {'paragraphs': ['Registration of a drone.', 'Drone altitude above people.']},
+    ]
+    index = ParagraphIndex(rules)
+    first_picks = estimate_tokens(rules[0]['paragraphs'][0]) + estimate_tokens(rules[1]['paragraphs'][1])
+    # Room for exactly the two best paragraphs: the second altitude paragraph of rule 0 must wait
+    assert index.pack('drone altitude', [0, 1], first_picks) == {
+        0: [rules[0]['paragraphs'][0]], 1: [rules[1]['paragraphs'][1]],
+    }
+    assert index.pack('drone altitude', [0, 1], first_picks + estimate_tokens(rules[0]['paragraphs'][2])) == {
+        0: [rules[0]['paragraphs'][0], rules[0]['paragraphs'][2]], 1: [rules[1]['paragraphs'][1]],
+    }
+
+
+def test_repeated_paragraphs_are_packed_once():
+    shared = 'Each remote pilot must keep flight records for 24 months.'
+    rules = [
+        {'paragraphs': [shared, 'Other text.']},
+        {'paragraphs': [' each REMOTE pilot must keep flight records, for 24 months ']},
+    ]
+    packed = ParagraphIndex(rules).pack('flight records', [0, 1], 1000)
+    assert packed == {0: [shared, 'Other text.'], 1: []}
+
+
+def test_context_names_every_rule_even_without_excerpts():
+    rag = app.rag_system
+    query = QUERIES[0]
+    relevant_rules = rag.find_relevant_rules(query)
+    context = rag.build_context(query, relevant_rules)
+    for rule in relevant_rules:
+        assert f"Rule {rule['rule_number']}: " in context
+    assert estimate_tokens(context) < sum(estimate_tokens(rule.get('description', '')) for rule in relevant_rules)
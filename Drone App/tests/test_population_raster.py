@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from geometry import parse_geometry
+from population_raster import Footprint, PopulationRaster
+
+
+def brute_force_max(raster, footprint):
+    """Max density over every cell of the clipped bounds whose circle meets the footprint, or None"""
+    r0, r1, c0, c1 = raster._span(footprint, -1)
+    if r0 > r1 or c0 > c1:
+        return None
+    rows, cols = np.meshgrid(np.arange(r0, r1 + 1), np.arange(c0, c1 + 1), indexing='ij')
+    rows, cols = rows.ravel(), cols.ravel()
+    intersects, _ = footprint.classify(raster._centres(footprint, -1, rows, cols), raster._radius(footprint, -1))
+    if not intersects.any():
+        return None
+    return float(max(np.asarray(raster.density)[rows[intersects], cols[intersects]].max(), 0.0))
+
+
+@pytest.fixture(scope='module')
+def raster():
+    rng = np.random.default_rng(7)
+    density = (rng.pareto(1.5, size=(300, 400)) * 50).astype(np.float32)
+    return PopulationRaster(density, west=-100.0, north=40.0, cell_size=0.01)
+
+
+def test_off_edge_footprint_misses_the_raster(raster):
+    # Just south of the raster: the bounds clip to an empty block of cells
+    footprint = Footprint(*parse_geometry([[-98.77, 36.94]]), 3000)
+    assert brute_force_max(raster, footprint) is None
+    assert raster.max_density(footprint) is None
+
+
+def test_max_density_matches_full_scan(raster):
+    rng = np.random.default_rng(11)
+    for _ in range(400):
+        # Centres up to half a degree outside the raster, so edges and misses are exercised
+        start = rng.uniform([-100.5, 36.5], [-95.5, 40.5])
+        points = start + np.cumsum(rng.normal(0, 0.02, size=(rng.integers(1, 4), 2)), axis=0)
+        closed = len(points) >= 3 and rng.random() < 0.5
+        footprint = Footprint(points, closed, float(rng.uniform(0, 4000)))
+        assert raster.max_density(footprint) == pytest.approx(brute_force_max(raster, footprint))
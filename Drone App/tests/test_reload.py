@@ -0,0 +1,63 @@
+import json
+import os
+from unittest import mock
+
+import pytest
+
+import app
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'parsed_rules.json')
+QUERY = 'maximum altitude for BVLOS'
+
+
+@pytest.fixture
+def rules_file(tmp_path, monkeypatch):
+    """A copy of the rules served by a fresh index that reload_rules() may replace"""
+    path = tmp_path / 'parsed_rules.json'
+    with open(RULES_PATH, encoding='utf-8') as f:
+        rules = json.load(f)
+    path.write_text(json.dumps(rules), encoding='utf-8')
+    monkeypatch.setattr(app, 'rag_system', app.DroneRAG(str(path), snapshot_dir=None))
+    monkeypatch.setattr(app, 'reload_status', dict(app.reload_status))
+    return path, rules
+
+
+def test_reload_swaps_in_a_new_index_and_reuses_unchanged_rules(rules_file):
+    path, rules = rules_file
+    before = app.rag_system
+    old_results = before.find_relevant_rules(QUERY)
+    rules[0]['title'] = 'Applicability of this part to BVLOS operations.'
+    path.write_text(json.dumps(rules), encoding='utf-8')
+
+    with mock.patch.object(app, 'analyze_rule', wraps=app.analyze_rule) as analyze_rule:
+        assert app.reload_rules()
+    assert analyze_rule.call_count == 1  # only the edited rule is re-tokenized
+    assert app.reload_status['changes']['changed'] == 1
+    assert app.reload_status['changes']['unchanged'] == len(rules) - 1
+
+    after = app.rag_system
+    assert after is not before and after.rules[0]['title'] == rules[0]['title']
+    # A request still holding the old instance keeps a complete, unchanged index
+    assert before.rules[0]['title'] != rules[0]['title']
+    assert before.find_relevant_rules(QUERY) == old_results
+    # The reused analyses index exactly like a full rebuild
+    fresh = app.DroneRAG(str(path), snapshot_dir=None)
+    assert after.find_relevant_rules(QUERY) == fresh.find_relevant_rules(QUERY)
+    assert after.knowledge_base == fresh.knowledge_base
+
+
+def test_unchanged_file_is_not_reloaded(rules_file):
+    before = app.rag_system
+    assert not app.reload_rules()
+    assert app.rag_system is before
+    assert app.reload_rules(force=True)
+    assert app.rag_system is not before
+
+
+def test_broken_file_keeps_the_current_index(rules_file):
+    path, _ = rules_file
+    before = app.rag_system
+    path.write_text('[', encoding='utf-8')
+    assert not app.reload_rules()
+    assert app.rag_system is before
+    assert 'no rules' in app.reload_status['last_error']
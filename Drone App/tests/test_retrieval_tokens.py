@@ -0,0 +1,60 @@
+from unittest import mock
+
+import pytest
+
+import app
+import retrieval_tokens
+from retrieval_tokens import RetrievalTokenStore
+
+SCORED = [('12', 0.8), ('3', 0.5)]
+
+
+@pytest.fixture
+def now():
+    clock = mock.Mock(return_value=1000.0)
+    with mock.patch.object(retrieval_tokens.time, 'time', clock):
+        yield clock
+
+
+def test_token_round_trip_is_tied_to_the_query(now):
+    store = RetrievalTokenStore(ttl=60)
+    token = store.issue('What is the max altitude?', SCORED)
+    assert store.redeem(token, 'what is the MAX altitude') == SCORED
+    assert store.redeem(token, 'remote pilot certificate') is None
+    assert store.redeem('forged-token', 'What is the max altitude?') is None
+    assert store.get_stats() == {'issued': 1, 'redeemed': 1, 'expired_or_unknown': 2, 'active': 1}
+
+
+def test_tokens_expire_after_ttl(now):
+    store = RetrievalTokenStore(ttl=60)
+    token = store.issue('max altitude', SCORED)
+    now.return_value += 60
+    assert store.redeem(token, 'max altitude') == SCORED
+    now.return_value += 1
+    assert store.redeem(token, 'max altitude') is None
+    store.issue('another question', SCORED)  # issuing sweeps the expired entry
+    assert store.get_stats()['active'] == 1
+
+
+def test_store_keeps_only_the_newest_tokens(now):
+    store = RetrievalTokenStore(max_entries=2)
+    tokens = [store.issue(f'question {i}', SCORED) for i in range(3)]
+    assert [store.redeem(token, f'question {i}') for i, token in enumerate(tokens)] == [None, SCORED, SCORED]
+
+
+def test_preference_round_trip_skips_second_retrieval():
+    client = app.app.test_client()
+    query = 'What training does a remote pilot need?'
+    first = client.post('/api/query', json={'query': query}).get_json()
+    assert first['ask_summary_preference']
+
+    rag = app.rag_system
+    with mock.patch.object(rag, 'find_relevant_rules', wraps=rag.find_relevant_rules) as find_relevant_rules:
+        second = client.post('/api/query', json={'query': query, 'summary_preference': 'short',
+                                                 'retrieval_token': first['retrieval_token']}).get_json()
+        assert find_relevant_rules.call_count == 0
+        assert second['relevant_rules'] == first['relevant_rules']
+
+        client.post('/api/query', json={'query': query, 'summary_preference': 'short',
+                                        'retrieval_token': 'expired-token'})
+        assert find_relevant_rules.call_count == 1
@@ -0,0 +1,67 @@
+import gzip
+import json
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def walk(client, **params):
+    """Every rule returned by following next_cursor from the first page"""
+    rules = []
+    cursor = None
+    while True:
+        query = dict(params, **({'cursor': cursor} if cursor else {}))
+        page = client.get('/api/rules', query_string=query).get_json()
+        rules.extend(page['rules'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return rules, page['total']
+
+
+@pytest.mark.parametrize('limit', [1, 7, 50, 200])
+def test_pages_cover_every_rule_in_file_order(client, limit):
+    rules, total = walk(client, limit=limit)
+    assert rules == app.rag_system.rules and total == len(rules)
+
+
+def test_category_pages_match_a_linear_filter(client):
+    for category in client.get('/api/categories').get_json()['categories']:
+        rules, total = walk(client, category=category, limit=5)
+        expected = [rule for rule in app.rag_system.rules if rule.get('category') == category]
+        assert rules == expected and total == len(expected)
+
+
+@pytest.mark.parametrize('query', [{'limit': 0}, {'limit': 201}, {'limit': 'ten'}, {'cursor': 'no-such-rule'}])
+def test_bad_page_requests_are_rejected(client, query):
+    assert client.get('/api/rules', query_string=query).status_code == 400
+
+
+def test_if_none_match_returns_304(client):
+    first = client.get('/api/rules?limit=10')
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and first.headers['Cache-Control'] == 'no-cache'
+
+    for tag in (etag, f'W/{etag}', f'"stale", {etag}', '*'):
+        revalidated = client.get('/api/rules?limit=10', headers={'If-None-Match': tag})
+        assert revalidated.status_code == 304 and revalidated.data == b''
+        assert revalidated.headers['ETag'] == etag
+    assert client.get('/api/rules?limit=10', headers={'If-None-Match': '"stale"'}).status_code == 200
+    # Another page is another representation
+    assert client.get('/api/rules?limit=11', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_gzip_body_and_tag(client):
+    identity = client.get('/api/rules?limit=10')
+    compressed = client.get('/api/rules?limit=10', headers={'Accept-Encoding': 'gzip, br'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert compressed.headers['Vary'] == 'Accept-Encoding'
+    assert json.loads(gzip.decompress(compressed.data)) == identity.get_json()
+    assert compressed.headers['ETag'] != identity.headers['ETag']
+    # Either tag revalidates either representation
+    assert client.get('/api/rules?limit=10', headers={'If-None-Match': compressed.headers['ETag']}).status_code == 304
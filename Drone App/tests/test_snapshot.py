@@ -0,0 +1,60 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from app import DroneRAG
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'parsed_rules.json')
+QUERIES = ['maximum altitude for BVLOS', 'remote pilot certificate', 'maintenance records']
+
+
+@pytest.fixture(scope='module')
+def snapshot(tmp_path_factory):
+    snapshot_dir = str(tmp_path_factory.mktemp('snapshot'))
+    fresh = DroneRAG(RULES_PATH, snapshot_dir=None)
+    fresh.save_snapshot(snapshot_dir)
+    return fresh, snapshot_dir
+
+
+def test_loaded_snapshot_equals_fresh_build(snapshot):
+    fresh, snapshot_dir = snapshot
+    loaded = DroneRAG(RULES_PATH, snapshot_dir=snapshot_dir)
+    # Memory-mapped arrays show the snapshot was loaded rather than rebuilt
+    assert isinstance(loaded.embeddings.data, np.memmap)
+
+    for name, arr in fresh.embeddings.to_arrays().items():
+        assert np.array_equal(loaded.embeddings.to_arrays()[name], arr)
+    for name, arr in fresh.fast_retriever.to_arrays().items():
+        assert np.array_equal(loaded.fast_retriever.to_arrays()[name], arr)
+    for name, arr in fresh.paragraph_index.to_arrays().items():
+        assert np.array_equal(loaded.paragraph_index.to_arrays()[name], arr)
+    assert loaded.knowledge_base == json.loads(json.dumps(fresh.knowledge_base))
+    for query in QUERIES:
+        assert loaded.find_relevant_rules(query) == fresh.find_relevant_rules(query)
+
+
+def test_changed_rules_reject_the_snapshot(snapshot, tmp_path):
+    _, snapshot_dir = snapshot
+    with open(RULES_PATH, encoding='utf-8') as f:
+        rules = json.load(f)
+    rules[0]['title'] = 'Edited title.'
+    edited_path = tmp_path / 'parsed_rules.json'
+    edited_path.write_text(json.dumps(rules), encoding='utf-8')
+
+    rag = DroneRAG(str(edited_path), snapshot_dir=None)
+    assert not rag.load_snapshot(snapshot_dir)
+    assert not isinstance(rag.embeddings.data, np.memmap)
+
+
+def test_incomplete_snapshot_is_rebuilt(snapshot, tmp_path):
+    fresh, snapshot_dir = snapshot
+    broken_dir = tmp_path / 'broken'
+    shutil.copytree(snapshot_dir, broken_dir)
+    os.remove(broken_dir / 'embeddings.data.npy')
+
+    rag = DroneRAG(RULES_PATH, snapshot_dir=str(broken_dir))
+    assert not isinstance(rag.embeddings.data, np.memmap)
+    assert rag.find_relevant_rules(QUERIES[0]) == fresh.find_relevant_rules(QUERIES[0])
@@ -0,0 +1,166 @@
+import itertools
+import json
+import os
+import re
+
+import pytest
+
+import app
+import sora
+
+HTML_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                         'Parser', 'sora_risk_assessment_ui.html')
+
+# The calculator's form values
+DIMENSIONS = ('1', '3', '8', '20', '40', '>40')
+SPEEDS = ('25', '35', '75', '120', '200')
+LEVELS = {'m1a': (0, -1, -2), 'm1b': (0, -1, -2), 'm1c': (0, -1), 'm2': (0, -1, -2)}
+
+
+@pytest.fixture(scope='module')
+def tables():
+    """iGRCTable, sailTable and tmprTable as written in the calculator's script"""
+    with open(HTML_PATH, encoding='utf-8') as f:
+        html = f.read()
+    return {name: json.loads(re.search(rf'const {name} = (\{{.*?\}});', html, re.DOTALL).group(1))
+            for name in ('iGRCTable', 'sailTable', 'tmprTable')}
+
+
+def calculate_sora(tables, weight, dimension, speed, population, reductions, initial_arc, residual_arc=None):
+    """Line-by-line port of calculateSORA(): (iGRC, final GRC, SAIL, TMPR), or None outside SORA scope"""
+    residual_arc = residual_arc or initial_arc
+    igrc_table = tables['iGRCTable']
+    key = '40' if dimension == '>40' else dimension
+    if 0 < weight <= 250 and speed == '25':
+        igrc = 1
+    else:
+        igrc = igrc_table.get(key, {}).get(speed, {}).get(population)
+    if igrc is None:
+        return None
+    min_grc = min(v for v in igrc_table[key][speed].values() if v is not None)
+    final_grc = max(igrc + sum(reductions), min_grc)
+    if final_grc > 7:
+        sail = 'Category C (Certified)'
+    else:
+        sail = tables['sailTable']['≤2' if final_grc <= 2 else str(final_grc)][residual_arc]
+    return igrc, final_grc, sail, tables['tmprTable'][residual_arc]
+
+
+def test_every_calculator_input_matches_the_html_tables(tables):
+    missions = []
+    expected = []
+    for dimension, speed, population, arc in itertools.product(DIMENSIONS, SPEEDS, sora.POPULATION_BANDS, sora.ARCS):
+        for reductions in itertools.product(*LEVELS.values()):
+            missions.append(dict(zip(LEVELS, reductions), max_dimension=dimension, max_speed=speed,
+                                 population_density=population, initial_arc=arc))
+            expected.append(calculate_sora(tables, 0, dimension, speed, population, reductions, arc))
+
+    for assessment, reference in zip(sora.assess_missions(missions), expected):
+        if reference is None:
+            assert 'outside SORA scope' in assessment['error']
+        else:
+            got = (assessment['igrc'], assessment['final_grc'], assessment['sail'], assessment['tmpr'])
+            assert got == reference
+            assert assessment['certified_category'] == (reference[2] == 'Category C (Certified)')
+
+
+@pytest.mark.parametrize('weight', [0, 200, 250, 251])
+def test_small_ua_rule_and_residual_arc(tables, weight):
+    missions = [{'max_dimension': dimension, 'max_speed': speed, 'population_density': population,
+                 'initial_arc': 'd', 'residual_arc': 'b', 'ua_weight': weight, 'm1a': 'low'}
+                for dimension, speed, population in itertools.product(DIMENSIONS, SPEEDS, sora.POPULATION_BANDS)]
+    for mission, assessment in zip(missions, sora.assess_missions(missions)):
+        reference = calculate_sora(tables, weight, mission['max_dimension'], mission['max_speed'],
+                                   mission['population_density'], (-1,), 'd', 'b')
+        if reference is None:
+            assert 'error' in assessment
+        else:
+            assert (assessment['igrc'], assessment['final_grc'], assessment['sail'], assessment['tmpr']) == reference
+
+
+def test_numbers_are_banded_like_the_form_options():
+    numeric = {'max_dimension': 2.5, 'max_speed': 30, 'population_density': 49.9, 'initial_arc': 'ARC-c'}
+    named = {'max_dimension': '3', 'max_speed': '35', 'population_density': '<50', 'initial_arc': 'c'}
+    assert sora.assess_missions([numeric])[0] == dict(sora.assess_missions([named])[0], id=0)
+    assert sora.assess_missions([dict(numeric, population_density=50)])[0]['igrc'] == 5  # 50 is in '<500'
+
+
+def test_bad_missions_fail_alone():
+    missions = [
+        {'id': 'ok', 'max_dimension': '1', 'max_speed': '25', 'population_density': '<5', 'initial_arc': 'a'},
+        {'id': 'fast', 'max_dimension': '1', 'max_speed': '250', 'population_density': '<5', 'initial_arc': 'a'},
+        {'id': 'no-arc', 'max_dimension': '1', 'max_speed': '25', 'population_density': '<5'},
+        {'id': 'bad-m2', 'max_dimension': '1', 'max_speed': '25', 'population_density': '<5', 'initial_arc': 'a',
+         'm2': -3},
+        'not a mission',
+    ]
+    assessments = sora.assess_missions(missions)
+    assert assessments[0]['sail'] == 'I'
+    assert [('error' in a) for a in assessments] == [False, True, True, True, True]
+    assert sora.summarize_assessments(assessments) == {'missions': 5, 'errors': 4, 'sail_counts': {'I': 1}}
+
+
+def test_batch_endpoint_accepts_json_and_csv():
+    client = app.app.test_client()
+    csv_body = 'id,max_dimension,max_speed,population_density,initial_arc,m1a\nm1,8,75,<500,c,medium\nm2,1,25,bad,a,\n'
+    from_csv = client.post('/api/sora/batch', data=csv_body, content_type='text/csv').get_json()
+    from_json = client.post('/api/sora/batch', json={'missions': sora.missions_from_csv(csv_body)}).get_json()
+    assert from_csv == from_json
+    assert from_csv['results'][0]['id'] == 'm1' and from_csv['results'][0]['sail'] == 'IV'
+    assert 'population_density' in from_csv['results'][1]['error']
+
+    as_csv = client.post('/api/sora/batch?format=csv', data=csv_body, content_type='text/csv')
+    rows = as_csv.get_data(as_text=True).splitlines()
+    assert rows[0] == ','.join(sora.CSV_COLUMNS) and rows[1].startswith('m1,6,-2,2,4,c,IV,False,Medium,Medium')
+    assert client.post('/api/sora/batch', json=[]).status_code == 400
+
+
+def combo_levels(index):
+    """Reductions (m1a, m1b, m1c, m2) of one mitigation combination"""
+    applied = sora.describe_combo(index)
+    return tuple(sora.MITIGATIONS[name][applied.get(name, 'none')] for name in sora.MITIGATIONS)
+
+
+def test_heatmaps_match_the_calculator(tables):
+    for dimension, combo, arc in itertools.product(range(5), range(len(sora.MITIGATION_COMBOS)), range(4)):
+        heatmap = sora.heatmap(dimension, combo, arc)
+        for (s, speed), (p, population) in itertools.product(enumerate(SPEEDS), enumerate(sora.POPULATION_BANDS)):
+            reference = calculate_sora(tables, 0, DIMENSIONS[dimension], speed, population,
+                                       combo_levels(combo), sora.ARCS[arc])
+            got = (heatmap['final_grc'][s][p], heatmap['sail'][s][p])
+            assert got == ((None, None) if reference is None else (reference[1], reference[2]))
+    assert sora.heatmap(2, 5, 1) is sora.heatmap(2, 5, 1)  # memoized
+
+
+def test_minimal_mitigations_are_exactly_the_undominated_combinations():
+    combos = sora.MITIGATION_COMBOS.tolist()
+    operations = [(2, 2, 3, 2), (4, 4, 6, 3), (1, 0, 1, 0), (3, 1, 5, 1), (4, 3, 4, 0)]
+    for dimension, speed, population, arc in operations:
+        _, sail = sora.sweep_grid()
+        codes = sail[dimension, speed, population, :, arc].tolist()
+        answer = sora.minimal_mitigations(dimension, speed, population, arc)
+        for target in range(1, sora.CERTIFIED):
+            reaching = [i for i, code in enumerate(codes) if 0 < code <= target]
+            # Brute force: a combination is minimal when no other reaching one is at or below it everywhere
+            minimal = {i for i in reaching
+                       if not any(j != i and all(a <= b for a, b in zip(combos[j], combos[i])) for j in reaching)}
+            listed = answer[sora.SAIL_NAMES[target]]
+            assert {sora.mitigation_combo_index(entry['mitigations']) for entry in listed} == minimal
+            efforts = [sum(combos[sora.mitigation_combo_index(entry['mitigations'])]) for entry in listed]
+            assert efforts == sorted(efforts)
+
+
+def test_sweep_endpoints():
+    client = app.app.test_client()
+    sweep = client.get('/api/sora/sweep', query_string={'max_dimension': '>40', 'm1a': 'low'}).get_json()
+    assert sweep['max_dimension'] == '40' and [h['residual_arc'] for h in sweep['heatmaps']] == list(sora.ARCS)
+    low_m1a = sora.mitigation_combo_index({'m1a': 'low'})
+    assert sweep['heatmaps'][2] == json.loads(json.dumps(sora.heatmap(4, low_m1a, 2)))
+
+    query = {'max_dimension': '8', 'max_speed': '75', 'population_density': '<5000', 'residual_arc': 'c',
+             'target_sail': 'iv'}
+    answer = client.get('/api/sora/sweep/mitigations', query_string=query).get_json()
+    assert answer['unmitigated'] == 'VI' and list(answer['targets']) == ['IV']
+    assert answer['targets']['IV'] == json.loads(json.dumps(sora.minimal_mitigations(2, 2, 4, 2)['IV']))
+    assert client.get('/api/sora/sweep', query_string={'max_dimension': 'huge'}).status_code == 400
+    assert client.get('/api/sora/sweep/mitigations', query_string=dict(query, target_sail='VII')).status_code == 400
@@ -0,0 +1,78 @@
+import json
+import os
+import re
+from collections import Counter
+
+import pytest
+
+from spelling import TrigramCorrector, edit_distance
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'parsed_rules.json')
+
+
+@pytest.fixture(scope='module')
+def corrector():
+    """A corrector over the words of the shipped rules, as the retriever indexes them"""
+    with open(RULES_PATH, 'r', encoding='utf-8') as f:
+        rules = json.load(f)
+    frequencies = Counter()
+    for rule in rules:
+        text = f"{rule.get('title', '')} {rule.get('description', '')} {rule.get('definition', '')}"
+        frequencies.update(set(re.findall(r'\w+', text.lower())))
+    frequencies.setdefault('bvlos', 0)  # from the synonym dictionary
+    return TrigramCorrector(frequencies)
+
+
+@pytest.mark.parametrize('typo, expected', [
+    ('altitud', 'altitude'),
+    ('bvlso', 'bvlos'),
+    ('certficate', 'certificate'),
+    ('weigth', 'weight'),
+    ('peple', 'people'),
+    ('registraton', 'registration'),
+    ('requirments', 'requirements'),
+    ('maintenence', 'maintenance'),
+    ('aircarft', 'aircraft'),
+    ('reqiurements', 'requirements'),
+])
+def test_corrects_typos(corrector, typo, expected):
+    assert corrector.correct(typo) == expected
+
+
+@pytest.mark.parametrize('word', [
+    'fast', 'many', 'last', 'members', 'observer', 'insurance', 'definition', 'drones',
+    'waivers', 'pilots', 'licences', 'insured', 'commercially', 'recreation',
+])
+def test_leaves_valid_words_alone(corrector, word):
+    assert corrector.correct(word) is None
+
+
+def test_known_words_and_numbers_are_kept(corrector):
+    assert corrector.correct_text('Part 107 altitude limit') == ('Part 107 altitude limit', [])
+
+
+def test_correct_text_reports_tokens(corrector):
+    corrected, corrections = corrector.correct_text('max altitud for BVLSO flights')
+    assert corrected == 'max altitude for bvlos flights'
+    assert corrections == [{'token': 'altitud', 'correction': 'altitude'},
+                           {'token': 'BVLSO', 'correction': 'bvlos'}]
+
+
+def levenshtein_with_swaps(a, b):
+    """Unbounded optimal string alignment distance, by the textbook recurrence"""
+    d = [[i + j if i * j == 0 else 0 for j in range(len(b) + 1)] for i in range(len(a) + 1)]
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            d[i][j] = min(d[i - 1][j] + 1, d[i][j - 1] + 1, d[i - 1][j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d[i][j] = min(d[i][j], d[i - 2][j - 2] + 1)
+    return d[-1][-1]
+
+
+def test_bounded_edit_distance_matches_full_table():
+    words = ['altitude', 'altitud', 'bvlos', 'bvlso', 'weight', 'weigth', 'ca', 'abc', 'acb', 'operator', 'opertor', '']
+    for a in words:
+        for b in words:
+            exact = levenshtein_with_swaps(a, b)
+            for limit in (1, 2):
+                assert edit_distance(a, b, limit) == (exact if exact <= limit else limit + 1)
@@ -0,0 +1,61 @@
+import json
+from unittest import mock
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def client():
+    app.rag_system.answer_cache.clear()
+    return app.app.test_client()
+
+
+def sse_events(response):
+    """[(event, data)] of a Server-Sent Events body"""
+    events = []
+    for message in response.get_data(as_text=True).split('\n\n'):
+        if message:
+            event, data = message.split('\n')
+            events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+def test_answer_events_arrive_in_order(client):
+    question = {'query': 'What is the maximum altitude for BVLOS flights?', 'summary_preference': 'short'}
+    response = client.post('/api/query/stream', json=question)
+    assert response.mimetype == 'text/event-stream'
+    events = sse_events(response)
+    names = [name for name, _ in events]
+    assert names[0] == 'rules' and names[-2:] == ['follow_ups', 'done']
+    assert set(names[1:-2]) == {'chunk'} and len(names) > 4
+
+    # The streamed answer is the same one /api/query generates
+    streamed = ''.join(data['text'] for name, data in events if name == 'chunk')
+    app.rag_system.answer_cache.clear()
+    plain = client.post('/api/query', json=question).get_json()
+    assert streamed == plain['response']
+    assert events[0][1]['relevant_rules'] == plain['relevant_rules']
+    assert events[-2][1]['follow_ups'] == plain['follow_ups']
+
+
+def test_missing_preference_asks_before_answering(client):
+    events = sse_events(client.post('/api/query/stream', json={'query': 'remote pilot certificate'}))
+    assert [name for name, _ in events] == ['rules', 'ask_summary_preference', 'done']
+    assert events[1][1]['retrieval_token']
+
+
+def test_error_after_headers_ends_the_stream(client):
+    with mock.patch.object(app.rag_system, 'generate_answer_chunks', side_effect=RuntimeError('model down')):
+        events = sse_events(client.post('/api/query/stream', json={'query': 'night operations',
+                                                                    'summary_preference': 'short'}))
+    assert [name for name, _ in events] == ['rules', 'error']
+    assert events[-1][1] == {'error': 'model down'}
+
+
+def test_rejections_are_plain_http_errors(client):
+    assert client.post('/api/query/stream', json={'query': ' '}).status_code == 400
+    with mock.patch.object(app.llm_gateway, 'is_overloaded', return_value=True):
+        response = client.post('/api/query/stream', json={'query': 'night operations'})
+    assert response.status_code == 503 and response.headers['Retry-After']
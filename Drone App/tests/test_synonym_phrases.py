@@ -0,0 +1,53 @@
+import random
+import re
+from collections import Counter
+
+from app import SYNONYM_DICT, BM25Retriever, SynonymIndex
+
+INDEX = SynonymIndex(SYNONYM_DICT)
+PHRASES = {tuple(re.findall(r'\w+', text.lower()))
+           for head, synonyms in SYNONYM_DICT.items() for text in [head] + synonyms}
+PHRASES = {phrase for phrase in PHRASES if len(phrase) > 1}
+
+
+def test_phrase_terms_match_a_naive_scan():
+    rng = random.Random(23)
+    vocabulary = sorted({word for phrase in PHRASES for word in phrase}) + ['the', 'drone', 'must']
+    for _ in range(300):
+        words = [rng.choice(vocabulary) for _ in range(rng.randint(0, 30))]
+        expected = Counter('_'.join(phrase) for phrase in PHRASES
+                           for i in range(len(words)) if tuple(words[i:i + len(phrase)]) == phrase)
+        found, terms = INDEX.terms(' '.join(words).upper())
+        assert found == words
+        assert Counter(terms) == Counter(words) + expected
+
+
+def test_overlapping_phrases_are_all_indexed():
+    _, terms = INDEX.terms('An unmanned aircraft system flown beyond visual line of sight.')
+    assert {'unmanned_aircraft', 'unmanned_aircraft_system', 'beyond_visual_line_of_sight',
+            'line_of_sight'} <= set(terms)
+
+
+def test_query_expansion_goes_both_ways_between_phrases_and_heads():
+    weights = INDEX.query_terms('maximum altitude of an unmanned aircraft')
+    assert weights['maximum_altitude'] == weights['unmanned_aircraft'] == 1.0
+    assert weights['altitude'] == 1.0  # a query word is never down-weighted as someone's synonym
+    assert weights['drone'] == weights['above_ground_level'] == weights['limit'] == 0.5
+    assert INDEX.query_terms('drone')['unmanned_aircraft_system'] == 0.5
+
+
+def test_multi_word_synonyms_reach_the_rules_that_use_the_head_word():
+    rules = [
+        {'title': 'Registration', 'description': 'Every drone must be registered before flight.'},
+        {'title': 'Aircraft', 'description': 'An aircraft that is not unmanned must carry a pilot.'},
+        {'title': 'Visual observers', 'description': 'The observer keeps sight of the line of travel.'},
+        {'title': 'Waivers', 'description': 'Operations beyond visual line of sight need a waiver.'},
+    ]
+    retriever = BM25Retriever(rules, SYNONYM_DICT)
+    # 'unmanned aircraft' only matches rule 0 through the phrase -> 'drone' synonym;
+    # the same words in another order are not the phrase
+    assert retriever.score('unmanned aircraft')[0] > 0
+    assert retriever.score('aircraft unmanned')[0] == 0
+    # The rule holding the whole phrase beats one holding the same words scattered
+    scores = retriever.score('beyond visual line of sight')
+    assert scores[3] > scores[2] > 0
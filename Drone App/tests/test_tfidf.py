@@ -0,0 +1,71 @@
+import math
+
+import numpy as np
+import pytest
+
+import app
+from app import TfidfMatrix, create_simple_embedding, rule_embedding_text, top_k_indices
+
+QUERIES = [
+    'maximum altitude for beyond visual line of sight operations',
+    'remote pilot certificate requirements',
+    'maintenance records',
+    'zzz unknown words only',
+    '',
+]
+
+
+def dense_tfidf(documents, query):
+    """Oracle: cosine of smoothed TF-IDF vectors built with plain dicts"""
+    counts = [create_simple_embedding(doc) for doc in documents]
+    df = {}
+    for word_counts in counts:
+        for word in word_counts:
+            df[word] = df.get(word, 0) + 1
+    idf = {word: math.log((1 + len(documents)) / (1 + n)) + 1 for word, n in df.items()}
+
+    def unit(word_counts):
+        vec = {word: count * idf[word] for word, count in word_counts.items() if word in idf}
+        norm = math.sqrt(sum(v * v for v in vec.values()))
+        return {word: v / norm for word, v in vec.items()} if norm else {}
+
+    q = unit(create_simple_embedding(query))
+    return [sum(weight * q.get(word, 0.0) for word, weight in unit(word_counts).items()) for word_counts in counts]
+
+
+@pytest.fixture(scope='module')
+def documents():
+    return [rule_embedding_text(rule) for rule in app.rag_system.rules] + ['', 'Only one line.']
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_scores_match_dense_tfidf(documents, query):
+    matrix = TfidfMatrix(documents)
+    assert np.allclose(matrix.score(query), dense_tfidf(documents, query), atol=1e-5)
+
+
+def test_batch_scores_match_single_queries(documents):
+    matrix = TfidfMatrix(documents)
+    batch = matrix.score_batch(QUERIES)
+    assert batch.shape == (len(QUERIES), len(documents))
+    for row, query in zip(batch, QUERIES):
+        assert np.allclose(row, matrix.score(query), atol=1e-5)
+    assert matrix.score_batch([]).shape == (0, len(documents))
+
+
+def test_arrays_round_trip(documents):
+    matrix = TfidfMatrix(documents)
+    restored = TfidfMatrix.from_arrays(matrix.to_arrays())
+    assert restored.vocabulary == matrix.vocabulary and len(restored) == len(matrix)
+    for query in QUERIES:
+        assert np.array_equal(restored.score(query), matrix.score(query))
+
+
+def test_top_k_indices_matches_full_sort():
+    rng = np.random.default_rng(7)
+    scores = rng.integers(0, 20, size=500).astype(np.float32)  # plenty of ties
+    for k in (0, 1, 5, 499, 500, 800):
+        expected = np.argsort(-scores, kind='stable')[:k]
+        top = top_k_indices(scores, k)
+        assert np.array_equal(scores[top], scores[expected])
+        assert len(set(top.tolist())) == len(top)
@@ -1,17 +1,29 @@
-import pdfplumber
-import re
-from pathlib import Path
+import sys
 
-pdf = pdfplumber.open(Path('BVLOS_NPRM_website_version.pdf'))
-min_num = None
-min_page = None
-for page_index, page in enumerate(pdf.pages, start=1):
-    text = page.extract_text() or ''
-    match = re.search(r'§\s*108\.(\d+)', text)
-    if match:
-        num = int(match.group(1))
-        if min_num is None or num < min_num:
-            min_num = num
-            min_page = page_index
-print('min section:', min_num, 'page', min_page)
-pdf.close()
+from ingest_federal_register import iter_sections
+
+
+def main():
+    min_num = None
+    min_page = None
+    if len(sys.argv) > 1:
+        # Page index of the PDF (e.g. BVLOS_NPRM_website_version.pdf), cached after the first run
+        from pdf_pages import PageCache
+        for page_index, found in sorted(PageCache(sys.argv[1]).sections().items()):
+            for rule_number in found:
+                part, num = rule_number.split('.')
+                if part == '108' and (min_num is None or int(num) < min_num):
+                    min_num = int(num)
+                    min_page = page_index
+    else:
+        for rule in iter_sections('federal_register.xml'):
+            num = int(rule['rule_number'].split('.')[1])
+            if min_num is None or num < min_num:
+                min_num = num
+                min_page = rule['pages'][0] if rule['pages'] else None
+    print('min section:', min_num, 'page', min_page)
+
+
+# The PDF path extracts pages in a process pool, whose spawned workers re-import this file
+if __name__ == '__main__':
+    main()
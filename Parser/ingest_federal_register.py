@@ -0,0 +1,158 @@
+"""Stream the Federal Register XML of the NPRM straight into parsed_rules.json records.
+
+Replaces the pdfplumber scripts that scan every PDF page for `§ 108.x`
+headings: `iterparse` walks the XML once, each finished <SECTION> becomes a
+record and is then discarded, so memory stays flat however large the file is.
+Each record also carries the letter and heading of its enclosing <SUBPART>.
+
+    python ingest_federal_register.py --output parsed_rules.json \
+        --merge "../Drone App/parsed_rules.json"
+"""
+import argparse
+import json
+import re
+import sys
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+SECTNO_PATTERN = re.compile(r'§\s*(\d+\.\d+)')
+# "Subpart A—General"; Part 108 spells one heading "SUBPART C—Operations Personnel"
+SUBPART_HEADING_PATTERN = re.compile(r'subpart\s+([A-Z])\s*[—–-]\s*(.*)', re.IGNORECASE)
+
+# First matching keyword wins; everything else is a flight operations rule
+CATEGORY_KEYWORDS = [
+    ('equipment', ('maintenance', 'alteration', 'cybersecurity', 'life limit', 'design', 'lighting')),
+    ('registration', ('registration', 'identification', 'certificate', 'permit', 'acceptance', 'rescission')),
+]
+
+
+def clean_text(element):
+    """All text under element with whitespace collapsed"""
+    return ' '.join(''.join(element.itertext()).split())
+
+
+def categorize(title):
+    """Keyword-based category for rules that have no curated category yet"""
+    lowered = title.lower()
+    for category, keywords in CATEGORY_KEYWORDS:
+        if any(keyword in lowered for keyword in keywords):
+            return category
+    return 'flight_operations'
+
+
+def parse_table(table):
+    """GPOTABLE -> {'title', 'headers', 'rows'} with plain-text cells"""
+    return {
+        'title': clean_text(table.find('TTITLE')) if table.find('TTITLE') is not None else '',
+        'headers': [clean_text(header) for header in table.iter('CHED')],
+        'rows': [[clean_text(cell) for cell in row.findall('ENT')] for row in table.iter('ROW')],
+    }
+
+
+def iter_sections(xml_path, part='108'):
+    """Yield one parsed_rules.json record per <SECTION> of the given CFR part, in document order"""
+    page = None
+    section_pages = None
+    depth_in_section = 0
+    rule_id = 0
+    subpart = (None, None)  # (letter, heading) of the enclosing <SUBPART>
+    stack = []
+
+    for event, elem in ET.iterparse(xml_path, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            if elem.tag == 'PRTPAGE':
+                # PRTPAGE marks where a new printed page begins
+                page = int(elem.get('P')) if (elem.get('P') or '').isdigit() else page
+                if section_pages is not None and page not in section_pages:
+                    section_pages.append(page)
+            elif elem.tag == 'SECTION':
+                depth_in_section += 1
+                if depth_in_section == 1:
+                    section_pages = [page] if page is not None else []
+            continue
+
+        stack.pop()
+        if elem.tag == 'HD' and stack and stack[-1].tag == 'SUBPART':
+            match = SUBPART_HEADING_PATTERN.match(clean_text(elem))
+            if match:
+                subpart = (match.group(1).upper(), match.group(2))
+        elif elem.tag == 'SUBPART':
+            subpart = (None, None)
+        elif elem.tag == 'SECTION':
+            depth_in_section -= 1
+            if depth_in_section == 0:
+                match = SECTNO_PATTERN.search(elem.findtext('SECTNO') or '')
+                if match and match.group(1).split('.')[0] == part:
+                    paragraphs = [text for text in (clean_text(p) for p in elem.iter('P')) if text]
+                    description = ' '.join(paragraphs)
+                    title = clean_text(elem.find('SUBJECT')) if elem.find('SUBJECT') is not None else ''
+                    rule_id += 1
+                    yield {
+                        'id': str(rule_id),
+                        'rule_number': match.group(1),
+                        'title': title,
+                        'definition': description,
+                        'description': description,
+                        'category': categorize(title),
+                        'subpart': subpart[0],
+                        'subpart_heading': subpart[1],
+                        'pages': section_pages,
+                        'tables': [parse_table(table) for table in elem.iter('GPOTABLE')],
+                        'paragraphs': paragraphs,
+                    }
+                section_pages = None
+
+        # Finished subtrees outside a section are never needed again; drop them
+        # from their parent so the tree built by iterparse never grows
+        if depth_in_section == 0:
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+
+
+def merge_curated(records, curated_path):
+    """Keep hand-edited definitions and categories from an existing parsed_rules.json"""
+    with open(curated_path, 'r', encoding='utf-8') as f:
+        curated = {rule['rule_number']: rule for rule in json.load(f)}
+    for record in records:
+        previous = curated.get(record['rule_number'])
+        if previous:
+            record['definition'] = previous.get('definition') or record['definition']
+            record['category'] = previous.get('category') or record['category']
+        yield record
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build parsed_rules.json from the Federal Register XML')
+    parser.add_argument('--input', default='federal_register.xml', help='Federal Register XML file')
+    parser.add_argument('--output', default='parsed_rules.json', help="Where to write the records ('-' for stdout)")
+    parser.add_argument('--part', default='108', help='CFR part whose sections are extracted')
+    parser.add_argument('--merge', help='Existing parsed_rules.json whose definitions and categories are kept')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    records = iter_sections(args.input, args.part)
+    if args.merge:
+        records = merge_curated(records, args.merge)
+
+    out = sys.stdout if args.output == '-' else open(Path(args.output), 'w', encoding='utf-8')
+    count = 0
+    try:
+        # Written record by record so the output never has to sit in memory either
+        out.write('[\n')
+        for record in records:
+            out.write(',\n' if count else '')
+            out.write(json.dumps(record, indent=2, ensure_ascii=False))
+            count += 1
+        out.write('\n]\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"Wrote {count} sections from {args.input} in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Shared, cached page-text extraction for the NPRM PDF.
+
+The first run extracts every page across a process pool. Each page's text
+goes to `<cache_dir>/<pdf sha256>/page_NNNN.txt`, so a changed PDF never
+reuses stale text. A page -> `§ 108.x` sections index is also written once.
+Later section lookups and page dumps only read those files.
+"""
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pdfplumber
+
+CACHE_DIR = Path(os.getenv('PDF_PAGE_CACHE_DIR', Path(__file__).with_name('.page_cache')))
+SECTION_PATTERN = re.compile(r'§\s*(\d+)\.(\d+)')
+
+
+def pdf_hash(pdf_path):
+    """sha256 of the PDF bytes, read in blocks"""
+    digest = hashlib.sha256()
+    with open(pdf_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _extract_range(pdf_path, start, stop, out_dir):
+    """Worker: open the PDF once and write the text of pages [start, stop)"""
+    with pdfplumber.open(pdf_path) as pdf:
+        for index in range(start, stop):
+            text = pdf.pages[index].extract_text() or ''
+            (Path(out_dir) / f'page_{index + 1:04d}.txt').write_text(text, encoding='utf-8')
+    return stop - start
+
+
+class PageCache:
+    """Per-page text of one PDF, extracted in parallel on first use"""
+    def __init__(self, pdf_path, cache_dir=CACHE_DIR, workers=None):
+        self.pdf_path = str(pdf_path)
+        self.dir = Path(cache_dir) / pdf_hash(pdf_path)
+        self.workers = workers or os.cpu_count() or 1
+        self._sections = None
+
+    @property
+    def page_count(self):
+        manifest = self.dir / 'manifest.json'
+        if manifest.exists():
+            return json.loads(manifest.read_text(encoding='utf-8'))['pages']
+        with pdfplumber.open(self.pdf_path) as pdf:
+            return len(pdf.pages)
+
+    def ensure_extracted(self):
+        """Extract any pages missing from the cache, fanning contiguous ranges out to worker processes"""
+        self.dir.mkdir(parents=True, exist_ok=True)
+        total = self.page_count
+        missing = [i for i in range(total) if not (self.dir / f'page_{i + 1:04d}.txt').exists()]
+        if missing:
+            # Contiguous runs, split so every worker gets a share and reopens the PDF only once per run
+            chunk = max(1, -(-len(missing) // self.workers))
+            ranges = []
+            for i in range(0, len(missing), chunk):
+                run = missing[i:i + chunk]
+                start = run[0]
+                for prev, index in zip(run, run[1:]):
+                    if index != prev + 1:
+                        ranges.append((start, prev + 1))
+                        start = index
+                ranges.append((start, run[-1] + 1))
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                futures = [pool.submit(_extract_range, self.pdf_path, start, stop, str(self.dir)) for start, stop in ranges]
+                for future in futures:
+                    future.result()
+        (self.dir / 'manifest.json').write_text(json.dumps({'pdf': self.pdf_path, 'pages': total}), encoding='utf-8')
+
+    def page_text(self, page_number):
+        """Text of a 1-based page"""
+        path = self.dir / f'page_{page_number:04d}.txt'
+        if not path.exists():
+            self.ensure_extracted()
+        return path.read_text(encoding='utf-8')
+
+    def pages(self):
+        """(page_number, text) for every page, in order"""
+        self.ensure_extracted()
+        for page_number in range(1, self.page_count + 1):
+            yield page_number, self.page_text(page_number)
+
+    def sections(self):
+        """{page_number: ['108.1', ...]} of section references per page, built once and cached"""
+        if self._sections is None:
+            path = self.dir / 'sections.json'
+            if path.exists():
+                self._sections = {int(page): found for page, found in json.loads(path.read_text(encoding='utf-8')).items()}
+            else:
+                self._sections = {}
+                for page_number, text in self.pages():
+                    found = list(dict.fromkeys(f'{part}.{num}' for part, num in SECTION_PATTERN.findall(text)))
+                    if found:
+                        self._sections[page_number] = found
+                path.write_text(json.dumps(self._sections), encoding='utf-8')
+        return self._sections
+
+    def pages_for_section(self, rule_number):
+        """Pages whose text cites rule_number"""
+        return [page for page, found in sorted(self.sections().items()) if rule_number in found]
@@ -1,8 +1,25 @@
-import pdfplumber
-from pathlib import Path
-
-with pdfplumber.open(Path('BVLOS_NPRM_website_version.pdf')) as pdf:
-    for idx in range(600, 610):
-        text = pdf.pages[idx].extract_text() or ''
-        print('--- Page', idx + 1, '---')
-        print(text[:1200])
+import sys
+
+from ingest_federal_register import iter_sections
+
+
+def main():
+    if len(sys.argv) > 1:
+        from pdf_pages import PageCache
+        cache = PageCache(sys.argv[1])
+        for page_number in range(601, 611):
+            print('--- Page', page_number, '---')
+            print(cache.page_text(page_number)[:1200])
+    else:
+        rules = list(iter_sections('federal_register.xml'))
+        last_pages = sorted({page for rule in rules for page in rule['pages']})[-10:]
+        for page in last_pages:
+            print('--- Page', page, '---')
+            text = ' '.join(f"§ {rule['rule_number']} {rule['title']} {rule['description']}"
+                            for rule in rules if page in rule['pages'])
+            print(text[:1200])
+
+
+# The PDF path extracts pages in a process pool, whose spawned workers re-import this file
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,22 @@
-import pdfplumber
-from pathlib import Path
+import sys
 
-with pdfplumber.open(Path('BVLOS_NPRM_website_version.pdf')) as pdf:
-    page = pdf.pages[54]
-    print(page.extract_text())
+from ingest_federal_register import iter_sections
+
+
+def main():
+    if len(sys.argv) > 2:
+        # show_page.py <pdf> <page>: cached text of a 1-based PDF page
+        from pdf_pages import PageCache
+        print(PageCache(sys.argv[1]).page_text(int(sys.argv[2])))
+    else:
+        # Federal Register printed page number, as in <PRTPAGE P="...">
+        page = int(sys.argv[1]) if len(sys.argv) > 1 else 38364
+        for rule in iter_sections('federal_register.xml'):
+            if page in rule['pages']:
+                print(f"§ {rule['rule_number']} {rule['title']}")
+                print(rule['description'])
+
+
+# The PDF path extracts pages in a process pool, whose spawned workers re-import this file
+if __name__ == '__main__':
+    main()